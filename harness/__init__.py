@@ -0,0 +1,10 @@
+"""
+Local end-to-end harness: runs the Lambda handlers in-process against an
+in-memory DynamoDB (with streams), a fake AppSync endpoint and a fake
+OpenAI Responses API. See harness/emulator.py.
+"""
+from harness.clock import RealClock, ScaledClock, VirtualClock
+from harness.emulator import Emulator
+from harness.openai import Fault, random_faults, scripted
+
+__all__ = ['Emulator', 'Fault', 'RealClock', 'ScaledClock', 'VirtualClock', 'random_faults', 'scripted']
@@ -0,0 +1,121 @@
+"""
+Fake AppSync endpoint: resolves GraphQL operations against the emulated
+Lambda resolvers and fans mutation results out to subscribers, following
+lib/schema.graphql and lib/api-lambdas-stack.ts.
+"""
+import re
+import threading
+
+from harness.http import FakeResponse
+
+# GraphQL field -> emulator function resolving it (see Emulator.resolver_for for api_router)
+RESOLVERS = {
+    'sendMessage': 'message_handler',
+    'joinWaitingRoom': 'join_waiting_room',
+    'leaveWaitingRoom': 'leave_waiting_room',
+    'createMatch': 'create_match',
+    'getWaitingStatus': 'get_waiting_status',
+    'submitSurvey': 'submit_survey',
+    'submitSurveys': 'submit_surveys',
+    'querySurveyResponses': 'query_survey_responses',
+    'messagesSince': 'messages_since',
+}
+
+# Subscription -> (triggering mutation, arguments matched against the mutation result)
+SUBSCRIPTIONS = {
+    'onNewMessage': ('sendMessage', ('chatroomId',)),
+    'onMatchFound': ('createMatch', ('userId',)),
+}
+
+OPERATION = re.compile(r'^\s*(mutation|query|subscription)?[^{]*\{\s*(\w+)\s*(?:\(([^)]*)\))?', re.S)
+ARGUMENT = re.compile(r'(\w+)\s*:\s*\$(\w+)')
+
+
+class FakeAppSync:
+    """Executes operations and delivers subscription events in-process."""
+
+    def __init__(self, emulator, api_key):
+        self.emulator = emulator
+        self.api_key = api_key
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    # --- Clients ---
+    def subscribe(self, subscription, arguments, callback):
+        """Registers callback(result) for a subscription; returns a function that unsubscribes."""
+        entry = (dict(arguments), callback)
+        with self.lock:
+            self.subscribers.setdefault(subscription, []).append(entry)
+
+        def unsubscribe():
+            with self.lock:
+                if entry in self.subscribers.get(subscription, []):
+                    self.subscribers[subscription].remove(entry)
+        return unsubscribe
+
+    def execute(self, field, arguments=None, type_name=None):
+        """Runs one resolver and returns its result; raises if the resolver fails."""
+        with self.lock:
+            self.operations[field] = self.operations.get(field, 0) + 1
+        arguments = arguments or {}
+        if field == 'getMessages':
+            return self._get_messages(arguments)
+        event = {
+            'arguments': arguments,
+            'identity': None,
+            'source': None,
+            'info': {'fieldName': field, 'parentTypeName': type_name or ('Query' if field.startswith(('get', 'query')) else 'Mutation')},
+        }
+        result = self.emulator.invoke(self.emulator.resolver_for(field), event)
+        self._publish(field, result)
+        return result
+
+    # --- HTTP entry point used by the handlers ---
+    def handle_http(self, url, body, headers, timeout):
+        if headers.get('x-api-key') != self.api_key:
+            return FakeResponse(401, {'errors': [{'errorType': 'UnauthorizedException'}]}, url=url)
+        match = OPERATION.match(body.get('query', ''))
+        if not match:
+            return FakeResponse(400, {'errors': [{'message': 'Unparseable operation'}]}, url=url)
+        kind, field, argument_list = match.groups()
+        variables = body.get('variables') or {}
+        arguments = {name: variables.get(variable) for name, variable in ARGUMENT.findall(argument_list or '')}
+        try:
+            result = self.execute(field, arguments, 'Mutation' if kind == 'mutation' else 'Query')
+        except Exception as e:
+            # AppSync reports resolver failures as GraphQL errors on a 200 response
+            return FakeResponse(200, {'data': {field: None}, 'errors': [{'message': str(e), 'path': [field]}]}, url=url)
+        return FakeResponse(200, {'data': {field: result}}, url=url)
+
+    # --- Internals ---
+    def _publish(self, field, result):
+        if not isinstance(result, dict):
+            return
+        deliveries = []
+        with self.lock:
+            for subscription, (mutation, keys) in SUBSCRIPTIONS.items():
+                if mutation != field:
+                    continue
+                for arguments, callback in self.subscribers.get(subscription, []):
+                    if all(result.get(k) == arguments.get(k) for k in keys if k in arguments):
+                        deliveries.append(callback)
+        for callback in deliveries:
+            callback(result)
+
+    def _get_messages(self, arguments):
+        """Mirrors the DynamoDB resolver on MessagesTable: the room's messages, optionally after an id."""
+        table = self.emulator.dynamodb.table(self.emulator.env['MESSAGES_TABLE'])
+        items = []
+        request = {'KeyConditionExpression': 'chatroomId = :cid',
+                   'ExpressionAttributeValues': {':cid': arguments['chatroomId']}}
+        if arguments.get('after'):
+            request['KeyConditionExpression'] += ' AND #id > :after'
+            request['ExpressionAttributeNames'] = {'#id': 'id'}
+            request['ExpressionAttributeValues'][':after'] = arguments['after']
+        while True:
+            response = table.query(**request)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return items
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,98 @@
+"""
+Clocks for the harness. Handler modules get a `time` shim bound to one of
+these, so `time.sleep` in a handler can be real or simulated.
+"""
+import asyncio
+import threading
+import time as _time
+
+
+class RealClock:
+    """Wall-clock time; sleeps really block."""
+
+    def time(self):
+        return _time.time()
+
+    def monotonic(self):
+        return _time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            _time.sleep(seconds)
+
+    async def sleep_async(self, seconds):
+        await asyncio.sleep(max(0.0, seconds))
+
+
+class VirtualClock:
+    """Simulated time that advances instantly on sleep, for deterministic runs."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def monotonic(self):
+        return self.time()
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    async def sleep_async(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+
+class ScaledClock:
+    """Wall-clock time running `1 / scale` times faster, so long scenarios finish sooner.
+
+    Safe to share across threads: every reading is derived from the real
+    monotonic clock, and sleeps really block for the scaled duration.
+    """
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self._origin = _time.monotonic()
+        self._origin_wall = _time.time()
+
+    def time(self):
+        return self._origin_wall + self.monotonic() - self._origin
+
+    def monotonic(self):
+        return self._origin + (_time.monotonic() - self._origin) / self.scale
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            _time.sleep(seconds * self.scale)
+
+    async def sleep_async(self, seconds):
+        await asyncio.sleep(max(0.0, seconds) * self.scale)
+
+
+class TimeModule:
+    """Drop-in for the `time` module inside a handler, routing clock calls to a harness clock."""
+
+    def __init__(self, clock):
+        self._clock = clock
+
+    def time(self):
+        return self._clock.time()
+
+    def monotonic(self):
+        return self._clock.monotonic()
+
+    def perf_counter(self):
+        return self._clock.monotonic()
+
+    def sleep(self, seconds):
+        self._clock.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(_time, name)
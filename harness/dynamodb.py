@@ -0,0 +1,454 @@
+"""
+In-memory stand-in for the boto3 DynamoDB resource and clients, with stream
+emulation.
+
+Items are round-tripped through boto3's own TypeSerializer/TypeDeserializer,
+so handlers see the same value types (Decimal numbers, rejected floats) as
+against the real service. Only the operations the handlers use are covered.
+"""
+import copy
+import itertools
+import threading
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+from harness import expressions
+
+SERIALIZER = TypeSerializer()
+DESERIALIZER = TypeDeserializer()
+
+
+def serialize_item(item):
+    """Converts a Python item to DynamoDB JSON."""
+    return {key: SERIALIZER.serialize(value) for key, value in item.items()}
+
+
+def deserialize_item(item):
+    """Converts a DynamoDB JSON item to Python values."""
+    return {key: DESERIALIZER.deserialize(value) for key, value in item.items()}
+
+
+def normalize_item(item):
+    """Validates and normalizes an item the way the boto3 resource layer would."""
+    return deserialize_item(serialize_item(item))
+
+
+def _error(code, operation, message, **extra):
+    response = {'Error': {'Code': code, 'Message': message}, **extra}
+    return ERRORS.get(code, ClientError)(response, operation)
+
+
+class ConditionalCheckFailedException(ClientError):
+    pass
+
+
+class TransactionCanceledException(ClientError):
+    pass
+
+
+class ResourceNotFoundException(ClientError):
+    pass
+
+
+class ValidationException(ClientError):
+    pass
+
+
+ERRORS = {cls.__name__: cls for cls in (
+    ConditionalCheckFailedException, TransactionCanceledException, ResourceNotFoundException, ValidationException,
+)}
+
+
+class TableSchema:
+    """Key schema of a table and its global secondary indexes."""
+
+    def __init__(self, partition_key, sort_key=None, indexes=None, stream=False):
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.indexes = indexes or {}
+        self.stream = stream
+
+    def key_of(self, item):
+        return (item[self.partition_key], item.get(self.sort_key) if self.sort_key else None)
+
+    def key_dict(self, item):
+        key = {self.partition_key: item[self.partition_key]}
+        if self.sort_key:
+            key[self.sort_key] = item[self.sort_key]
+        return key
+
+
+class InMemoryTable:
+    """Storage and operations for one table. Thread-safe."""
+
+    def __init__(self, name, schema, store):
+        self.name = name
+        self.table_name = name
+        self.schema = schema
+        self.store = store
+        self.items = {}  # (partition, sort) -> item
+        self.lock = threading.RLock()
+        self.meta = SimpleNamespace(client=store.client)
+
+    # --- Helpers ---
+    def _get(self, key):
+        return self.items.get(self.schema.key_of(key))
+
+    def _check(self, condition, names, values, existing, operation):
+        if condition is None:
+            return
+        node = expressions.parse_condition(condition, names, values)
+        if not expressions.evaluate(node, existing):
+            raise _error('ConditionalCheckFailedException', operation, 'The conditional request failed')
+
+    def _write(self, key, new_item):
+        """Stores or removes an item and emits a stream record. Caller holds the lock."""
+        old_item = self.items.get(key)
+        if new_item is None:
+            self.items.pop(key, None)
+        else:
+            self.items[key] = new_item
+        if self.schema.stream and (old_item is not None or new_item is not None):
+            event = 'REMOVE' if new_item is None else ('MODIFY' if old_item is not None else 'INSERT')
+            self.store.emit(self, event, old_item, new_item)
+
+    @staticmethod
+    def _project(item, projection, names):
+        item = copy.deepcopy(item)
+        if not projection:
+            return item
+        attributes = expressions.parse_projection(projection, names)
+        return {k: v for k, v in item.items() if k in attributes}
+
+    # --- Single-item operations ---
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        item = normalize_item(Item)
+        with self.lock:
+            key = self.schema.key_of(item)
+            self._check(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                        self.items.get(key), 'PutItem')
+            self._write(key, item)
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        with self.lock:
+            item = self._get(normalize_item(Key))
+            if item is None:
+                return {}
+            return {'Item': self._project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues=None, **kwargs):
+        with self.lock:
+            key = self.schema.key_of(normalize_item(Key))
+            existing = self.items.get(key)
+            self._check(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, existing, 'DeleteItem')
+            self._write(key, None)
+        return {'Attributes': copy.deepcopy(existing)} if ReturnValues == 'ALL_OLD' and existing else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues=None, **kwargs):
+        values = normalize_item(ExpressionAttributeValues or {})
+        with self.lock:
+            key_item = normalize_item(Key)
+            key = self.schema.key_of(key_item)
+            existing = self.items.get(key)
+            self._check(ConditionExpression, ExpressionAttributeNames, values, existing, 'UpdateItem')
+            updated = copy.deepcopy(existing) if existing else dict(key_item)
+            actions = expressions.parse_update(UpdateExpression, ExpressionAttributeNames, values)
+            expressions.apply_update(updated, actions)
+            updated = normalize_item(updated)
+            self._write(key, updated)
+        if ReturnValues in ('ALL_NEW', 'UPDATED_NEW'):
+            return {'Attributes': copy.deepcopy(updated)}
+        if ReturnValues == 'ALL_OLD' and existing:
+            return {'Attributes': copy.deepcopy(existing)}
+        return {}
+
+    # --- Multi-item reads ---
+    def _ordered(self, index_name=None, partition=expressions.MISSING, forward=True):
+        """Yields items of the table or an index, optionally restricted to one partition, in key order."""
+        if index_name:
+            partition_key, sort_key = self.schema.indexes[index_name]
+        else:
+            partition_key, sort_key = self.schema.partition_key, self.schema.sort_key
+        items = [item for item in self.items.values() if partition_key in item]
+        if partition is not expressions.MISSING:
+            items = [item for item in items if item[partition_key] == partition]
+        if sort_key:
+            items = [item for item in items if sort_key in item]
+            items.sort(key=lambda item: (str(item[partition_key]), item[sort_key]), reverse=not forward)
+        return items, partition_key, sort_key
+
+    def _page(self, items, limit, start_key, filter_node, select, projection, names, index_key):
+        if start_key:
+            start = normalize_item(start_key)
+            for position, item in enumerate(items):
+                if all(item.get(k) == v for k, v in start.items()):
+                    items = items[position + 1:]
+                    break
+        scanned = items[:limit] if limit else items
+        matched = [item for item in scanned if filter_node is None or expressions.evaluate(filter_node, item)]
+        response = {'Count': len(matched), 'ScannedCount': len(scanned)}
+        if select != 'COUNT':
+            response['Items'] = [self._project(item, projection, names) for item in matched]
+        if limit and len(items) > limit:
+            last = scanned[-1]
+            response['LastEvaluatedKey'] = copy.deepcopy(
+                {k: last[k] for k in set(self.schema.key_dict(last)) | set(k for k in index_key if k)}
+            )
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, Limit=None, ScanIndexForward=True, ExclusiveStartKey=None,
+              Select=None, ProjectionExpression=None, **kwargs):
+        values = normalize_item(ExpressionAttributeValues or {})
+        key_node = expressions.parse_condition(KeyConditionExpression, ExpressionAttributeNames, values,
+                                               is_key_condition=True)
+        filter_node = (expressions.parse_condition(FilterExpression, ExpressionAttributeNames, values)
+                       if FilterExpression is not None else None)
+        with self.lock:
+            partition_key = self.schema.indexes[IndexName][0] if IndexName else self.schema.partition_key
+            partition = expressions.equality_on(key_node, partition_key)
+            if partition is expressions.MISSING:
+                raise _error('ValidationException', 'Query', 'Query condition missed key schema element')
+            items, pk, sk = self._ordered(IndexName, partition, ScanIndexForward)
+            items = [item for item in items if expressions.evaluate(key_node, item)]
+            return self._page(items, Limit, ExclusiveStartKey, filter_node, Select, ProjectionExpression,
+                              ExpressionAttributeNames, (pk, sk))
+
+    def scan(self, FilterExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             Limit=None, ExclusiveStartKey=None, Select=None, ProjectionExpression=None, IndexName=None, **kwargs):
+        values = normalize_item(ExpressionAttributeValues or {})
+        filter_node = (expressions.parse_condition(FilterExpression, ExpressionAttributeNames, values)
+                       if FilterExpression is not None else None)
+        with self.lock:
+            items, pk, sk = self._ordered(IndexName)
+            return self._page(items, Limit, ExclusiveStartKey, filter_node, Select, ProjectionExpression,
+                              ExpressionAttributeNames, (pk, sk))
+
+    def describe_table(self, **kwargs):
+        # DynamoDB refreshes ItemCount about every six hours; here it is always current
+        with self.lock:
+            return {'Table': {'TableName': self.name, 'ItemCount': len(self.items)}}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return BatchWriter(self)
+
+
+class BatchWriter:
+    """Buffers puts and deletes and applies them on exit, like Table.batch_writer()."""
+
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def put_item(self, Item):
+        self.pending.append(('put', Item))
+
+    def delete_item(self, Key):
+        self.pending.append(('delete', Key))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for kind, payload in self.pending:
+            if kind == 'put':
+                self.table.put_item(Item=payload)
+            else:
+                self.table.delete_item(Key=payload)
+        self.pending = []
+
+
+class InMemoryDynamoDB:
+    """Shared state behind the fake resource and client: tables plus stream listeners."""
+
+    def __init__(self):
+        self.tables = {}
+        self.listeners = {}
+        self.sequence = itertools.count(1)
+        self.client = InMemoryDynamoDBClient(self)
+        self.low_level_client = InMemoryLowLevelDynamoDBClient(self.client)
+
+    def create_table(self, name, schema):
+        self.tables[name] = InMemoryTable(name, schema, self)
+        return self.tables[name]
+
+    def table(self, name):
+        if name not in self.tables:
+            raise _error('ResourceNotFoundException', 'DescribeTable', f"Requested resource not found: {name}")
+        return self.tables[name]
+
+    def on_stream(self, table_name, listener):
+        """Registers a callable that receives each stream record of a table."""
+        self.listeners.setdefault(table_name, []).append(listener)
+
+    def emit(self, table, event_name, old_item, new_item):
+        image = new_item if new_item is not None else old_item
+        record = {
+            'eventID': str(next(self.sequence)),
+            'eventName': event_name,
+            'eventSource': 'aws:dynamodb',
+            'eventSourceARN': f"arn:aws:dynamodb:local:000000000000:table/{table.name}/stream/local",
+            'dynamodb': {
+                'Keys': serialize_item(table.schema.key_dict(image)),
+                'SequenceNumber': str(next(self.sequence)),
+                'StreamViewType': 'NEW_IMAGE',
+            },
+        }
+        if new_item is not None:
+            record['dynamodb']['NewImage'] = serialize_item(new_item)
+        for listener in self.listeners.get(table.name, []):
+            listener(record)
+
+    # --- Resource-level batch operations ---
+    def batch_write_item(self, RequestItems, **kwargs):
+        for table_name, requests in RequestItems.items():
+            table = self.table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table.put_item(Item=request['PutRequest']['Item'])
+                else:
+                    table.delete_item(Key=request['DeleteRequest']['Key'])
+        return {'UnprocessedItems': {}}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.table(table_name)
+            found = []
+            for key in request['Keys']:
+                item = table.get_item(Key=key, ProjectionExpression=request.get('ProjectionExpression'),
+                                      ExpressionAttributeNames=request.get('ExpressionAttributeNames'))
+                if 'Item' in item:
+                    found.append(item['Item'])
+            responses[table_name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        tables = []
+        for action in TransactItems:
+            (kind, body), = action.items()
+            tables.append(self.table(body['TableName']))
+        locks = sorted({id(t): t for t in tables}.values(), key=lambda t: t.name)
+        for table in locks:
+            table.lock.acquire()
+        try:
+            reasons = []
+            failed = False
+            for action, table in zip(TransactItems, tables):
+                (kind, body), = action.items()
+                key = normalize_item(body['Item'] if kind == 'Put' else body['Key'])
+                existing = table._get(key)
+                condition = body.get('ConditionExpression')
+                ok = condition is None or expressions.evaluate(
+                    expressions.parse_condition(condition, body.get('ExpressionAttributeNames'),
+                                                normalize_item(body.get('ExpressionAttributeValues', {}))),
+                    existing)
+                reasons.append({'Code': 'None'} if ok else {'Code': 'ConditionalCheckFailed',
+                                                            'Message': 'The conditional request failed'})
+                failed = failed or not ok
+            if failed:
+                raise _error('TransactionCanceledException', 'TransactWriteItems',
+                             'Transaction cancelled', CancellationReasons=reasons)
+            for action, table in zip(TransactItems, tables):
+                (kind, body), = action.items()
+                if kind == 'Put':
+                    table.put_item(Item=body['Item'])
+                elif kind == 'Delete':
+                    table.delete_item(Key=body['Key'])
+                elif kind == 'Update':
+                    table.update_item(Key=body['Key'], UpdateExpression=body['UpdateExpression'],
+                                      ExpressionAttributeNames=body.get('ExpressionAttributeNames'),
+                                      ExpressionAttributeValues=body.get('ExpressionAttributeValues'))
+        finally:
+            for table in locks:
+                table.lock.release()
+        return {}
+
+
+class InMemoryDynamoDBClient:
+    """Plays the part of `resource.meta.client` (plain Python values, as with the resource's client)."""
+
+    def __init__(self, store):
+        self.store = store
+        self.exceptions = SimpleNamespace(**ERRORS)
+        self.meta = SimpleNamespace(region_name='local')
+
+    def __getattr__(self, name):
+        if name in ('batch_write_item', 'batch_get_item', 'transact_write_items'):
+            return getattr(self.store, name)
+        if name in ('put_item', 'get_item', 'delete_item', 'update_item', 'query', 'scan', 'describe_table'):
+            def operation(TableName, **kwargs):
+                return getattr(self.store.table(TableName), name)(**kwargs)
+            return operation
+        raise AttributeError(name)
+
+
+class InMemoryLowLevelDynamoDBClient:
+    """Stand-in for boto3.client('dynamodb'): requests and responses in DynamoDB JSON."""
+
+    ITEM_PARAMETERS = ('Item', 'Key', 'ExclusiveStartKey', 'ExpressionAttributeValues')
+    ITEM_RESULTS = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+    def __init__(self, client):
+        self.client = client
+        self.exceptions = client.exceptions
+        self.meta = client.meta
+
+    def _deserialize_request(self, body):
+        return {name: deserialize_item(value) if name in self.ITEM_PARAMETERS else value
+                for name, value in body.items()}
+
+    def _serialize_response(self, response):
+        response = dict(response)
+        for name in self.ITEM_RESULTS:
+            if name in response:
+                response[name] = serialize_item(response[name])
+        if 'Items' in response:
+            response['Items'] = [serialize_item(item) for item in response['Items']]
+        return response
+
+    def __getattr__(self, name):
+        if name in ('put_item', 'get_item', 'delete_item', 'update_item', 'query', 'scan'):
+            def operation(**kwargs):
+                operation_function = getattr(self.client, name)
+                return self._serialize_response(operation_function(**self._deserialize_request(kwargs)))
+            return operation
+        raise AttributeError(name)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        response = self.client.batch_get_item(RequestItems={
+            table_name: dict(request, Keys=[deserialize_item(key) for key in request['Keys']])
+            for table_name, request in RequestItems.items()
+        })
+        return {'Responses': {table_name: [serialize_item(item) for item in items]
+                              for table_name, items in response['Responses'].items()},
+                'UnprocessedKeys': {}}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        return self.client.transact_write_items(TransactItems=[
+            {kind: self._deserialize_request(body) for kind, body in action.items()}
+            for action in TransactItems
+        ])
+
+
+class InMemoryDynamoDBResource:
+    """Stand-in for boto3.resource('dynamodb')."""
+
+    def __init__(self, store):
+        self.store = store
+        self.meta = SimpleNamespace(client=store.client)
+
+    def Table(self, name):
+        return self.store.table(name)
+
+    def batch_write_item(self, **kwargs):
+        return self.store.batch_write_item(**kwargs)
+
+    def batch_get_item(self, **kwargs):
+        return self.store.batch_get_item(**kwargs)
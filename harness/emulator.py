@@ -0,0 +1,443 @@
+"""
+Runs the Lambda handlers in-process against the in-memory services.
+
+    with Emulator() as emulator:
+        emulator.appsync.subscribe('onMatchFound', {'userId': user_id}, on_match)
+        status = emulator.appsync.execute('joinWaitingRoom')
+        emulator.run_until_idle()
+
+The wiring (tables, streams, environment, function names, timeouts) mirrors
+lib/database-stack.ts and lib/api-lambdas-stack.ts. Asynchronous work, i.e.
+`InvocationType='Event'` invokes, stream batches and SQS messages (after their
+DelaySeconds), is queued and drained by
+run_until_idle(), either inline on the calling thread (deterministic, and the
+only mode that suits a VirtualClock) or on a pool of worker threads.
+With api_router=True the resolvers lambda/api_router routes are invoked
+through it, as when the stack is deployed with `-c apiRouter=true`.
+"""
+import asyncio
+import collections
+import heapq
+import importlib.util
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import traceback
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import requests
+
+from harness.appsync import RESOLVERS, FakeAppSync
+from harness.clock import RealClock, TimeModule, VirtualClock
+from harness.dynamodb import InMemoryDynamoDB, InMemoryDynamoDBResource, TableSchema
+from harness.http import AsyncHttpClient, HttpRouter
+from harness.openai import FakeOpenAI
+from harness.services import FakeLambdaClient, FakeSecretsManagerClient, FakeSQSClient, FakeSSMClient
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda')
+
+APPSYNC_URL = 'https://appsync.local/graphql'
+AI_REPLY_QUEUE_URL = 'https://sqs.local/ai-replies'
+OPENAI_URL = 'https://api.openai.com/'
+
+# Table name -> key schema, as in lib/database-stack.ts
+TABLES = {
+    'WaitingRoomTable': TableSchema('id', stream=True),
+    'ChatroomsTable': TableSchema('id'),
+    'MessagesTable': TableSchema('chatroomId', 'id', stream=True),
+    'SurveyResponsesTable': TableSchema('id', 'timestamp', indexes={
+        'education-index': ('education', 'timestamp'),
+        'llmKnowledge-index': ('llmKnowledge', 'timestamp'),
+    }),
+    'AppStateTable': TableSchema('id'),
+}
+
+# Environment shared by all handlers, as in lib/api-lambdas-stack.ts
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'WAITING_ROOM_TABLE': 'WaitingRoomTable',
+    'CHATROOMS_TABLE': 'ChatroomsTable',
+    'MESSAGES_TABLE': 'MessagesTable',
+    'SURVEY_RESPONSES_TABLE': 'SurveyResponsesTable',
+    'APP_STATE_TABLE': 'AppStateTable',
+    'OPENAI_API_KEY_SECRET_NAME': 'Turing-Open-AI-API-Key',
+    'AI_PROMPT_PARAMETER': '/turing-game/prompts/ai-personality',
+    'APPSYNC_URL': APPSYNC_URL,
+    'APPSYNC_API_KEY': 'local-api-key',
+    'AI_REPLY_QUEUE_URL': AI_REPLY_QUEUE_URL,
+}
+
+Function = collections.namedtuple('Function', 'function_name directory module attribute timeout')
+
+# Emulated function -> deployment settings
+FUNCTIONS = {
+    'ai_response': Function('airesponse-local', 'ai_response', 'ai_response', 'handler', 30),
+    'ai_delivery': Function('aidelivery-local', 'ai_response', 'ai_response', 'delivery_handler', 20),
+    'message_handler': Function('messagehandler-local', 'message_handler', 'message_handler', 'handler', 3),
+    'join_waiting_room': Function('joinwaitingroom-local', 'join_waiting_room', 'join_waiting_room', 'handler', 3),
+    'leave_waiting_room': Function('leavewaitingroom-local', 'leave_waiting_room', 'leave_waiting_room', 'handler', 3),
+    'matchmaking': Function('matchmaking-local', 'matchmaking', 'matchmaking', 'handler', 30),
+    'create_match': Function('creatematch-local', 'create_match', 'create_match', 'handler', 3),
+    'get_waiting_status': Function('getwaitingstatus-local', 'get_waiting_status', 'get_waiting_status', 'handler', 3),
+    'submit_survey': Function('submitsurvey-local', 'submit_survey', 'submit_survey', 'handler', 3),
+    'submit_surveys': Function('submitsurveys-local', 'submit_survey', 'submit_survey', 'batch_handler', 30),
+    'query_survey_responses': Function('querysurveyresponses-local', 'query_survey_responses',
+                                       'query_survey_responses', 'handler', 3),
+    'messages_since': Function('messagessince-local', 'messages_since', 'messages_since', 'handler', 3),
+    'api_router': Function('apirouter-local', 'api_router', 'api_router', 'handler', 30),
+}
+
+# Handler modules are importable by plain name from each other, as in api_router's bundle
+HANDLER_MODULES = {function.module for function in FUNCTIONS.values()}
+HANDLER_DIRS = sorted({os.path.join(LAMBDA_DIR, function.directory) for function in FUNCTIONS.values()})
+
+# Stream event sources: (table, function, batch size, parallelization factor)
+STREAMS = [
+    ('WaitingRoomTable', 'matchmaking', 1, 1),
+    ('MessagesTable', 'ai_response', 10, 10),
+]
+
+# SQS event sources: queue URL -> function
+QUEUES = {
+    AI_REPLY_QUEUE_URL: 'ai_delivery',
+}
+
+DEFAULT_PROMPT = "You are a human player in a group chat. Keep replies short and casual."
+
+
+class LambdaContext:
+    """The parts of the Lambda context object handlers may touch."""
+
+    def __init__(self, function, clock):
+        self.function_name = function.function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = f"arn:aws:lambda:local:000000000000:function:{function.function_name}"
+        self.memory_limit_in_mb = 128
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function.function_name}"
+        self.log_stream_name = 'local'
+        self._clock = clock
+        self._deadline = clock.monotonic() + function.timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - self._clock.monotonic()) * 1000))
+
+
+class InvocationMetrics:
+    """Per-function invocation counts and durations on the emulator clock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.timeouts = collections.Counter()
+
+    def record(self, name, duration, failed, timed_out):
+        with self.lock:
+            self.durations[name].append(duration)
+            if failed:
+                self.errors[name] += 1
+            if timed_out:
+                self.timeouts[name] += 1
+
+    def invocations(self, name=None):
+        with self.lock:
+            if name:
+                return len(self.durations[name])
+            return {k: len(v) for k, v in self.durations.items()}
+
+    def summary(self):
+        """Returns {function: {invocations, errors, timeouts, p50, p95, max}} with durations in seconds."""
+        with self.lock:
+            result = {}
+            for name, durations in sorted(self.durations.items()):
+                ordered = sorted(durations)
+                result[name] = {
+                    'invocations': len(ordered),
+                    'errors': self.errors[name],
+                    'timeouts': self.timeouts[name],
+                    'p50': percentile(ordered, 50),
+                    'p95': percentile(ordered, 95),
+                    'max': ordered[-1],
+                }
+            return result
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Emulator:
+    """In-process deployment of the chat pipeline."""
+
+    def __init__(self, clock=None, workers=0, openai_reply=None, openai_latency=0.5, openai_faults=None,
+                 echo_logs=False, streams=STREAMS, api_router=False):
+        if workers and isinstance(clock, VirtualClock):
+            raise ValueError("A VirtualClock needs inline execution (workers=0)")
+        self.clock = clock or (RealClock() if workers else VirtualClock())
+        self.workers = workers
+        self.echo_logs = echo_logs
+        self.api_router = api_router
+        self.env = dict(ENVIRONMENT)
+        self.logs = collections.deque(maxlen=10000)
+
+        self.dynamodb = InMemoryDynamoDB()
+        for name, schema in TABLES.items():
+            self.dynamodb.create_table(name, schema)
+        self.secrets = {self.env['OPENAI_API_KEY_SECRET_NAME']: json.dumps({'openai_api_key': 'sk-local'})}
+        self.parameters = {self.env['AI_PROMPT_PARAMETER']: DEFAULT_PROMPT}
+
+        self.openai = FakeOpenAI(self.clock, latency=openai_latency, faults=openai_faults)
+        if openai_reply:
+            self.openai.reply = openai_reply
+        self.appsync = FakeAppSync(self, self.env['APPSYNC_API_KEY'])
+        self.http = HttpRouter()
+        self.http.add(APPSYNC_URL, self.appsync.handle_http)
+        self.http.add(OPENAI_URL, self.openai.handle_http)
+        # For ai_worker; AppSync resolvers are blocking, so they run on a thread
+        self.async_http = AsyncHttpClient()
+        self.async_http.add(APPSYNC_URL, lambda *request: asyncio.to_thread(self.appsync.handle_http, *request))
+        self.async_http.add(OPENAI_URL, self.openai.handle_http_async)
+
+        self.metrics = InvocationMetrics()
+        self.modules = {}
+        self.handlers = {}
+        self._queue = collections.deque()
+        # (due time, sequence, task) of delayed work, when run inline
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._executor = None
+        self._saved = None
+
+        for table, function, batch_size, parallelization in streams:
+            self._attach_stream(table, function, batch_size, parallelization)
+
+    # --- Lifecycle ---
+    def __enter__(self):
+        self._saved = {
+            'environ': dict(os.environ),
+            'resource': boto3.resource,
+            'client': boto3.client,
+            'post': requests.post,
+        }
+        os.environ.update(self.env)
+        requests.post = self.http.post
+        # lambda/common is imported by the handlers as a package; reload it so it reads this environment
+        # and so api_router's plain imports of the other handlers get this deployment's fakes
+        for module_name in [m for m in sys.modules
+                            if m == 'common' or m.startswith('common.') or m in HANDLER_MODULES]:
+            del sys.modules[module_name]
+        for name in FUNCTIONS:
+            self._load(name)
+        for module_name, module in list(sys.modules.items()):
+            if module_name.startswith('common.') or module_name in HANDLER_MODULES:
+                module.print = self._logger(module_name)
+                if hasattr(module, 'time'):
+                    module.time = TimeModule(self.clock)
+        # Hedged requests go through common.retry's sessions rather than requests.post
+        http = self.http
+        sys.modules['common.retry'].CancellableSession.post = lambda session, url, **kwargs: http.post(url, **kwargs)
+        if self.workers:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='lambda')
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        os.environ.clear()
+        os.environ.update(self._saved['environ'])
+        requests.post = self._saved['post']
+
+    def _fake_resource(self, service, *args, **kwargs):
+        if service != 'dynamodb':
+            raise ValueError(f"No local resource for {service}")
+        return InMemoryDynamoDBResource(self.dynamodb)
+
+    def _fake_client(self, service, *args, **kwargs):
+        clients = {
+            'dynamodb': lambda: self.dynamodb.low_level_client,
+            'lambda': lambda: FakeLambdaClient(self),
+            'secretsmanager': lambda: FakeSecretsManagerClient(self.secrets),
+            'ssm': lambda: FakeSSMClient(self.parameters),
+            'sqs': lambda: FakeSQSClient(self),
+        }
+        if service not in clients:
+            raise ValueError(f"No local client for {service}")
+        return clients[service]()
+
+    def _load(self, name):
+        function = FUNCTIONS[name]
+        self.handlers[name] = getattr(self.load_module(function.directory, function.module), function.attribute)
+
+    def load_module(self, directory, module_name):
+        """Imports lambda/<directory>/<module_name>.py with boto3 pointed at the fakes, then binds its clock and logging."""
+        key = (directory, module_name)
+        if key not in self.modules:
+            path = os.path.join(LAMBDA_DIR, directory, f"{module_name}.py")
+            spec = importlib.util.spec_from_file_location(f"harness_{id(self)}_{module_name}", path)
+            module = importlib.util.module_from_spec(spec)
+            module.print = self._logger(module_name)
+            boto3.resource, boto3.client = self._fake_resource, self._fake_client
+            paths = [os.path.dirname(path), LAMBDA_DIR, *HANDLER_DIRS]
+            sys.path[:0] = paths
+            try:
+                spec.loader.exec_module(module)
+            finally:
+                del sys.path[:len(paths)]
+                boto3.resource, boto3.client = self._saved['resource'], self._saved['client']
+            if hasattr(module, 'time'):
+                module.time = TimeModule(self.clock)
+            self.modules[key] = module
+        return self.modules[key]
+
+    def _logger(self, source):
+        def log(*args, **kwargs):
+            line = ' '.join(str(a) for a in args)
+            self.logs.append((self.clock.time(), source, line))
+            if self.echo_logs:
+                sys.stdout.write(f"[{source}] {line}\n")
+        return log
+
+    # --- Invocation ---
+    def resolver_for(self, field):
+        """The emulated function resolving a GraphQL field: api_router for its routes when enabled."""
+        if self.api_router and field in self.modules[('api_router', 'api_router')].ROUTES:
+            return 'api_router'
+        return RESOLVERS[field]
+
+    def function_for(self, function_name):
+        """Maps a deployed function name (as in env vars) to the emulated function."""
+        for name, function in FUNCTIONS.items():
+            if function_name in (function.function_name, name):
+                return name
+        raise ValueError(f"Unknown function {function_name}")
+
+    def function_for_queue(self, queue_url):
+        """The emulated function an SQS queue's event source invokes."""
+        if queue_url not in QUEUES:
+            raise ValueError(f"Unknown queue {queue_url}")
+        return QUEUES[queue_url]
+
+    def invoke(self, name, event):
+        """Runs a handler synchronously and records its duration; re-raises handler errors."""
+        function = FUNCTIONS[name]
+        context = LambdaContext(function, self.clock)
+        start = self.clock.monotonic()
+        failed = True
+        try:
+            result = self.handlers[name](event, context)
+            failed = False
+            return result
+        finally:
+            duration = self.clock.monotonic() - start
+            self.metrics.record(name, duration, failed, duration > function.timeout)
+
+    def invoke_async(self, name, event):
+        """Queues an 'Event' invocation; failures are logged, as Lambda would after its retries."""
+        self._submit(self._logged(name, event))
+
+    def invoke_later(self, name, event, delay):
+        """Queues an invocation that starts `delay` seconds from now, as for a delayed SQS message."""
+        run = self._logged(name, event)
+        with self._idle:
+            self._pending += 1
+            if not self._executor:
+                heapq.heappush(self._delayed, (self.clock.time() + delay, next(self._sequence), run))
+                return
+
+        def wait():
+            self.clock.sleep(delay)
+            self._submit(run)
+        # A timer thread rather than a worker, which would be held for the whole delay
+        threading.Thread(target=self._run_task, args=(wait,), daemon=True).start()
+
+    def _logged(self, name, event):
+        def run():
+            try:
+                result = self.invoke(name, event)
+            except Exception:
+                self.logs.append((self.clock.time(), name, traceback.format_exc()))
+                return
+            failures = result.get('batchItemFailures') if isinstance(result, dict) else None
+            if failures:
+                self.logs.append((self.clock.time(), name, f"Batch item failures: {failures}"))
+        return run
+
+    def _submit(self, task):
+        with self._idle:
+            self._pending += 1
+        if self._executor:
+            self._executor.submit(self._run_task, task)
+        else:
+            with self._idle:
+                self._queue.append(task)
+
+    def _run_task(self, task):
+        try:
+            task()
+        finally:
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+    def run_until_idle(self, timeout=None):
+        """Drains queued asynchronous work, including work it spawns. Returns False on timeout."""
+        if not self._executor:
+            while True:
+                with self._idle:
+                    if self._queue:
+                        due, task = None, self._queue.popleft()
+                    elif self._delayed:
+                        due, _, task = heapq.heappop(self._delayed)
+                    else:
+                        return True
+                if due is not None:
+                    self.clock.sleep(due - self.clock.time())
+                self._run_task(task)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    # --- Streams ---
+    def _attach_stream(self, table, name, batch_size, parallelization=1):
+        # One shard, split into `parallelization` lanes by partition key like the event source's ParallelizationFactor
+        lanes = [{'buffer': [], 'scheduled': False} for _ in range(parallelization)]
+        partition_key = self.dynamodb.table(table).schema.partition_key
+        lock = threading.Lock()
+
+        def flush(state):
+            with lock:
+                batch = state['buffer'][:batch_size]
+                del state['buffer'][:batch_size]
+            try:
+                self.invoke(name, {'Records': batch})
+            except Exception:
+                self.logs.append((self.clock.time(), name, traceback.format_exc()))
+            # Records of one lane are delivered in order, one batch at a time
+            with lock:
+                state['scheduled'] = bool(state['buffer'])
+                if state['scheduled']:
+                    self._submit(lambda: flush(state))
+
+        def on_record(record):
+            key = json.dumps(record['dynamodb']['Keys'][partition_key], sort_keys=True)
+            state = lanes[zlib.crc32(key.encode()) % parallelization]
+            with lock:
+                state['buffer'].append(record)
+                if state['scheduled']:
+                    return
+                state['scheduled'] = True
+            self._submit(lambda: flush(state))
+
+        self.dynamodb.on_stream(table, on_record)
@@ -0,0 +1,333 @@
+"""
+Parser and evaluator for the DynamoDB expression language, covering what the
+handlers use: key conditions, filter and condition expressions, projections
+and SET/ADD/REMOVE update expressions.
+
+Expressions are parsed into small tuples and evaluated against plain Python
+items (numbers as Decimal, as boto3's resource layer returns them).
+"""
+import re
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+
+TOKEN = re.compile(
+    r"\s*(?:(?P<op><>|<=|>=|=|<|>|\(|\)|,|\[|\]|\.|\+|-)"
+    r"|(?P<value>:[A-Za-z0-9_]+)|(?P<name>#?[A-Za-z_][A-Za-z0-9_\-]*)|(?P<index>\d+))"
+)
+KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'ADD', 'REMOVE', 'DELETE'}
+FUNCTIONS = {'attribute_exists', 'attribute_not_exists', 'begins_with', 'contains', 'size',
+             'attribute_type', 'if_not_exists', 'list_append'}
+
+_BUILDER = ConditionExpressionBuilder()
+
+
+def normalize(expression, names=None, values=None, is_key_condition=False):
+    """Turns a boto3 condition object or expression string into (string, names, values)."""
+    names = dict(names or {})
+    values = dict(values or {})
+    if isinstance(expression, ConditionBase):
+        built = _BUILDER.build_expression(expression, is_key_condition=is_key_condition)
+        names.update(built.attribute_name_placeholders)
+        values.update(built.attribute_value_placeholders)
+        expression = built.condition_expression
+    return expression, names, values
+
+
+class Parser:
+    """Recursive-descent parser over one expression string."""
+
+    def __init__(self, text, names, values):
+        self.tokens = self._tokenize(text)
+        self.position = 0
+        self.names = names
+        self.values = values
+
+    @staticmethod
+    def _tokenize(text):
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Invalid expression near: {text[position:]!r}")
+            kind = match.lastgroup
+            token = match.group(kind)
+            if kind == 'name' and token.upper() in KEYWORDS:
+                kind, token = 'keyword', token.upper()
+            tokens.append((kind, token))
+            position = match.end()
+        return tokens
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and token[1] != expected:
+            raise ValueError(f"Expected {expected!r}, found {token[1]!r}")
+        self.position += 1
+        return token
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # --- Conditions ---
+    def condition(self):
+        node = self._and()
+        while self.peek() == ('keyword', 'OR'):
+            self.take()
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self.peek() == ('keyword', 'AND'):
+            self.take()
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self):
+        if self.peek() == ('keyword', 'NOT'):
+            self.take()
+            return ('not', self._not())
+        return self._predicate()
+
+    def _predicate(self):
+        kind, token = self.peek()
+        if token == '(':
+            self.take()
+            node = self.condition()
+            self.take(')')
+            return node
+        if kind == 'name' and token in FUNCTIONS and token != 'size' and self.peek(1)[1] == '(':
+            return self._function()
+        left = self.operand()
+        kind, token = self.peek()
+        if token == 'BETWEEN':
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            return ('between', left, low, self.operand())
+        if token == 'IN':
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek()[1] == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return ('in', left, options)
+        self.take()
+        return ('cmp', token, left, self.operand())
+
+    def _function(self):
+        _, name = self.take()
+        self.take('(')
+        args = [self.operand()]
+        while self.peek()[1] == ',':
+            self.take()
+            args.append(self.operand())
+        self.take(')')
+        return ('call', name, args)
+
+    # --- Operands ---
+    def operand(self):
+        kind, token = self.peek()
+        if kind == 'value':
+            self.take()
+            if token not in self.values:
+                raise ValueError(f"Missing value for {token}")
+            return ('value', self.values[token])
+        if kind == 'name' and token in FUNCTIONS and self.peek(1)[1] == '(':
+            return self._function()
+        return self.path()
+
+    def path(self):
+        parts = [self._name()]
+        while self.peek()[1] in ('.', '['):
+            if self.take()[1] == '.':
+                parts.append(self._name())
+            else:
+                parts.append(int(self.take()[1]))
+                self.take(']')
+        return ('path', parts)
+
+    def _name(self):
+        kind, token = self.take()
+        if kind != 'name':
+            raise ValueError(f"Expected attribute name, found {token!r}")
+        if token.startswith('#'):
+            if token not in self.names:
+                raise ValueError(f"Missing name for {token}")
+            return self.names[token]
+        return token
+
+    # --- Updates ---
+    def update(self):
+        actions = []
+        while not self.done():
+            _, clause = self.take()
+            while True:
+                target = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    actions.append(('set', target, self._set_value()))
+                elif clause in ('ADD', 'DELETE'):
+                    actions.append((clause.lower(), target, self.operand()))
+                elif clause == 'REMOVE':
+                    actions.append(('remove', target))
+                else:
+                    raise ValueError(f"Unsupported update clause {clause!r}")
+                if self.peek()[1] != ',':
+                    break
+                self.take()
+        return actions
+
+    def _set_value(self):
+        node = self.operand()
+        if self.peek()[1] in ('+', '-'):
+            _, op = self.take()
+            node = ('arith', op, node, self.operand())
+        return node
+
+
+def parse_condition(expression, names=None, values=None, is_key_condition=False):
+    """Parses a condition/filter/key-condition expression."""
+    text, names, values = normalize(expression, names, values, is_key_condition)
+    parser = Parser(text, names, values)
+    node = parser.condition()
+    if not parser.done():
+        raise ValueError(f"Unexpected trailing tokens in {text!r}")
+    return node
+
+
+def parse_update(expression, names=None, values=None):
+    """Parses an update expression into a list of actions."""
+    return Parser(expression, dict(names or {}), dict(values or {})).update()
+
+
+def parse_projection(expression, names=None):
+    """Parses a projection expression into a list of top-level attribute names."""
+    parser = Parser(expression, dict(names or {}), {})
+    attributes = [parser.path()[1][0]]
+    while not parser.done():
+        parser.take(',')
+        attributes.append(parser.path()[1][0])
+    return attributes
+
+
+MISSING = object()
+
+
+def resolve(item, node):
+    """Evaluates an operand node against an item."""
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    if kind == 'path':
+        value = item
+        for part in node[1]:
+            try:
+                value = value[part]
+            except (KeyError, IndexError, TypeError):
+                return MISSING
+        return value
+    if kind == 'call':
+        _, name, args = node
+        if name == 'size':
+            value = resolve(item, args[0])
+            return MISSING if value is MISSING else Decimal(len(value))
+        if name == 'if_not_exists':
+            value = resolve(item, args[0])
+            return resolve(item, args[1]) if value is MISSING else value
+        if name == 'list_append':
+            return list(resolve(item, args[0])) + list(resolve(item, args[1]))
+    if kind == 'arith':
+        _, op, left, right = node
+        left, right = Decimal(resolve(item, left)), Decimal(resolve(item, right))
+        return left + right if op == '+' else left - right
+    raise ValueError(f"Unsupported operand {node!r}")
+
+
+def _compare(op, left, right):
+    if left is MISSING or right is MISSING:
+        return op == '<>' and not (left is MISSING and right is MISSING)
+    if op == '=':
+        return left == right
+    if op == '<>':
+        return left != right
+    try:
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+    except TypeError:
+        return False
+
+
+def evaluate(node, item):
+    """Evaluates a parsed condition against an item (None for a missing item)."""
+    item = item or {}
+    kind = node[0]
+    if kind == 'and':
+        return evaluate(node[1], item) and evaluate(node[2], item)
+    if kind == 'or':
+        return evaluate(node[1], item) or evaluate(node[2], item)
+    if kind == 'not':
+        return not evaluate(node[1], item)
+    if kind == 'cmp':
+        return _compare(node[1], resolve(item, node[2]), resolve(item, node[3]))
+    if kind == 'between':
+        value = resolve(item, node[1])
+        return _compare('>=', value, resolve(item, node[2])) and _compare('<=', value, resolve(item, node[3]))
+    if kind == 'in':
+        value = resolve(item, node[1])
+        return value is not MISSING and any(value == resolve(item, option) for option in node[2])
+    if kind == 'call':
+        name, args = node[1], node[2]
+        value = resolve(item, args[0])
+        if name == 'attribute_exists':
+            return value is not MISSING
+        if name == 'attribute_not_exists':
+            return value is MISSING
+        if value is MISSING:
+            return False
+        operand = resolve(item, args[1])
+        if name == 'begins_with':
+            return isinstance(value, str) and value.startswith(operand)
+        if name == 'contains':
+            return operand in value
+    raise ValueError(f"Unsupported condition {node!r}")
+
+
+def equality_on(node, attribute):
+    """Finds the value an expression pins `attribute` to via a top-level AND of equalities."""
+    if node[0] == 'and':
+        found = equality_on(node[1], attribute)
+        return found if found is not MISSING else equality_on(node[2], attribute)
+    if node[0] == 'cmp' and node[1] == '=' and node[2] == ('path', [attribute]) and node[3][0] == 'value':
+        return node[3][1]
+    return MISSING
+
+
+def apply_update(item, actions):
+    """Applies parsed update actions to an item in place."""
+    for action in actions:
+        kind, target = action[0], action[1][1]
+        parent = item
+        for part in target[:-1]:
+            parent = parent.setdefault(part, {})
+        key = target[-1]
+        if kind == 'set':
+            parent[key] = resolve(item, action[2])
+        elif kind == 'remove':
+            parent.pop(key, None)
+        elif kind == 'add':
+            value = resolve(item, action[2])
+            if isinstance(value, set):
+                parent[key] = set(parent.get(key, set())) | value
+            else:
+                parent[key] = Decimal(parent.get(key, 0)) + Decimal(value)
+        elif kind == 'delete':
+            parent[key] = set(parent.get(key, set())) - resolve(item, action[2])
+    return item
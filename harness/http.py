@@ -0,0 +1,68 @@
+"""
+Routes the handlers' outbound `requests` calls to in-process fakes, and
+ai_worker's asyncio HTTP client calls to the same fakes.
+"""
+import asyncio
+import json as _json
+
+import requests
+
+
+class FakeResponse:
+    """Just enough of requests.Response for the handlers."""
+
+    def __init__(self, status_code, body=None, headers=None, url=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.url = url
+        self.text = body if isinstance(body, str) else _json.dumps(body)
+        self.content = self.text.encode()
+        self.ok = status_code < 400
+
+    def json(self):
+        return _json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class HttpRouter:
+    """Dispatches POSTs by URL prefix to registered fakes; anything else fails like an unreachable host."""
+
+    def __init__(self):
+        self.routes = []
+
+    def add(self, prefix, handler):
+        """Registers handler(url, body, headers, timeout) -> FakeResponse for URLs starting with prefix."""
+        self.routes.append((prefix, handler))
+
+    def post(self, url, data=None, json=None, headers=None, timeout=None, **kwargs):
+        body = json if json is not None else (_json.loads(data) if data else None)
+        for prefix, handler in self.routes:
+            if url.startswith(prefix):
+                return handler(url, body, headers or {}, timeout)
+        raise requests.exceptions.ConnectionError(f"No local route for {url}")
+
+
+class AsyncHttpClient:
+    """ai_worker's HTTP client contract over the fakes: `await post(...)` returns a FakeResponse, and timeouts
+    and unreachable hosts raise asyncio.TimeoutError and ConnectionError like the aiohttp client does."""
+
+    def __init__(self):
+        self.routes = []
+
+    def add(self, prefix, handler):
+        """Registers `async handler(url, body, headers, timeout) -> FakeResponse` for URLs starting with prefix."""
+        self.routes.append((prefix, handler))
+
+    async def post(self, url, body, headers, timeout):
+        for prefix, handler in self.routes:
+            if url.startswith(prefix):
+                try:
+                    return await handler(url, body, headers or {}, timeout)
+                except requests.exceptions.Timeout as e:
+                    raise asyncio.TimeoutError(str(e)) from e
+                except requests.exceptions.ConnectionError as e:
+                    raise ConnectionError(str(e)) from e
+        raise ConnectionError(f"No local route for {url}")
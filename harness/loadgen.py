@@ -0,0 +1,260 @@
+"""
+asyncio load generator that plays many concurrent players: join the waiting
+room, poll getWaitingStatus until matched, chat at human typing speed, wait
+for the AI player, then submit a survey.
+
+Players talk to a transport: LocalTransport drives the emulator (subscriptions
+included, timing on a ScaledClock), RemoteTransport drives a deployed AppSync
+API over HTTPS and falls back to polling messagesSince, since subscriptions
+need a websocket client.
+"""
+import asyncio
+import collections
+import random
+import threading
+
+import requests
+
+from harness.emulator import percentile
+
+OPERATIONS = {
+    'joinWaitingRoom': 'mutation { joinWaitingRoom { userId status chatroomId waitTime } }',
+    'getWaitingStatus': 'query GetWaitingStatus($userId: ID!) { getWaitingStatus(userId: $userId) '
+                        '{ userId status chatroomId waitTime } }',
+    'sendMessage': 'mutation SendMessage($chatroomId: ID!, $text: String!, $senderId: String!) '
+                   '{ sendMessage(chatroomId: $chatroomId, text: $text, senderId: $senderId) '
+                   '{ id chatroomId text senderId createdAt } }',
+    'messagesSince': 'query MessagesSince($chatroomId: ID!, $afterId: ID, $nextToken: String) '
+                     '{ messagesSince(chatroomId: $chatroomId, afterId: $afterId, nextToken: $nextToken) '
+                     '{ items { id chatroomId text senderId createdAt } nextToken lastId } }',
+    'submitSurvey': 'mutation SubmitSurvey($chatroomId: ID!, $userId: ID!, $botGuess: String!, $reasoning: String, '
+                    '$llmKnowledge: String!, $chatbotFrequency: String!, $age: Int!, $education: String!) '
+                    '{ submitSurvey(chatroomId: $chatroomId, userId: $userId, botGuess: $botGuess, '
+                    'reasoning: $reasoning, llmKnowledge: $llmKnowledge, chatbotFrequency: $chatbotFrequency, '
+                    'age: $age, education: $education) { id timestamp } }',
+}
+
+CHAT_LINES = [
+    "hey everyone", "where are you all from?", "lol same", "what do you do for fun?",
+    "i think one of you is a bot", "that's exactly what a bot would say", "ok prove you're human",
+    "what did you have for breakfast", "haha no way", "this is harder than i thought",
+]
+
+
+class LocalTransport:
+    """Calls the emulator's AppSync resolvers from worker threads."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.clock = emulator.clock
+        self.loop = None
+
+    async def execute(self, field, arguments=None):
+        return await self.loop.run_in_executor(None, self.emulator.appsync.execute, field, arguments or {})
+
+    def subscribe(self, subscription, arguments, queue):
+        def deliver(result):
+            self.loop.call_soon_threadsafe(queue.put_nowait, result)
+        return self.emulator.appsync.subscribe(subscription, arguments, deliver)
+
+    async def leave(self, user_id):
+        await self.execute('leaveWaitingRoom', {'userId': user_id})
+
+    def invocations(self):
+        return self.emulator.metrics.invocations()
+
+
+class RemoteTransport:
+    """Calls a deployed AppSync API; new messages are discovered by polling messagesSince."""
+
+    def __init__(self, url, api_key, clock, poll_interval=1.0):
+        self.url = url
+        self.api_key = api_key
+        self.clock = clock
+        self.poll_interval = poll_interval
+        self.loop = None
+        self.local = threading.local()
+
+    def _post(self, field, arguments):
+        session = getattr(self.local, 'session', None) or requests.Session()
+        self.local.session = session
+        response = session.post(self.url, json={'query': OPERATIONS[field], 'variables': arguments},
+                                headers={'x-api-key': self.api_key}, timeout=30)
+        response.raise_for_status()
+        body = response.json()
+        if body.get('errors'):
+            raise RuntimeError(f"{field} failed: {body['errors']}")
+        return body['data'][field]
+
+    async def execute(self, field, arguments=None):
+        return await self.loop.run_in_executor(None, self._post, field, arguments or {})
+
+    def subscribe(self, subscription, arguments, queue):
+        if subscription != 'onNewMessage':
+            return lambda: None
+        task = self.loop.create_task(self._poll_messages(arguments['chatroomId'], queue))
+        return task.cancel
+
+    async def _poll_messages(self, chatroom_id, queue):
+        # Each poll fetches only the delta after the newest message seen
+        arguments = {'chatroomId': chatroom_id}
+        while True:
+            page = await self.execute('messagesSince', arguments)
+            for message in page['items']:
+                queue.put_nowait(message)
+            arguments = {'chatroomId': chatroom_id, 'afterId': page['lastId'], 'nextToken': page['nextToken']}
+            if not page['nextToken']:
+                await asyncio.sleep(self.poll_interval)
+
+    async def leave(self, user_id):
+        # The deployed leaveWaitingRoom field takes no arguments, so there is nothing to call
+        return None
+
+    def invocations(self):
+        return {}
+
+
+class LoadStats:
+    """Latency samples (seconds on the scenario clock) and outcome counters."""
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+        self.counters = collections.Counter()
+
+    def add(self, metric, value):
+        self.samples[metric].append(value)
+
+    def report(self):
+        lines = []
+        for metric in ('time_to_match', 'message_rtt', 'ai_reply_latency'):
+            ordered = sorted(self.samples[metric])
+            if not ordered:
+                lines.append(f"{metric:18} no samples")
+                continue
+            lines.append(f"{metric:18} n={len(ordered):<6} p50 {percentile(ordered, 50):7.3f}s  "
+                         f"p90 {percentile(ordered, 90):7.3f}s  p99 {percentile(ordered, 99):7.3f}s  "
+                         f"max {ordered[-1]:7.3f}s")
+        lines.append("outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+
+class Room:
+    """What the players of one chatroom share, for attributing AI reply latency once per reply."""
+
+    def __init__(self):
+        self.last_human_at = None
+        self.ai_messages = set()
+
+
+class LoadGenerator:
+    """Spawns players against a transport and collects their latencies."""
+
+    def __init__(self, transport, players=100, arrival_rate=0.0, messages_per_player=3, typing_cps=5.0,
+                 think_seconds=(1.0, 4.0), poll_interval=2.0, match_timeout=120.0, linger_seconds=20.0,
+                 time_scale=1.0, seed=None):
+        self.transport = transport
+        self.clock = transport.clock
+        self.players = players
+        self.arrival_rate = arrival_rate
+        self.messages_per_player = messages_per_player
+        self.typing_cps = typing_cps
+        self.think_seconds = think_seconds
+        self.poll_interval = poll_interval
+        self.match_timeout = match_timeout
+        self.linger_seconds = linger_seconds
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.stats = LoadStats()
+        self.rooms = {}
+
+    def now(self):
+        return self.clock.monotonic()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds * self.time_scale)
+
+    async def run(self):
+        """Runs the whole scenario and returns the collected stats."""
+        self.transport.loop = asyncio.get_running_loop()
+        tasks = []
+        for index in range(self.players):
+            tasks.append(asyncio.create_task(self.play(index)))
+            if self.arrival_rate:
+                await self.sleep(self.random.expovariate(self.arrival_rate))
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.stats.counters['player_errors'] += 1
+        self.stats.counters.update({f"invocations[{k}]": v for k, v in self.transport.invocations().items()})
+        return self.stats
+
+    async def play(self, index):
+        """One player's session from joining to submitting the survey."""
+        transport = self.transport
+        joined_at = self.now()
+        user_id = (await transport.execute('joinWaitingRoom'))['userId']
+
+        chatroom_id = await self._wait_for_match(user_id, joined_at)
+        if chatroom_id is None:
+            self.stats.counters['unmatched'] += 1
+            await transport.leave(user_id)
+            return
+        self.stats.counters['matched'] += 1
+        self.stats.add('time_to_match', self.now() - joined_at)
+
+        room = self.rooms.setdefault(chatroom_id, Room())
+        sent = {}
+        inbox = asyncio.Queue()
+        unsubscribe = transport.subscribe('onNewMessage', {'chatroomId': chatroom_id}, inbox)
+        receiver = asyncio.create_task(self._receive(user_id, room, inbox, sent))
+        try:
+            for n in range(self.messages_per_player):
+                text = f"{self.random.choice(CHAT_LINES)} ({index}.{n})"
+                await self.sleep(self.random.uniform(*self.think_seconds) + len(text) / self.typing_cps)
+                sent[text] = room.last_human_at = self.now()
+                await transport.execute('sendMessage', {'chatroomId': chatroom_id, 'senderId': user_id, 'text': text})
+                self.stats.counters['messages_sent'] += 1
+            # Give the AI player time to answer the last message
+            await self.sleep(self.linger_seconds)
+        finally:
+            receiver.cancel()
+            unsubscribe()
+
+        await transport.execute('submitSurvey', {
+            'chatroomId': chatroom_id, 'userId': user_id, 'botGuess': self.random.choice(['Player 1', 'Player 2']),
+            'reasoning': 'load test', 'llmKnowledge': self.random.choice(['None', 'Some', 'High', 'Expert']),
+            'chatbotFrequency': self.random.choice(['Never', 'Daily', 'Weekly', 'Monthly']),
+            'age': self.random.randint(18, 70),
+            'education': self.random.choice(['None', 'Highschool', 'Undergraduate', 'Postgraduate']),
+        })
+        self.stats.counters['surveys_submitted'] += 1
+
+    async def _wait_for_match(self, user_id, joined_at):
+        """Waits for onMatchFound, polling getWaitingStatus as the client does. Returns the chatroom id or None."""
+        matches = asyncio.Queue()
+        unsubscribe = self.transport.subscribe('onMatchFound', {'userId': user_id}, matches)
+        try:
+            while self.now() - joined_at < self.match_timeout:
+                try:
+                    match = await asyncio.wait_for(matches.get(), self.poll_interval * self.time_scale)
+                    return match['chatroomId']
+                except asyncio.TimeoutError:
+                    status = await self.transport.execute('getWaitingStatus', {'userId': user_id})
+                    self.stats.counters['status_polls'] += 1
+                    if status and status.get('status') == 'matched':
+                        return status['chatroomId']
+            return None
+        finally:
+            unsubscribe()
+
+    async def _receive(self, user_id, room, inbox, sent):
+        """Records round trips of the player's own messages and latency of AI replies."""
+        while True:
+            message = await inbox.get()
+            arrived_at = self.now()
+            if message['senderId'] == user_id and message['text'] in sent:
+                self.stats.add('message_rtt', arrived_at - sent.pop(message['text']))
+            elif message['senderId'].startswith('ai-') and message['id'] not in room.ai_messages:
+                room.ai_messages.add(message['id'])
+                if room.last_human_at is not None:
+                    self.stats.add('ai_reply_latency', arrived_at - room.last_human_at)
+                self.stats.counters['ai_replies'] += 1
@@ -0,0 +1,119 @@
+"""
+Fake OpenAI Responses API. Replies are produced by a callable so scenarios
+can script the AI player; latency is spent on the harness clock, and a
+request whose latency exceeds its timeout raises requests' ReadTimeout.
+
+Faults are injected with a callable (request number, body) -> Fault or None:
+
+    emulator.openai.faults = scripted(Fault(status=429, retry_after=1), Fault(latency=40))
+    emulator.openai.faults = random_faults(0.3, seed=7)
+"""
+import collections
+import itertools
+import random
+import threading
+
+import requests
+
+from harness.http import FakeResponse
+
+# An injected failure: an error status (optionally with Retry-After) and/or a latency override
+Fault = collections.namedtuple('Fault', 'status retry_after latency', defaults=(None, None, None))
+
+
+def scripted(*faults):
+    """Applies the given faults to the first requests, in order; None lets a request through."""
+    def next_fault(number, body):
+        return faults[number - 1] if number <= len(faults) else None
+    return next_fault
+
+
+def random_faults(rate, seed=None, statuses=(429, 500, 503), timeout_share=0.25, timeout_latency=60.0):
+    """Fails a `rate` fraction of requests: mostly error statuses, some hanging past any timeout."""
+    generator = random.Random(seed)
+    lock = threading.Lock()
+
+    def next_fault(number, body):
+        with lock:
+            if generator.random() >= rate:
+                return None
+            if generator.random() < timeout_share:
+                return Fault(latency=timeout_latency)
+            status = generator.choice(statuses)
+            return Fault(status=status, retry_after=generator.choice([None, 0.5, 1]) if status == 429 else None)
+    return next_fault
+
+
+def default_reply(input_items, instructions):
+    """Answers the latest human message with a short, deterministic line."""
+    last = next((item['content'] for item in reversed(input_items) if item.get('role') == 'user'), '')
+    return f"haha yeah, {last.lower()[:40]}" if last else "hey"
+
+
+class FakeOpenAI:
+    """Serves POST /v1/responses with a Responses-API-shaped payload."""
+
+    def __init__(self, clock, reply=default_reply, latency=0.5, faults=None):
+        self.clock = clock
+        self.reply = reply
+        self.latency = latency
+        self.faults = faults
+        self.outcomes = collections.Counter()
+        self.requests = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def handle_http(self, url, body, headers, timeout):
+        latency, respond = self._prepare(url, body, headers, timeout)
+        self.clock.sleep(latency)
+        return respond()
+
+    async def handle_http_async(self, url, body, headers, timeout):
+        """handle_http for asyncio callers: the latency is awaited instead of blocking a thread."""
+        latency, respond = self._prepare(url, body, headers, timeout)
+        await self.clock.sleep_async(latency)
+        return respond()
+
+    def _prepare(self, url, body, headers, timeout):
+        """Returns (seconds the request takes, callable producing its response or raising its timeout)."""
+        with self.lock:
+            self.requests.append(body)
+            response_id = next(self.ids)
+        if not headers.get('Authorization', '').startswith('Bearer '):
+            return 0, lambda: FakeResponse(401, {'error': {'message': 'Missing API key'}}, url=url)
+        fault = self.faults(response_id, body) if self.faults else None
+        latency = self.latency(body) if callable(self.latency) else self.latency
+        if fault and fault.latency is not None:
+            latency = fault.latency
+        if timeout is not None and latency > timeout:
+            def time_out():
+                self._count('timeout')
+                raise requests.exceptions.ReadTimeout(f"Read timed out. (read timeout={timeout})")
+            return timeout, time_out
+        return latency, lambda: self._respond(url, body, response_id, fault)
+
+    def _respond(self, url, body, response_id, fault):
+        if fault and fault.status:
+            self._count(fault.status)
+            headers = {'Retry-After': str(fault.retry_after)} if fault.retry_after is not None else {}
+            return FakeResponse(fault.status, {'error': {'message': f"Injected {fault.status}"}},
+                                headers=headers, url=url)
+        self._count(200)
+        text = self.reply(body.get('input', []), body.get('instructions'))
+        return FakeResponse(200, {
+            'id': f"resp_local_{response_id}",
+            'object': 'response',
+            'model': body.get('model'),
+            'status': 'completed',
+            'output': [
+                {'id': f"rs_local_{response_id}", 'type': 'reasoning', 'summary': []},
+                {'id': f"msg_local_{response_id}", 'type': 'message', 'role': 'assistant', 'status': 'completed',
+                 'content': [{'type': 'output_text', 'text': text, 'annotations': []}]},
+            ],
+            'usage': {'input_tokens': sum(len(str(i.get('content', ''))) // 4 for i in body.get('input', [])),
+                      'output_tokens': len(text) // 4},
+        }, url=url)
+
+    def _count(self, outcome):
+        with self.lock:
+            self.outcomes[outcome] += 1
@@ -0,0 +1,71 @@
+"""
+Stand-ins for the non-DynamoDB AWS clients the handlers create: Lambda,
+Secrets Manager, SSM and SQS.
+"""
+import io
+import json
+import uuid
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+
+class FakeLambdaClient:
+    """Routes Lambda invokes to handlers registered with the emulator."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.meta = SimpleNamespace(region_name='local')
+
+    def invoke(self, FunctionName, Payload=b'{}', InvocationType='RequestResponse', **kwargs):
+        event = json.loads(Payload or '{}')
+        name = self.emulator.function_for(FunctionName)
+        if InvocationType == 'Event':
+            self.emulator.invoke_async(name, event)
+            return {'StatusCode': 202, 'Payload': io.BytesIO(b'')}
+        result = self.emulator.invoke(name, event)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result, default=str).encode())}
+
+
+class FakeSecretsManagerClient:
+    """Serves secrets from a dict of name -> SecretString."""
+
+    def __init__(self, secrets):
+        self.secrets = secrets
+
+    def get_secret_value(self, SecretId, **kwargs):
+        if SecretId not in self.secrets:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': SecretId}}, 'GetSecretValue')
+        return {'Name': SecretId, 'SecretString': self.secrets[SecretId]}
+
+
+class FakeSSMClient:
+    """Serves parameters from a dict of name -> value."""
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+
+    def get_parameter(self, Name, WithDecryption=False, **kwargs):
+        if Name not in self.parameters:
+            raise ClientError({'Error': {'Code': 'ParameterNotFound', 'Message': Name}}, 'GetParameter')
+        return {'Parameter': {'Name': Name, 'Value': self.parameters[Name], 'Type': 'String'}}
+
+
+class FakeSQSClient:
+    """Delivers sent messages to the function a queue's event source feeds, after their DelaySeconds."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0, **kwargs):
+        message_id = str(uuid.uuid4())
+        record = {
+            'messageId': message_id,
+            'receiptHandle': message_id,
+            'body': MessageBody,
+            'attributes': {'ApproximateReceiveCount': '1'},
+            'eventSource': 'aws:sqs',
+            'eventSourceARN': QueueUrl,
+        }
+        self.emulator.invoke_later(self.emulator.function_for_queue(QueueUrl), {'Records': [record]}, DelaySeconds)
+        return {'MessageId': message_id}
@@ -1,16 +1,38 @@
 import boto3
+import contextvars
 import json
 import os
 import requests
-import uuid
-from datetime import datetime, timezone
-import time
-import random
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as SlotTimeout
+
+try:
+    # Rust JSON parser; decodes large Responses payloads about 4x faster than json
+    import jiter
+except ImportError:
+    # Not bundled, or bundled for another platform than the Lambda runtime's
+    jiter = None
+
+from common.chatrooms import ChatroomCache
+from common.circuit import CircuitBreaker
+from common.deadline import Deadline
+from common.fanout import FanOut
+from common.items import CHATROOM, CIRCUIT_STATE, MESSAGE, ItemTable
+from common.messages import latest_messages
+from common.metrics import annotate, count, instrumented, span
+from common.replies import (APPSYNC_TIMEOUT_SECONDS, DELIVERY_RESERVE_SECONDS, FALLBACK_RESERVE_SECONDS,
+                            HISTORY_SIZE, MIN_GENERATION_SECONDS, OPENAI_URL, SEND_MESSAGE_MUTATION, SILENCE_TOKEN,
+                            build_input_items, claim_reply, extract_output_text, get_ai_prompt, get_openai_api_key,
+                            newer_message, openai_request_body, reply_rank, reply_turn, run_turn,
+                            still_current)
+from common.retry import LatencyWindow, call_with_retries
+from common.scheduler import ThreadScheduler
 
 # Initialize clients
-DYNAMODB = boto3.resource('dynamodb')
+# Every table goes through the low-level client; see common/items.py
+DYNAMODB_CLIENT = boto3.client('dynamodb')
 SECRETS_MANAGER = boto3.client('secretsmanager')
 SSM = boto3.client('ssm')
+SQS = boto3.client('sqs')
 
 # Get environment variables
 MESSAGES_TABLE_NAME = os.environ.get('MESSAGES_TABLE')
@@ -19,207 +41,286 @@ OPENAI_API_KEY_SECRET_NAME = os.environ.get('OPENAI_API_KEY_SECRET_NAME')
 APPSYNC_URL = os.environ.get('APPSYNC_URL')
 APPSYNC_API_KEY = os.environ.get('APPSYNC_API_KEY')
 AI_PROMPT_PARAMETER_NAME = os.environ.get('AI_PROMPT_PARAMETER')
+# Holds the OpenAI circuit breaker state shared by all containers
+APP_STATE_TABLE_NAME = os.environ.get('APP_STATE_TABLE')
+# Replies wait out their typing delay here before delivery_handler posts them
+AI_REPLY_QUEUE_URL = os.environ.get('AI_REPLY_QUEUE_URL')
+# OpenAI generations in flight at once per container, across the rooms of a batch and per room
+MAX_GENERATIONS_IN_FLIGHT = int(os.environ.get('AI_RESPONSE_GENERATIONS', '5'))
+ROOM_GENERATIONS_IN_FLIGHT = 1
 
 # Validate environment variables
 if not AI_PROMPT_PARAMETER_NAME:
     raise ValueError("AI_PROMPT_PARAMETER environment variable is not set")
 
-if not all([MESSAGES_TABLE_NAME, CHATROOMS_TABLE_NAME, OPENAI_API_KEY_SECRET_NAME, APPSYNC_URL, APPSYNC_API_KEY]):
+if not all([MESSAGES_TABLE_NAME, CHATROOMS_TABLE_NAME, OPENAI_API_KEY_SECRET_NAME, APPSYNC_URL, APPSYNC_API_KEY,
+            APP_STATE_TABLE_NAME, AI_REPLY_QUEUE_URL]):
     raise ValueError("One or more required environment variables are not set")
 
 # Initialize tables
-MESSAGES_TABLE = DYNAMODB.Table(MESSAGES_TABLE_NAME)
-CHATROOMS_TABLE = DYNAMODB.Table(CHATROOMS_TABLE_NAME)
-
-# --- CONFIGURATION FOR TYPING SIMULATION ---
-TYPING_SPEED_CPS = 7
-MIN_THINKING_SECONDS = 1.0
-MAX_RANDOM_THINKING_SECONDS = 2.5
-MAX_DELAY_SECONDS = 15  # IMPORTANT: Ensure your Lambda timeout is > this value
-
-def get_openai_api_key():
-    """Fetches the OpenAI API key from AWS Secrets Manager."""
-    response = SECRETS_MANAGER.get_secret_value(SecretId=OPENAI_API_KEY_SECRET_NAME)
-    secret = json.loads(response['SecretString'])
-    return secret['openai_api_key']
-
-def get_ai_prompt():
-    """Fetches the AI prompt from SSM Parameter Store."""
-    response = SSM.get_parameter(Name=AI_PROMPT_PARAMETER_NAME, WithDecryption=True)
-    return response['Parameter']['Value']
-
-def send_message_via_appsync(chatroom_id, text, sender_id):
+MESSAGES_TABLE = ItemTable(DYNAMODB_CLIENT, MESSAGES_TABLE_NAME, MESSAGE)
+CHATROOMS_TABLE = ItemTable(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME, CHATROOM)
+# Participants never change once matchmaking writes a room; read each room once per container
+CHATROOMS = ChatroomCache(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME)
+OPENAI_BREAKER = CircuitBreaker(ItemTable(DYNAMODB_CLIENT, APP_STATE_TABLE_NAME, CIRCUIT_STATE), 'openai')
+# The rooms of a batch queue here for OpenAI, longest-waiting and busiest first (common.replies.reply_rank)
+GENERATIONS = ThreadScheduler(MAX_GENERATIONS_IN_FLIGHT, per_key=ROOM_GENERATIONS_IN_FLIGHT)
+
+# --- CONFIGURATION FOR OPENAI RETRIES ---
+# Hedge an OpenAI request still running at this container's p95 latency
+OPENAI_HEDGE_ENABLED = os.environ.get('OPENAI_HEDGE_ENABLED', 'false').lower() == 'true'
+OPENAI_LATENCIES = LatencyWindow() if OPENAI_HEDGE_ENABLED else None
+
+def send_message_via_appsync(chatroom_id, text, sender_id, timeout=APPSYNC_TIMEOUT_SECONDS):
     """Sends a message through AppSync to trigger subscriptions."""
-    mutation = """
-    mutation SendMessage($chatroomId: ID!, $text: String!, $senderId: String!) {
-        sendMessage(chatroomId: $chatroomId, text: $text, senderId: $senderId) {
-            id, chatroomId, text, senderId, createdAt
-        }
-    }
-    """
     variables = {"chatroomId": chatroom_id, "text": text, "senderId": sender_id}
     response = requests.post(
         APPSYNC_URL,
         headers={'Content-Type': 'application/json', 'x-api-key': APPSYNC_API_KEY},
-        json={'query': mutation, 'variables': variables},
-        timeout=10
+        json={'query': SEND_MESSAGE_MUTATION, 'variables': variables},
+        timeout=timeout
     )
     response.raise_for_status()
     return response.json()
 
-def extract_output_text(resp_json: dict) -> str:
-    """Extract text from the new Responses API output format."""
-    parts = []
-    for item in resp_json.get("output", []):
-        if item.get("type") == "message":
-            for c in item.get("content", []):
-                if c.get("type") == "output_text":
-                    parts.append(c.get("text", ""))
-    return "".join(parts)
+def decode_openai_response(body):
+    """Decodes a Responses API body (bytes) with jiter when it is available, else with json."""
+    with span('openai_decode'):
+        if jiter is not None:
+            return jiter.from_json(body)
+        return json.loads(body)
 
-def handler(event, context):
-    """Gets AI response and sends via AppSync after a simulated typing delay."""
-    try:
-        chatroom_id = event['chatroomId']
-        
-        OPENAI_API_KEY = get_openai_api_key()
-        ai_prompt_content = get_ai_prompt()  # Get the AI prompt from SSM
+def admit_hedge():
+    """Charges a hedged OpenAI request to the circuit breaker. Returns its release(ok), or None to skip the hedge."""
+    permit = OPENAI_BREAKER.acquire()
+    if permit is None:
+        return None
+    return lambda ok: OPENAI_BREAKER.release(permit, ok)
 
-        # Get chatroom details
-        chatroom_response = CHATROOMS_TABLE.get_item(Key={'id': chatroom_id})
-        if 'Item' not in chatroom_response:
-            print("Chatroom not found.")
-            return
-        
-        chatroom_item = chatroom_response['Item']
-        ai_id = next((p for p in chatroom_item.get('participants', []) if p.startswith('ai-')), None)
-        if not ai_id:
-            print("AI participant not found in chatroom.")
-            return
+def generate_reply(api_key, ai_prompt_content, input_items, deadline):
+    """Asks OpenAI for the AI's next message. Returns its text, or None if there is nothing to send."""
+    # Don't start a generation that could not be delivered before the Lambda times out
+    if not deadline.allows(MIN_GENERATION_SECONDS, reserve=DELIVERY_RESERVE_SECONDS):
+        count('DeadlineSkipped')
+        print(f"Only {deadline.remaining():.2f}s left. Skipping this reply.")
+        return None
 
-        # Get recent messages
-        response = MESSAGES_TABLE.query(
-            KeyConditionExpression='chatroomId = :cid',
-            ExpressionAttributeValues={':cid': chatroom_id},
-            Limit=30,
-            ScanIndexForward=False
-        )
-        all_messages = sorted(response.get('Items', []), key=lambda x: x['createdAt'])
-        
-        # Check if AI was the last to speak
-        if not all_messages or all_messages[-1]['senderId'].startswith('ai-'):
-            print("No human messages to respond to or AI was the last to speak.")
-            return
-        
-        # Check if there are multiple human messages since last AI response
-        # Find the last AI message
-        last_ai_index = -1
-        for i in range(len(all_messages) - 1, -1, -1):
-            if all_messages[i]['senderId'].startswith('ai-'):
-                last_ai_index = i
-                break
-        
-        # Get messages since last AI response
-        messages_since_ai = all_messages[last_ai_index + 1:] if last_ai_index >= 0 else all_messages
+    # Shed the turn instead of queuing behind a slow or failing OpenAI
+    with span('circuit_acquire'):
+        permit = OPENAI_BREAKER.acquire()
+    if permit is None:
+        count('OpenAIShed')
+        print("OpenAI circuit open or at its concurrency limit. Skipping this reply.")
+        return None
+
+    # Get AI response using new Responses API, retrying within this invocation's time budget
+    api_response = None
+    openai_ok = False
+    try:
+        with span('openai_call'):
+            api_response = call_with_retries(
+                lambda timeout, session=requests: session.post(
+                    OPENAI_URL,
+                    headers={
+                        "Authorization": f"Bearer {api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    json=openai_request_body(input_items, ai_prompt_content),
+                    timeout=timeout,
+                ),
+                deadline=deadline,
+                timeout=OPENAI_BREAKER.timeout(permit),
+                latencies=OPENAI_LATENCIES,
+                reserve=DELIVERY_RESERVE_SECONDS,
+                admit_hedge=admit_hedge,
+            )
+        # Rate limits and server errors count against OpenAI; other statuses mean it is up
+        openai_ok = api_response.status_code < 500 and api_response.status_code != 429
+        api_response.raise_for_status()
+        ai_text = extract_output_text(decode_openai_response(api_response.content)).strip()
         
-        # Only respond if there's been enough human activity (at least 1 message from each human, or 2+ messages total)
-        unique_human_senders = set(msg['senderId'] for msg in messages_since_ai if not msg['senderId'].startswith('ai-'))
+        # Check if AI wants to remain silent
+        if ai_text == SILENCE_TOKEN:
+            print(f"AI chose to remain silent ({SILENCE_TOKEN}). Not sending message.")
+            return None
         
-        # If only one human has spoken once, wait for more conversation
-        if len(messages_since_ai) < 2 and len(unique_human_senders) < 2:
-            print(f"Waiting for more conversation activity. Only {len(messages_since_ai)} message(s) from {len(unique_human_senders)} human(s).")
-            return
+        if not ai_text:
+            print("OpenAI returned an empty response.")
+            return None
+        return ai_text
 
-        # Prepare input for OpenAI Responses API
-        input_items = []
-        human_participant_names = {}
-        player_counter = 1
-        
-        for msg in all_messages:
-            sender_id = msg['senderId']
-            if not sender_id.startswith('ai-') and sender_id not in human_participant_names:
-                human_participant_names[sender_id] = f"Player_{player_counter}"
-                player_counter += 1
-
-        for msg in all_messages:
-            sender_id = msg['senderId']
-            role = "assistant" if sender_id.startswith('ai-') else "user"
-            name = "AI_Player" if role == "assistant" else human_participant_names.get(sender_id, "Unknown_Player")
-            input_items.append({"role": role, "name": name, "content": msg['text']})
-
-        # Get AI response using new Responses API
-        api_response = None
+    # ValueError: a body that is not JSON, from either decoder
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"OpenAI API error: {e}")
+        if api_response is not None:
+            print(f"Status: {api_response.status_code}, Response: {api_response.text}")
+        return None
+    finally:
+        with span('circuit_release'):
+            OPENAI_BREAKER.release(permit, openai_ok)
+
+def chatrooms_with_human_messages(records):
+    """Returns the ids of chatrooms with a new human message in a MessagesTable stream batch, in first-seen order."""
+    chatroom_ids = {}
+    for record in records:
+        if record.get('eventName') != 'INSERT':
+            continue
+        image = record.get('dynamodb', {}).get('NewImage', {})
+        chatroom_id = image.get('chatroomId', {}).get('S')
+        sender_id = image.get('senderId', {}).get('S', '')
+        # The AI's own messages never need a reply
+        if chatroom_id and not sender_id.startswith('ai-'):
+            chatroom_ids[chatroom_id] = True
+    return list(chatroom_ids)
+
+def hand_off_reply(chatroom_id, ai_text, ai_id, answered_id, delay):
+    """Queues a reply for delivery_handler to post once `delay` seconds of simulated typing have passed."""
+    SQS.send_message(
+        QueueUrl=AI_REPLY_QUEUE_URL,
+        MessageBody=json.dumps({'chatroomId': chatroom_id, 'text': ai_text, 'senderId': ai_id,
+                                'answeredId': answered_id}),
+        DelaySeconds=round(delay),
+    )
+
+def post_reply(chatroom_id, ai_text, ai_id, deadline):
+    """Posts the reply through AppSync, or writes it to MessagesTable directly if AppSync fails."""
+    try:
+        with span('appsync_post'):
+            send_message_via_appsync(chatroom_id, ai_text, ai_id,
+                                     timeout=min(APPSYNC_TIMEOUT_SECONDS,
+                                                 deadline.remaining(reserve=FALLBACK_RESERVE_SECONDS)))
+        print(f"AI response sent via AppSync using senderId: '{ai_id}'")
+    except Exception as e:
+        print(f"AppSync error: {e}. Falling back to direct DynamoDB write.")
+        # Only needed on this fallback path, so kept out of container init
+        from common.ulid import new_ulid, ulid_isoformat
+        message_id = new_ulid()
+        ai_message = {
+            'id': message_id,
+            'chatroomId': chatroom_id,
+            'text': ai_text,
+            'senderId': ai_id,
+            'createdAt': ulid_isoformat(message_id),
+        }
+        with span('fallback_write'):
+            MESSAGES_TABLE.put_item(Item=ai_message)
+
+@instrumented('ai_delivery')
+def delivery_handler(event, context):
+    """Posts the replies of an AiReplyQueue batch, whose typing delay has passed, unless newer messages made them stale."""
+    deadline = Deadline.from_context(context)
+    failures = []
+    for record in event['Records']:
+        reply = json.loads(record['body'])
+        chatroom_id = reply['chatroomId']
         try:
-            api_response = requests.post(
-                "https://api.openai.com/v1/responses",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "gpt-5.2",  # Using a valid model
-                    "input": input_items,
-                    "instructions": ai_prompt_content,
-                    "temperature": 1.0,
-                },
-                timeout=30,
-            )
-            api_response.raise_for_status()
-            response_data = api_response.json()
-            ai_text = extract_output_text(response_data).strip()
-            
-            # Check if AI wants to remain silent
-            if ai_text == "Silence1":
-                print("AI chose to remain silent (Silence1). Not sending message.")
-                return
-            
-            if not ai_text:
-                print("OpenAI returned an empty response.")
-                return
-
-        except requests.exceptions.RequestException as e:
-            print(f"OpenAI API error: {e}")
-            if api_response is not None:
-                print(f"Status: {api_response.status_code}, Response: {api_response.text}")
+            if still_current(MESSAGES_TABLE, chatroom_id, reply['answeredId']):
+                post_reply(chatroom_id, reply['text'], reply['senderId'], deadline)
+        except Exception as e:
+            print(f"Failed to deliver the reply in chatroom {chatroom_id}: {e}")
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
+
+@instrumented('ai_response')
+def handler(event, context):
+    """Replies in each chatroom of a MessagesTable stream batch (or a {chatroomId} event), delivered after a simulated typing delay."""
+    deadline = Deadline.from_context(context)
+    if 'Records' in event:
+        chatroom_ids = chatrooms_with_human_messages(event['Records'])
+        annotate(records=len(event['Records']), chatrooms=len(chatroom_ids))
+    else:
+        chatroom_ids = [event['chatroomId']]
+    if not chatroom_ids:
+        return
+
+    # The key and prompt load while the rooms read their records and history; none depends on another
+    with FanOut(2) as setup:
+        api_key = setup.submit('secret_fetch', get_openai_api_key, SECRETS_MANAGER, OPENAI_API_KEY_SECRET_NAME)
+        # Get the AI prompt from SSM
+        ai_prompt_content = setup.submit('prompt_fetch', get_ai_prompt, SSM, AI_PROMPT_PARAMETER_NAME)
+
+        if len(chatroom_ids) == 1:
+            respond(chatroom_ids[0], api_key, ai_prompt_content, deadline)
             return
-            
-        # Calculate and apply typing delay
+
+        # Rooms of a batch share the invocation's deadline, so they are answered side by side rather than in turn;
+        # their generations then queue for GENERATIONS by rank
+        with ThreadPoolExecutor(max_workers=len(chatroom_ids), thread_name_prefix='room') as pool:
+            futures = {
+                chatroom_id: pool.submit(contextvars.copy_context().run, respond,
+                                         chatroom_id, api_key, ai_prompt_content, deadline)
+                for chatroom_id in chatroom_ids
+            }
+    failed = [chatroom_id for chatroom_id, future in futures.items() if future.exception() is not None]
+    if failed:
+        # A retried batch is safe: rooms already answered find their message claimed and skip it
+        raise Exception(f"Failed to respond in chatrooms: {', '.join(failed)}")
+
+class Room:
+    """Performs reply_turn's steps for ai_response: blocking calls, each timed as a metrics span.
+
+    `api_key` and `ai_prompt_content` are futures, only waited for once a reply is due.
+    """
+
+    def __init__(self, api_key, ai_prompt_content):
+        self.api_key = api_key
+        self.ai_prompt_content = ai_prompt_content
+
+    def read(self, chatroom_id):
+        # Get chatroom details and recent messages at once
+        with span('setup'), FanOut(2) as reads:
+            chatroom_item = reads.submit(None, CHATROOMS.get, chatroom_id)
+            all_messages = reads.submit('history_query', latest_messages, MESSAGES_TABLE, chatroom_id, HISTORY_SIZE)
+            chatroom_item = chatroom_item.result()
+            # Leaving the block drops the history query of a room that does not exist
+            return chatroom_item, all_messages.result() if chatroom_item is not None else None
+
+    def prepare(self):
+        # Fetched by the handler alongside the reads above
+        with span('setup'):
+            self.api_key, self.ai_prompt_content = FanOut.gather(self.api_key, self.ai_prompt_content)
+
+    def claim(self, chatroom_id, message_id):
+        return claim_reply(CHATROOMS_TABLE, chatroom_id, message_id)
+
+    def history(self, chatroom_id):
+        with span('history_query'):
+            return latest_messages(MESSAGES_TABLE, chatroom_id, HISTORY_SIZE)
+
+    def generate(self, chatroom_id, all_messages, deadline):
+        # Wait for a generation slot only while a generation could still finish in time
         try:
-            # 1. Calculate the time it would take to type the message
-            typing_delay = len(ai_text) / TYPING_SPEED_CPS
-            
-            # 2. Calculate a random "thinking" time
-            thinking_delay = MIN_THINKING_SECONDS + random.uniform(0, MAX_RANDOM_THINKING_SECONDS)
-            
-            # 3. Add them together to get the total delay
-            total_delay = thinking_delay + typing_delay
-            
-            # 4. Cap the delay to prevent the Lambda from timing out
-            if total_delay > MAX_DELAY_SECONDS:
-                print(f"Calculated delay {total_delay:.2f}s is too long, capping at {MAX_DELAY_SECONDS}s.")
-                total_delay = MAX_DELAY_SECONDS
-                
-            print(f"Simulating human response. Thinking: {thinking_delay:.2f}s, Typing: {typing_delay:.2f}s. Total Wait: {total_delay:.2f}s.")
-            time.sleep(total_delay)
+            with span('generation_wait'):
+                waited = GENERATIONS.acquire(chatroom_id, reply_rank(all_messages),
+                                             timeout=deadline.remaining(reserve=DELIVERY_RESERVE_SECONDS
+                                                                        + MIN_GENERATION_SECONDS))
+        except SlotTimeout:
+            count('GenerationSlotExpired')
+            print("No generation slot freed up in time. Skipping this reply.")
+            return None
+        if waited:
+            count('GenerationsQueued')
+        try:
+            return generate_reply(self.api_key, self.ai_prompt_content, build_input_items(all_messages), deadline)
+        finally:
+            GENERATIONS.release(chatroom_id)
 
-        except Exception as e:
-            print(f"Error during delay calculation: {e}. Sending message immediately.")
+    def newer(self, chatroom_id, answered_id):
+        return newer_message(MESSAGES_TABLE, chatroom_id, answered_id)
 
-        # Send response after delay
+    def deliver(self, chatroom_id, ai_id, ai_text, delay, answered_id, deadline):
+        # The delay is waited out on the reply queue, so this stream lane moves on to its other rooms
         try:
-            send_message_via_appsync(chatroom_id, ai_text, ai_id)
-            print(f"AI response sent via AppSync using senderId: '{ai_id}'")
+            with span('reply_handoff'):
+                hand_off_reply(chatroom_id, ai_text, ai_id, answered_id, delay)
         except Exception as e:
-            print(f"AppSync error: {e}. Falling back to direct DynamoDB write.")
-            ai_message = {
-                'id': str(uuid.uuid4()),
-                'chatroomId': chatroom_id,
-                'text': ai_text,
-                'senderId': ai_id,
-                'createdAt': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
-            }
-            MESSAGES_TABLE.put_item(Item=ai_message)
-            
+            print(f"Reply hand-off error: {e}. Sending the reply now.")
+            post_reply(chatroom_id, ai_text, ai_id, deadline)
+
+def respond(chatroom_id, api_key, ai_prompt_content, deadline):
+    """Gets AI response for one chatroom and hands it off to be sent via AppSync after a simulated typing delay."""
+    try:
+        run_turn(reply_turn(chatroom_id, deadline), Room(api_key, ai_prompt_content))
     except Exception as e:
-        print(f"Unexpected error in handler: {e}")
-        raise
\ No newline at end of file
+        print(f"Unexpected error in chatroom {chatroom_id}: {e}")
+        raise
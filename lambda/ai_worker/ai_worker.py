@@ -0,0 +1,358 @@
+"""
+Prototype, not deployed: the stack creates no queue, process or sender for
+it, and sets no AI_WORKER_QUEUE_URL. ai_response stays the production path;
+this module exists to measure the alternative (scripts/bench_ai_worker.py).
+
+A long-running AI player worker instead of one ai_response invocation per
+turn. A single process takes chatrooms to evaluate from an SQS queue and
+serves hundreds of them at once on one asyncio event loop, where each
+ai_response invocation spends most of its time blocked in requests.post.
+
+A room goes through the same turn as in ai_response, common.replies.reply_turn:
+the history check, the reply claim, generation through the OpenAI circuit
+breaker with common.retry.RetryPolicy's jittered retries, stale-message
+checks, the typing delay (here a per-room timer) and delivery through
+AppSync. The worker performs the turn's steps itself: HTTP is asynchronous
+(aiohttp), and DynamoDB calls, blocking in boto3, run on the loop's thread
+pool.
+
+Generations queue for a common.scheduler.Scheduler: at most
+AI_WORKER_GENERATIONS in flight (one per room), handed out by
+common.replies.reply_rank so that rooms whose humans have waited longest, or
+are busiest, get OpenAI first. With METRICS_ENABLED the worker logs the
+scheduler's queue depth and waits as an EMF line every
+AI_WORKER_METRICS_SECONDS.
+
+To try it, build the bundle like a handler's (python scripts/build_lambdas.py
+ai_worker) and run it as a process, for example in a container:
+
+    AI_WORKER_QUEUE_URL=https://sqs.../ai-rooms python ai_worker.py
+
+Queue messages are {"chatroomId": ...}, one per new human message, for
+instance sent by an EventBridge Pipe from the MessagesTable stream. The
+secret and prompt are read at startup.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from common.chatrooms import ChatroomCache
+from common.circuit import CircuitBreaker
+from common.deadline import Deadline
+from common.items import CHATROOM, CIRCUIT_STATE, MESSAGE, ItemTable
+from common.messages import latest_messages
+from common.metrics import METRICS_ENABLED, Invocation
+from common.replies import (APPSYNC_TIMEOUT_SECONDS, DELIVERY_RESERVE_SECONDS, FALLBACK_RESERVE_SECONDS,
+                            HISTORY_SIZE, MIN_GENERATION_SECONDS, OPENAI_URL, SEND_MESSAGE_MUTATION, SILENCE_TOKEN,
+                            build_input_items, claim_reply, extract_output_text, get_ai_prompt, get_openai_api_key,
+                            newer_message, openai_request_body, reply_rank, reply_turn, run_turn_async,
+                            still_current)
+from common.retry import RetryPolicy
+from common.scheduler import Scheduler
+from common.ulid import new_ulid, ulid_isoformat
+
+# Initialize clients
+# Every table goes through the low-level client; see common/items.py
+DYNAMODB_CLIENT = boto3.client('dynamodb')
+SECRETS_MANAGER = boto3.client('secretsmanager')
+SSM = boto3.client('ssm')
+
+# Get environment variables
+MESSAGES_TABLE_NAME = os.environ.get('MESSAGES_TABLE')
+CHATROOMS_TABLE_NAME = os.environ.get('CHATROOMS_TABLE')
+OPENAI_API_KEY_SECRET_NAME = os.environ.get('OPENAI_API_KEY_SECRET_NAME')
+APPSYNC_URL = os.environ.get('APPSYNC_URL')
+APPSYNC_API_KEY = os.environ.get('APPSYNC_API_KEY')
+AI_PROMPT_PARAMETER_NAME = os.environ.get('AI_PROMPT_PARAMETER')
+APP_STATE_TABLE_NAME = os.environ.get('APP_STATE_TABLE')
+# Rooms evaluated at once; the rest wait in the queue
+MAX_ROOMS = int(os.environ.get('AI_WORKER_MAX_ROOMS', '500'))
+# OpenAI generations in flight at once, across rooms and per room
+MAX_GENERATIONS_IN_FLIGHT = int(os.environ.get('AI_WORKER_GENERATIONS', '50'))
+ROOM_GENERATIONS_IN_FLIGHT = 1
+METRICS_SECONDS = float(os.environ.get('AI_WORKER_METRICS_SECONDS', '60'))
+
+# Validate environment variables
+if not all([MESSAGES_TABLE_NAME, CHATROOMS_TABLE_NAME, OPENAI_API_KEY_SECRET_NAME, APPSYNC_URL, APPSYNC_API_KEY,
+            AI_PROMPT_PARAMETER_NAME, APP_STATE_TABLE_NAME]):
+    raise ValueError("One or more required environment variables are not set")
+
+# Initialize tables
+MESSAGES_TABLE = ItemTable(DYNAMODB_CLIENT, MESSAGES_TABLE_NAME, MESSAGE)
+CHATROOMS_TABLE = ItemTable(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME, CHATROOM)
+CHATROOMS = ChatroomCache(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME)
+OPENAI_BREAKER = CircuitBreaker(ItemTable(DYNAMODB_CLIENT, APP_STATE_TABLE_NAME, CIRCUIT_STATE), 'openai')
+
+# A turn's time budget, as ai_response's Lambda timeout; the rest is in common/replies.py
+TURN_SECONDS = 30
+
+# Threads for blocking boto3 calls
+DB_THREADS = 64
+
+
+class HttpResult:
+    """A completed POST: status code, headers and JSON body (None if the body is not JSON)."""
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class AiohttpClient:
+    """POSTs JSON over an aiohttp session. Timeouts raise asyncio.TimeoutError, unreachable hosts ConnectionError."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def post(self, url, body, headers, timeout):
+        import aiohttp
+        try:
+            async with self.session.post(url, json=body, headers=headers,
+                                         timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                text = await response.text()
+                try:
+                    parsed = json.loads(text)
+                except ValueError:
+                    parsed = None
+                return HttpResult(response.status, response.headers, parsed)
+        except asyncio.TimeoutError:
+            raise
+        except aiohttp.ClientConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+
+class AIWorker:
+    """Evaluates submitted chatrooms concurrently, one task per room, at most `max_rooms` at a time.
+
+    Their OpenAI generations share `generations` slots, most urgent room first.
+    """
+
+    def __init__(self, http, api_key, ai_prompt_content, max_rooms=MAX_ROOMS, generations=MAX_GENERATIONS_IN_FLIGHT):
+        self.http = http
+        self.api_key = api_key
+        self.ai_prompt_content = ai_prompt_content
+        self.scheduler = Scheduler(generations, per_key=ROOM_GENERATIONS_IN_FLIGHT)
+        # Turns whose deadline passed while waiting for a generation slot
+        self.expired = 0
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(max_rooms)
+        self.queued = set()
+        self.active = set()
+        # Rooms submitted again while being evaluated; evaluated once more afterwards
+        self.resubmitted = set()
+
+    def submit(self, chatroom_id):
+        """Queues a room for evaluation; a room already queued or being evaluated is not queued twice."""
+        if chatroom_id in self.active:
+            self.resubmitted.add(chatroom_id)
+        elif chatroom_id not in self.queued:
+            self.queued.add(chatroom_id)
+            self.queue.put_nowait(chatroom_id)
+
+    def idle(self):
+        """Whether no room is queued or being evaluated."""
+        return not self.queued and not self.active
+
+    async def run(self):
+        """Starts a task for each queued room as slots free up, until cancelled."""
+        tasks = set()
+        while True:
+            chatroom_id = await self.queue.get()
+            await self.slots.acquire()
+            self.queued.discard(chatroom_id)
+            self.active.add(chatroom_id)
+            task = asyncio.create_task(self._serve(chatroom_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def _serve(self, chatroom_id):
+        try:
+            while True:
+                self.resubmitted.discard(chatroom_id)
+                try:
+                    await self.evaluate(chatroom_id)
+                except Exception as e:
+                    print(f"Unexpected error in chatroom {chatroom_id}: {e}")
+                if chatroom_id not in self.resubmitted:
+                    break
+        finally:
+            self.active.discard(chatroom_id)
+            self.slots.release()
+
+    async def evaluate(self, chatroom_id):
+        """Replies in one chatroom after a simulated typing delay, if a reply is due."""
+        await run_turn_async(reply_turn(chatroom_id, Deadline(TURN_SECONDS)), self)
+
+    # --- reply_turn's steps ---
+    async def read(self, chatroom_id):
+        # Neither read depends on the other
+        return await asyncio.gather(
+            asyncio.to_thread(CHATROOMS.get, chatroom_id),
+            asyncio.to_thread(latest_messages, MESSAGES_TABLE, chatroom_id, HISTORY_SIZE),
+        )
+
+    async def prepare(self):
+        pass  # The key and prompt are read at startup
+
+    async def claim(self, chatroom_id, message_id):
+        return await asyncio.to_thread(claim_reply, CHATROOMS_TABLE, chatroom_id, message_id)
+
+    async def history(self, chatroom_id):
+        return await asyncio.to_thread(latest_messages, MESSAGES_TABLE, chatroom_id, HISTORY_SIZE)
+
+    async def newer(self, chatroom_id, answered_id):
+        return await asyncio.to_thread(newer_message, MESSAGES_TABLE, chatroom_id, answered_id)
+
+    async def deliver(self, chatroom_id, ai_id, ai_text, delay, answered_id, deadline):
+        # The per-room timer
+        await asyncio.sleep(min(delay, deadline.remaining(reserve=DELIVERY_RESERVE_SECONDS)))
+        if await asyncio.to_thread(still_current, MESSAGES_TABLE, chatroom_id, answered_id):
+            await self.post(chatroom_id, ai_text, ai_id, deadline)
+
+    async def generate(self, chatroom_id, all_messages, deadline):
+        """Asks OpenAI for the AI's next message. Returns its text, or None if there is nothing to send."""
+        if not deadline.allows(MIN_GENERATION_SECONDS, reserve=DELIVERY_RESERVE_SECONDS):
+            print(f"Only {deadline.remaining():.2f}s left. Skipping this reply.")
+            return None
+
+        # Wait for a generation slot only while a generation could still finish in time
+        try:
+            async with self.scheduler.slot(chatroom_id, reply_rank(all_messages),
+                                           timeout=deadline.remaining(reserve=DELIVERY_RESERVE_SECONDS
+                                                                      + MIN_GENERATION_SECONDS)):
+                return await self._generate(build_input_items(all_messages), deadline)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            print("No generation slot freed up in time. Skipping this reply.")
+            return None
+
+    async def _generate(self, input_items, deadline):
+        # Shed the turn instead of queuing behind a slow or failing OpenAI
+        permit = await asyncio.to_thread(OPENAI_BREAKER.acquire)
+        if permit is None:
+            print("OpenAI circuit open or at its concurrency limit. Skipping this reply.")
+            return None
+
+        openai_ok = False
+        try:
+            result = await self._call_openai(openai_request_body(input_items, self.ai_prompt_content), deadline,
+                                              OPENAI_BREAKER.timeout(permit))
+            # Rate limits and server errors count against OpenAI; other statuses mean it is up
+            openai_ok = result.status_code < 500 and result.status_code != 429
+            if result.status_code >= 400:
+                print(f"OpenAI API error: status {result.status_code}, response: {result.json()}")
+                return None
+            ai_text = extract_output_text(result.json() or {}).strip()
+            if ai_text == SILENCE_TOKEN:
+                print(f"AI chose to remain silent ({SILENCE_TOKEN}). Not sending message.")
+                return None
+            if not ai_text:
+                print("OpenAI returned an empty response.")
+                return None
+            return ai_text
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            print(f"OpenAI API error: {e!r}")
+            return None
+        finally:
+            await asyncio.to_thread(OPENAI_BREAKER.release, permit, openai_ok)
+
+    async def report(self, interval=METRICS_SECONDS):
+        """Logs the generation queue's depth and waits as an EMF line every `interval` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            snapshot = self.scheduler.snapshot()
+            invocation = Invocation('ai_worker')
+            invocation.counts.update(GenerationQueueDepth=snapshot['queueDepth'],
+                                     GenerationsInFlight=snapshot['running'], GenerationSlotExpired=self.expired)
+            invocation.durations.update(GenerationWaitP50=snapshot['waitP50'] * 1000,
+                                        GenerationWaitP95=snapshot['waitP95'] * 1000,
+                                        GenerationWaitMax=snapshot['waitMax'] * 1000)
+            self.expired = 0
+            print(json.dumps(invocation.to_emf(), default=str))
+
+    async def _call_openai(self, body, deadline, timeout):
+        """POSTs to OpenAI with common.retry's policy: jittered retries within the turn's deadline."""
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        policy = RetryPolicy(deadline, timeout, reserve=DELIVERY_RESERVE_SECONDS,
+                             errors=(asyncio.TimeoutError, ConnectionError))
+        while True:
+            attempt_timeout = policy.next_timeout()
+            if attempt_timeout is None:
+                break
+            try:
+                result, error = await self.http.post(OPENAI_URL, body, headers, attempt_timeout), None
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                result, error = None, e
+            delay = policy.backoff(result, error)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        return policy.result()
+
+    async def post(self, chatroom_id, ai_text, ai_id, deadline):
+        """Sends the reply through AppSync, falling back to a direct DynamoDB write."""
+        try:
+            result = await self.http.post(
+                APPSYNC_URL,
+                {'query': SEND_MESSAGE_MUTATION,
+                 'variables': {"chatroomId": chatroom_id, "text": ai_text, "senderId": ai_id}},
+                {'Content-Type': 'application/json', 'x-api-key': APPSYNC_API_KEY},
+                min(APPSYNC_TIMEOUT_SECONDS, deadline.remaining(reserve=FALLBACK_RESERVE_SECONDS)),
+            )
+            if result.status_code >= 400:
+                raise Exception(f"status {result.status_code}")
+            print(f"AI response sent via AppSync using senderId: '{ai_id}'")
+        except Exception as e:
+            print(f"AppSync error: {e!r}. Falling back to direct DynamoDB write.")
+            message_id = new_ulid()
+            await asyncio.to_thread(MESSAGES_TABLE.put_item, Item={
+                'id': message_id,
+                'chatroomId': chatroom_id,
+                'text': ai_text,
+                'senderId': ai_id,
+                'createdAt': ulid_isoformat(message_id),
+            })
+
+
+async def serve(queue_url):
+    """Feeds the worker from SQS until the process is stopped."""
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=DB_THREADS))
+    sqs = boto3.client('sqs')
+    api_key = await asyncio.to_thread(get_openai_api_key, SECRETS_MANAGER, OPENAI_API_KEY_SECRET_NAME)
+    ai_prompt_content = await asyncio.to_thread(get_ai_prompt, SSM, AI_PROMPT_PARAMETER_NAME)
+
+    async with aiohttp.ClientSession() as session:
+        worker = AIWorker(AiohttpClient(session), api_key, ai_prompt_content)
+        runner = asyncio.create_task(worker.run())
+        reporter = asyncio.create_task(worker.report()) if METRICS_ENABLED else None
+        try:
+            while True:
+                response = await asyncio.to_thread(sqs.receive_message, QueueUrl=queue_url,
+                                                   MaxNumberOfMessages=10, WaitTimeSeconds=20)
+                messages = response.get('Messages', [])
+                for message in messages:
+                    worker.submit(json.loads(message['Body'])['chatroomId'])
+                # Deleted on receipt: a lost evaluation is redone on the room's next message
+                if messages:
+                    await asyncio.to_thread(sqs.delete_message_batch, QueueUrl=queue_url, Entries=[
+                        {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']}
+                        for index, message in enumerate(messages)
+                    ])
+        finally:
+            runner.cancel()
+            if reporter:
+                reporter.cancel()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(os.environ['AI_WORKER_QUEUE_URL']))
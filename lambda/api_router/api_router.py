@@ -0,0 +1,40 @@
+"""
+Optional single entry point for the low-traffic AppSync resolvers. It
+dispatches on the field being resolved (`info.fieldName`) to the existing
+handler functions, so rarely called resolvers run in containers that are
+already warm from the others instead of each keeping its own pool.
+
+The routed handlers are bundled next to this module by
+scripts/build_lambdas.py and imported when the container starts, so one
+init warms every route. They share boto3 clients through common/clients.py,
+and their module-level caches (chatroom records, survey query results)
+serve every call the container handles. Each handler keeps its own metrics
+name. The stack points these resolvers here when deployed with
+`cdk deploy -c apiRouter=true`.
+"""
+import create_match
+import get_waiting_status
+import join_waiting_room
+import leave_waiting_room
+import query_survey_responses
+import submit_survey
+
+# GraphQL field -> handler function
+ROUTES = {
+    'joinWaitingRoom': join_waiting_room.handler,
+    'leaveWaitingRoom': leave_waiting_room.handler,
+    'getWaitingStatus': get_waiting_status.handler,
+    'createMatch': create_match.handler,
+    'submitSurvey': submit_survey.handler,
+    'submitSurveys': submit_survey.batch_handler,
+    'querySurveyResponses': query_survey_responses.handler,
+}
+
+
+def handler(event, context):
+    """Runs the handler of the AppSync field in `event['info']['fieldName']`."""
+    field_name = event.get('info', {}).get('fieldName')
+    route = ROUTES.get(field_name)
+    if route is None:
+        raise Exception(f"Failed to route request: no handler for field {field_name!r}")
+    return route(event, context)
@@ -0,0 +1,4 @@
+"""
+Code shared by the Lambda handlers. scripts/build_lambdas.py copies this
+package into every handler's deployment directory.
+"""
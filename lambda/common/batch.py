@@ -0,0 +1,43 @@
+"""
+Bulk DynamoDB reads. get_items is BatchGetItem split at its request limit,
+with unprocessed keys resubmitted after a full-jitter backoff:
+
+    items, unprocessed = get_items(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME,
+                                   [CHATROOM.marshal({'id': chatroom_id}) for chatroom_id in ids])
+
+It takes a boto3 resource or a low-level client; the keys and items are in
+that client's format. ChatroomCache.get_many reads its misses this way.
+"""
+import random
+import time
+
+BATCH_GET_LIMIT = 100
+MAX_UNPROCESSED_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 1.0
+
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)))
+
+
+def get_items(dynamodb, table_name, keys, **options):
+    """Reads the items with the given keys. Returns (items found, keys still unprocessed after retries).
+
+    `options` (ProjectionExpression, ConsistentRead, ...) apply to every request.
+    Keys must be distinct; DynamoDB rejects a request that repeats one.
+    """
+    items, unprocessed = [], []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: dict(options, Keys=keys[start:start + BATCH_GET_LIMIT])}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            if attempt < MAX_UNPROCESSED_RETRIES:
+                _backoff(attempt)
+        else:
+            unprocessed.extend(request[table_name]['Keys'])
+    return items, unprocessed
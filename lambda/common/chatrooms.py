@@ -0,0 +1,103 @@
+"""
+A per-container LRU cache of chatroom records. Rooms are written once by
+matchmaking and their participants never change, so a warm container reads
+each room from ChatroomsTable once rather than once per turn.
+
+    CHATROOMS = ChatroomCache(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME)   # the low-level client
+    chatroom = CHATROOMS.get(chatroom_id)            # None if the room does not exist
+    chatrooms = CHATROOMS.get_many(chatroom_ids)     # {id: record} of the rooms that exist
+
+Only the immutable attributes in PROJECTION are fetched and cached; the
+mutable ones (such as ai_response's `aiGeneration` claim) must still be read
+from the table. A room that is not found is cached as missing for
+MISSING_SECONDS only, since an eventually consistent read can briefly miss a
+room matchmaking has just written. Safe to share between threads.
+"""
+import collections
+import os
+import threading
+import time
+
+from common.batch import get_items
+from common.items import CHATROOM, ItemTable
+from common.metrics import count, span
+
+MAX_ENTRIES = int(os.environ.get('CHATROOM_CACHE_SIZE', '10000'))
+MISSING_SECONDS = 10
+PROJECTION = 'id, participants, playerLabels, createdAt'
+
+_MISSING = object()
+
+
+class ChatroomCache:
+    """Chatroom records by id, least recently used evicted beyond `max_entries`."""
+
+    def __init__(self, client, table_name, max_entries=MAX_ENTRIES, missing_seconds=MISSING_SECONDS):
+        self.client = client
+        self.table_name = table_name
+        self.table = ItemTable(client, table_name, CHATROOM)
+        self.max_entries = max_entries
+        self.missing_seconds = missing_seconds
+        self.lock = threading.Lock()
+        # id -> (record or _MISSING, monotonic time the entry stops being valid, or None)
+        self.entries = collections.OrderedDict()
+
+    def _lookup(self, chatroom_id):
+        """Returns the cached record, _MISSING, or None when the room has to be fetched."""
+        with self.lock:
+            entry = self.entries.get(chatroom_id)
+            if entry is None:
+                return None
+            record, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self.entries[chatroom_id]
+                return None
+            self.entries.move_to_end(chatroom_id)
+            return record
+
+    def _store(self, chatroom_id, record):
+        expires_at = time.monotonic() + self.missing_seconds if record is _MISSING else None
+        with self.lock:
+            self.entries[chatroom_id] = (record, expires_at)
+            self.entries.move_to_end(chatroom_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, chatroom_id):
+        """The room's record, or None if it does not exist."""
+        record = self._lookup(chatroom_id)
+        if record is None:
+            count('ChatroomCacheMiss')
+            with span('chatroom_fetch'):
+                response = self.table.get_item(Key={'id': chatroom_id}, ProjectionExpression=PROJECTION)
+            record = response.get('Item', _MISSING)
+            self._store(chatroom_id, record)
+        return None if record is _MISSING else record
+
+    def get_many(self, chatroom_ids):
+        """Records of the given rooms that exist, keyed by id, fetching the uncached ones in batches."""
+        found, fetch = {}, []
+        for chatroom_id in set(chatroom_ids):
+            record = self._lookup(chatroom_id)
+            if record is None:
+                fetch.append(chatroom_id)
+            elif record is not _MISSING:
+                found[chatroom_id] = record
+        if not fetch:
+            return found
+        count('ChatroomCacheMiss', len(fetch))
+        with span('chatroom_fetch'):
+            items, unprocessed = get_items(self.client, self.table_name,
+                                           [CHATROOM.marshal({'id': chatroom_id}) for chatroom_id in fetch],
+                                           ProjectionExpression=PROJECTION)
+        fetched = {item['id']: item for item in map(CHATROOM.unmarshal, items)}
+        # Rooms DynamoDB left unprocessed were not read, so are neither returned nor cached as missing
+        unread = {key['id']['S'] for key in unprocessed}
+        for chatroom_id in fetch:
+            if chatroom_id in unread:
+                continue
+            record = fetched.get(chatroom_id, _MISSING)
+            self._store(chatroom_id, record)
+            if record is not _MISSING:
+                found[chatroom_id] = record
+        return found
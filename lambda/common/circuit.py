@@ -0,0 +1,297 @@
+"""
+Fleet-wide circuit breaker and adaptive concurrency limit for a downstream
+service, with its state in AppStateTable so every container sheds load as
+soon as one of them sees the service degrade.
+
+    permit = BREAKER.acquire()
+    if permit is None:
+        return  # open, or at the concurrency limit: skip the call
+    ok = False
+    try:
+        response = requests.post(url, timeout=BREAKER.timeout(permit))
+        ok = response.status_code < 500 and response.status_code != 429
+    finally:
+        BREAKER.release(permit, ok)
+
+Everything lives on the one state item `circuit#<name>`: a `leases` map of
+in-flight calls (owner -> lease expiry), the concurrency limit, `openUntil`,
+and per-window counters of calls, failures and summed latency. A call costs
+two writes. acquire adds a lease in one conditional update that only
+succeeds while the breaker is closed (or half-open) and fewer leases than the
+limit are held; release removes the lease and adds the sample to the current
+window's counters in one update, so concurrent calls never conflict and no
+sample is dropped. Leases of containers that died mid-call are cleared once
+they expire, the first time a call finds the breaker full.
+
+The limit is AIMD: +1 per success within the latency target, halved on a
+failure (5xx, 429, timeout). A slow success only stops the limit growing.
+When the last two windows hold MIN_SAMPLES calls and their failure rate or
+mean latency crosses its threshold the breaker opens for
+CIRCUIT_OPEN_SECONDS; after that one call at a time runs again (half-open)
+and its outcome closes the breaker with fresh counters or re-opens it.
+
+The breaker fails open: if AppStateTable cannot be read or written
+(throttling, timeouts, ...), acquire admits the call against a local limit
+of INITIAL_LIMIT calls per container, and release logs and counts the error
+instead of raising, so a state-store outage never costs a reply.
+"""
+import os
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from common.log import Logger
+from common.metrics import count
+
+ERROR_THRESHOLD = float(os.environ.get('CIRCUIT_ERROR_THRESHOLD', '0.5'))
+LATENCY_THRESHOLD_SECONDS = float(os.environ.get('CIRCUIT_LATENCY_THRESHOLD_SECONDS', '12'))
+LATENCY_TARGET_SECONDS = float(os.environ.get('CIRCUIT_LATENCY_TARGET_SECONDS', '6'))
+MIN_SAMPLES = int(os.environ.get('CIRCUIT_MIN_SAMPLES', '5'))
+OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '30'))
+# Samples are counted per window; the breaker looks at the current and previous one
+WINDOW_SECONDS = int(os.environ.get('CIRCUIT_WINDOW_SECONDS', '10'))
+
+MIN_LIMIT = 1
+INITIAL_LIMIT = int(os.environ.get('CIRCUIT_INITIAL_LIMIT', '10'))
+MAX_LIMIT = int(os.environ.get('CIRCUIT_MAX_LIMIT', '50'))
+DECREASE_FACTOR = 0.5
+
+# Call timeouts follow observed latency, within these bounds
+MIN_TIMEOUT_SECONDS = 5.0
+MAX_TIMEOUT_SECONDS = 30.0
+TIMEOUT_LATENCY_MULTIPLIER = 3.0
+LEASE_SECONDS = MAX_TIMEOUT_SECONDS + 5
+
+STATE_TTL_SECONDS = 24 * 3600
+COUNTERS = ('calls', 'errors', 'latency')
+
+LOGGER = Logger('circuit')
+
+
+def _number(value):
+    return Decimal(str(round(value, 3)))
+
+
+def _window(now):
+    return int(now // WINDOW_SECONDS)
+
+
+def _counter(name, window):
+    return f"{name}_{window}"
+
+
+class Permit:
+    """One admitted call: its lease owner and the breaker state it was admitted under.
+
+    A permit without an owner was admitted locally while the state item was unreachable.
+    """
+
+    def __init__(self, owner, state):
+        self.owner = owner
+        self.state = state
+        self.started = time.monotonic()
+
+
+# The state a locally admitted call runs under: closed, no latency observed
+_LOCAL_STATE = {'openUntil': 0.0, 'limit': INITIAL_LIMIT, 'leases': {}, 'calls': 0.0, 'errorRate': 0.0,
+                'latency': 0.0, 'stale': []}
+
+
+class CircuitBreaker:
+    """Admits, times and records calls to one downstream service."""
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+        self.key = f"circuit#{name}"
+        self.conditional_failure = table.meta.client.exceptions.ConditionalCheckFailedException
+        # Lets this container shed without a request while it knows the breaker is open
+        self.open_until = 0.0
+        # Admits calls while the state item cannot be reached
+        self.local_slots = threading.BoundedSemaphore(INITIAL_LIMIT)
+
+    @staticmethod
+    def _state(item, now):
+        """The parts of the state item the breaker decides on, totalled over the last two windows."""
+        window = _window(now)
+        totals = {name: sum(float(item.get(_counter(name, w), 0)) for w in (window - 1, window))
+                  for name in COUNTERS}
+        stale = [name for name in item
+                 if name.rpartition('_')[0] in COUNTERS and int(name.rpartition('_')[2]) < window - 1]
+        calls = totals['calls']
+        return {
+            'openUntil': float(item.get('openUntil', 0)),
+            'limit': int(item.get('limit', INITIAL_LIMIT)),
+            'leases': {owner: float(until) for owner, until in item.get('leases', {}).items()},
+            'calls': calls,
+            'errorRate': totals['errors'] / calls if calls else 0.0,
+            'latency': totals['latency'] / calls if calls else 0.0,
+            'stale': stale,
+        }
+
+    def acquire(self):
+        """Returns a Permit, or None if the breaker is open or the limit's worth of calls is in flight."""
+        now = time.time()
+        if self.open_until > now:
+            return None
+        try:
+            return self._acquire(now)
+        except (ClientError, BotoCoreError) as e:
+            count('CircuitStoreErrors')
+            if not self.local_slots.acquire(blocking=False):
+                LOGGER.warning("Circuit state unavailable and local limit reached", circuit=self.name,
+                               error=str(e))
+                return None
+            LOGGER.warning("Circuit state unavailable; admitting locally", circuit=self.name, error=str(e))
+            return Permit(None, dict(_LOCAL_STATE))
+
+    def _acquire(self, now):
+        owner = str(uuid.uuid4())
+        for attempt in range(2):
+            try:
+                response = self.table.update_item(
+                    Key={'id': self.key},
+                    UpdateExpression='SET leases.#owner = :leaseUntil, expiresAt = :expiresAt',
+                    ConditionExpression='attribute_exists(leases) AND openUntil < :now '
+                                        'AND size(leases) < #limit AND size(leases) < :maxLimit',
+                    ExpressionAttributeNames={'#owner': owner, '#limit': 'limit'},
+                    ExpressionAttributeValues={
+                        ':leaseUntil': _number(now + LEASE_SECONDS), ':now': _number(now),
+                        ':maxLimit': MAX_LIMIT, ':expiresAt': int(now) + STATE_TTL_SECONDS,
+                    },
+                    ReturnValues='ALL_NEW',
+                )
+                return Permit(owner, self._state(response['Attributes'], now))
+            except self.conditional_failure:
+                if attempt or not self._make_room(now):
+                    return None
+        return None
+
+    def _make_room(self, now):
+        """After a refused acquire: creates the state, or clears expired leases. True if worth retrying."""
+        item = self.table.get_item(Key={'id': self.key}, ConsistentRead=True).get('Item')
+        if item is None or 'leases' not in item:
+            self.table.update_item(
+                Key={'id': self.key},
+                UpdateExpression='SET leases = if_not_exists(leases, :empty), #limit = if_not_exists(#limit, :limit), '
+                                 'openUntil = if_not_exists(openUntil, :zero)',
+                ExpressionAttributeNames={'#limit': 'limit'},
+                ExpressionAttributeValues={':empty': {}, ':limit': INITIAL_LIMIT, ':zero': 0},
+            )
+            return True
+        state = self._state(item, now)
+        if state['openUntil'] > now:
+            self.open_until = state['openUntil']
+            LOGGER.info("Circuit open", circuit=self.name, remainingSeconds=round(state['openUntil'] - now, 1))
+            return False
+        expired = [owner for owner, until in state['leases'].items() if until < now]
+        if not expired:
+            LOGGER.info("Circuit at its concurrency limit", circuit=self.name, limit=state['limit'])
+            return False
+        LOGGER.warning("Clearing expired circuit leases", circuit=self.name, leases=len(expired))
+        self.table.update_item(
+            Key={'id': self.key},
+            UpdateExpression='REMOVE ' + ', '.join(f"leases.#lease{index}" for index in range(len(expired))),
+            ExpressionAttributeNames={f"#lease{index}": owner for index, owner in enumerate(expired)},
+        )
+        return True
+
+    def timeout(self, permit):
+        """A call timeout scaled to the latency the fleet currently observes."""
+        latency = permit.state['latency']
+        if not latency:
+            return MAX_TIMEOUT_SECONDS
+        return max(MIN_TIMEOUT_SECONDS, min(MAX_TIMEOUT_SECONDS, latency * TIMEOUT_LATENCY_MULTIPLIER))
+
+    def release(self, permit, ok):
+        """Frees the permit's lease and adds the call's outcome and latency to the current window. Never raises."""
+        if permit.owner is None:
+            self.local_slots.release()
+            return
+        try:
+            self._release(permit, ok)
+        except (ClientError, BotoCoreError) as e:
+            # An unreleased lease expires after LEASE_SECONDS; the sample is lost
+            count('CircuitStoreErrors')
+            LOGGER.error("Could not record the call in the circuit state", circuit=self.name, error=str(e))
+
+    def _release(self, permit, ok):
+        now = time.time()
+        latency = time.monotonic() - permit.started
+        window = _window(now)
+        names = {'#owner': permit.owner}
+        values = {':one': 1, ':failed': 0 if ok else 1, ':latency': _number(latency)}
+        additions = []
+        for name, value in zip(COUNTERS, (':one', ':failed', ':latency')):
+            names[f"#{name}"] = _counter(name, window)
+            additions.append(f"#{name} {value}")
+        if ok and latency <= LATENCY_TARGET_SECONDS and permit.state['limit'] < MAX_LIMIT:
+            names['#limit'] = 'limit'
+            additions.append('#limit :one')
+        # Counters of windows nobody reads any more, seen when this call was admitted
+        removals = ['leases.#owner']
+        for index, name in enumerate(permit.state['stale']):
+            names[f"#stale{index}"] = name
+            removals.append(f"#stale{index}")
+        response = self.table.update_item(
+            Key={'id': self.key},
+            UpdateExpression=f"ADD {', '.join(additions)} REMOVE {', '.join(removals)}",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW',
+        )
+        self._adjust(permit, self._state(response['Attributes'], now), ok, latency, now)
+
+    def _adjust(self, permit, state, ok, latency, now):
+        """Opens, closes or shrinks the breaker when this outcome calls for it; rare, conditional writes."""
+        if state['openUntil'] > now:
+            return  # Another container opened the breaker while this call ran
+        if state['openUntil']:
+            # Half-open: only the probe admitted after the open period decides
+            if permit.state['openUntil'] == state['openUntil']:
+                if ok and latency <= LATENCY_THRESHOLD_SECONDS:
+                    self._close(state['openUntil'], now)
+                else:
+                    self._open(state, now)
+            return
+        if state['calls'] >= MIN_SAMPLES and (state['errorRate'] >= ERROR_THRESHOLD
+                                              or state['latency'] >= LATENCY_THRESHOLD_SECONDS):
+            self._open(state, now)
+        elif not ok and state['limit'] > MIN_LIMIT:
+            self._update(
+                'SET #limit = :limit', '#limit = :seen', {'#limit': 'limit'},
+                {':limit': max(MIN_LIMIT, int(state['limit'] * DECREASE_FACTOR)), ':seen': state['limit']},
+            )
+
+    def _open(self, state, now):
+        if self._update('SET openUntil = :until, #limit = :limit', 'openUntil = :seen', {'#limit': 'limit'},
+                        {':until': _number(now + OPEN_SECONDS), ':limit': MIN_LIMIT,
+                         ':seen': _number(state['openUntil'])}):
+            LOGGER.warning("Circuit opened", circuit=self.name, errorRate=round(state['errorRate'], 2),
+                           latency=round(state['latency'], 2), calls=int(state['calls']))
+            self.open_until = now + OPEN_SECONDS
+
+    def _close(self, open_until, now):
+        window = _window(now)
+        names = {f"#counter{index}": _counter(name, w)
+                 for index, (name, w) in enumerate((name, w) for name in COUNTERS for w in (window - 1, window))}
+        if self._update(f"SET openUntil = :zero REMOVE {', '.join(names)}", 'openUntil = :seen', names,
+                        {':zero': 0, ':seen': _number(open_until)}):
+            LOGGER.info("Circuit closed", circuit=self.name)
+
+    def _update(self, update, condition, names, values):
+        """A state change that applies only if no other container made one first. True if it applied."""
+        try:
+            self.table.update_item(
+                Key={'id': self.key},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+            return True
+        except self.conditional_failure:
+            return False
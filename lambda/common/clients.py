@@ -0,0 +1,26 @@
+"""
+boto3 clients and resources shared by every handler module loaded in one
+process, so a container that runs several handlers (lambda/api_router)
+creates and configures each of them once.
+
+    DYNAMODB = clients.resource('dynamodb')
+    SSM = clients.client('ssm')
+
+boto3 clients are thread-safe and resources are shared here the way a single
+handler already shares its module-level ones across invocations.
+"""
+import functools
+
+import boto3
+
+
+@functools.lru_cache(maxsize=None)
+def resource(service_name):
+    """The process's boto3 resource for `service_name`."""
+    return boto3.resource(service_name)
+
+
+@functools.lru_cache(maxsize=None)
+def client(service_name):
+    """The process's boto3 client for `service_name`."""
+    return boto3.client(service_name)
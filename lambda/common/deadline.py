@@ -0,0 +1,39 @@
+"""
+An invocation's remaining time, shared out among the phases of its work.
+
+    deadline = Deadline.from_context(context)
+    if not deadline.allows(MIN_GENERATION_SECONDS, reserve=DELIVERY_SECONDS):
+        return  # could not finish: do not start
+    generate(timeout=deadline.remaining(reserve=DELIVERY_SECONDS))
+    time.sleep(min(delay, deadline.remaining(reserve=DELIVERY_SECONDS)))
+    deliver(timeout=deadline.remaining())
+
+Each phase spends what is left less a `reserve` held back for the phases
+after it, so an earlier phase that runs long shrinks the flexible ones that
+follow instead of the last one being killed by the Lambda timeout. The
+deadline is measured on the monotonic clock and ends SAFETY_SECONDS before
+the runtime's own, leaving room to return and flush logs.
+"""
+import time
+
+SAFETY_SECONDS = 0.5
+
+
+class Deadline:
+    """A point in time the invocation's work must finish by."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_context(cls, context, safety=SAFETY_SECONDS):
+        """The Lambda context's remaining time, less `safety` seconds."""
+        return cls(context.get_remaining_time_in_millis() / 1000 - safety)
+
+    def remaining(self, reserve=0.0):
+        """Seconds left once `reserve` is kept back for later phases; never negative."""
+        return max(0.0, self.expires_at - time.monotonic() - reserve)
+
+    def allows(self, seconds, reserve=0.0):
+        """Whether work taking `seconds` can finish with `reserve` still left afterwards."""
+        return self.remaining(reserve) >= seconds
@@ -0,0 +1,56 @@
+"""
+Runs independent blocking calls at once on a small thread pool, so a phase
+made of them takes as long as its slowest call rather than their sum.
+
+    with FanOut(2) as reads:
+        room = reads.submit('chatroom_fetch', CHATROOMS.get, chatroom_id)
+        history = reads.submit('history_query', latest_messages, MESSAGES_TABLE, chatroom_id, 30)
+        if room.result() is None:
+            return  # leaving the block drops the history query
+        all_messages = history.result()
+
+Each call runs in a copy of the caller's contextvars, timed as a metrics span
+when given a name. boto3 clients and resources are shared across the pool's
+threads as they are elsewhere. Leaving the block does not wait: calls that
+have not started are cancelled, and calls already running finish in the
+background with their results discarded. A call's exception is raised by its
+future's result(), or by gather() as soon as any call fails.
+"""
+import concurrent.futures
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from common.metrics import span
+
+
+def _timed(name, function, args):
+    if name is None:
+        return function(*args)
+    with span(name):
+        return function(*args)
+
+
+class FanOut:
+    """A thread pool for one phase's independent calls, abandoned when the phase ends."""
+
+    def __init__(self, max_workers):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, name, function, *args):
+        """Starts `function(*args)`, timed as span `name` unless it is None, and returns its future."""
+        return self.pool.submit(contextvars.copy_context().run, _timed, name, function, args)
+
+    @staticmethod
+    def gather(*futures):
+        """The futures' results in order, raising the first exception as soon as any call fails."""
+        done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+        for future in futures:
+            if future in done and future.exception() is not None:
+                raise future.exception()
+        return [future.result() for future in futures]
@@ -0,0 +1,125 @@
+"""
+Fixed-shape items on the low-level DynamoDB client. The resource layer
+inspects the type of every value on the way in and out; our hot items have
+known attribute types, so their converters are chosen once per attribute
+here and the low-level client is used directly.
+
+    DYNAMODB_CLIENT = boto3.client('dynamodb')
+    MESSAGES_TABLE = ItemTable(DYNAMODB_CLIENT, MESSAGES_TABLE_NAME, MESSAGE)
+    MESSAGES_TABLE.put_item(Item=message)
+    latest_messages(MESSAGES_TABLE, chatroom_id, 30)   # common.messages works on either kind of table
+
+ItemTable takes and returns plain Python values like a resource Table for
+the operations it covers (put_item, get_item, update_item, delete_item,
+query), so callers do not change. Attributes a shape does not list, and
+expression values, fall back to boto3's TypeSerializer/TypeDeserializer.
+Numbers come back as Decimal, as from the resource. Shape.marshal builds
+low-level items for calls made on the client itself, such as
+TransactWriteItems. scripts/bench_dynamodb_access.py compares the two paths.
+"""
+from decimal import Decimal
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+_SERIALIZER = TypeSerializer()
+_DESERIALIZER = TypeDeserializer()
+
+# Attribute types: (to attribute value, from attribute value)
+STRING = (lambda value: {'S': value}, lambda attribute: attribute['S'])
+NUMBER = (lambda value: {'N': str(value)}, lambda attribute: Decimal(attribute['N']))
+BOOLEAN = (lambda value: {'BOOL': value}, lambda attribute: attribute['BOOL'])
+STRING_LIST = (lambda value: {'L': [{'S': element} for element in value]},
+               lambda attribute: [element['S'] for element in attribute['L']])
+
+
+def to_attribute(value):
+    """Marshals a value of any type, with the common string case first."""
+    if type(value) is str:
+        return {'S': value}
+    return _SERIALIZER.serialize(value)
+
+
+def from_attribute(attribute):
+    """Unmarshals an attribute value of any type."""
+    if 'S' in attribute:
+        return attribute['S']
+    return _DESERIALIZER.deserialize(attribute)
+
+
+class Shape:
+    """Converters for an item type's attributes, picked once instead of per value."""
+
+    def __init__(self, **attributes):
+        self.encoders = {name: kind[0] for name, kind in attributes.items()}
+        self.decoders = {name: kind[1] for name, kind in attributes.items()}
+
+    def marshal(self, item):
+        """The item as a low-level attribute map."""
+        encoders = self.encoders
+        return {name: encoders[name](value) if name in encoders and value is not None else to_attribute(value)
+                for name, value in item.items()}
+
+    def unmarshal(self, attributes):
+        """The low-level attribute map as a plain item."""
+        decoders = self.decoders
+        return {name: decoders[name](attribute) if name in decoders else from_attribute(attribute)
+                for name, attribute in attributes.items()}
+
+
+MESSAGE = Shape(id=STRING, chatroomId=STRING, text=STRING, senderId=STRING, createdAt=STRING)
+WAITING_ROOM_ENTRY = Shape(id=STRING, createdAt=STRING)
+CHATROOM = Shape(id=STRING, participants=STRING_LIST, createdAt=STRING, aiGeneration=STRING)
+SURVEY_RESPONSE = Shape(id=STRING, timestamp=STRING, chatroomId=STRING, userId=STRING, botGuess=STRING,
+                        reasoning=STRING, llmKnowledge=STRING, chatbotFrequency=STRING, age=NUMBER,
+                        education=STRING, wasCorrect=BOOLEAN)
+# A circuit breaker's state item (common/circuit.py); its lease map and window counters fall back
+CIRCUIT_STATE = Shape(id=STRING, limit=NUMBER, openUntil=NUMBER, expiresAt=NUMBER)
+
+
+def _values(values):
+    return {name: to_attribute(value) for name, value in values.items()}
+
+
+class ItemTable:
+    """A table of one item shape, used through the low-level client with resource Table call signatures."""
+
+    def __init__(self, client, table_name, shape):
+        self.client = client
+        self.table_name = table_name
+        self.shape = shape
+        # claim_reply and the circuit breaker find the client's exceptions here, as on a resource Table
+        self.meta = SimpleNamespace(client=client)
+
+    def _request(self, kwargs):
+        request = dict(kwargs, TableName=self.table_name)
+        for name in ('Item', 'Key', 'ExclusiveStartKey'):
+            if name in request:
+                request[name] = self.shape.marshal(request[name])
+        if 'ExpressionAttributeValues' in request:
+            request['ExpressionAttributeValues'] = _values(request['ExpressionAttributeValues'])
+        return request
+
+    def _response(self, response):
+        for name in ('Item', 'Attributes', 'LastEvaluatedKey'):
+            if name in response:
+                response[name] = self.shape.unmarshal(response[name])
+        if 'Items' in response:
+            response['Items'] = [self.shape.unmarshal(item) for item in response['Items']]
+        return response
+
+    def put_item(self, **kwargs):
+        return self._response(self.client.put_item(**self._request(kwargs)))
+
+    def get_item(self, **kwargs):
+        return self._response(self.client.get_item(**self._request(kwargs)))
+
+    def update_item(self, **kwargs):
+        return self._response(self.client.update_item(**self._request(kwargs)))
+
+    def delete_item(self, **kwargs):
+        return self._response(self.client.delete_item(**self._request(kwargs)))
+
+    def query(self, **kwargs):
+        return self._response(self.client.query(**self._request(kwargs)))
+
@@ -0,0 +1,95 @@
+"""
+Structured, sampled JSON logging for the handlers.
+
+    LOGGER = Logger('message_handler')
+
+    @LOGGER.request_scope
+    def handler(event, context):
+        LOGGER.debug("Received event", arguments=lambda: dict(event['arguments'], text=redact(text)))
+        LOGGER.info("Message saved", messageId=message_id, text=redact(text))
+
+Every record is one JSON line with the level, logger name and request id.
+LOG_LEVEL (default INFO) sets the threshold and LOG_SAMPLE_RATE (default 0.01)
+is the fraction of invocations that log at DEBUG anyway, decided once per
+request so a sampled request is logged completely. Records below the active
+level return before anything is formatted; callable field values and %-style
+arguments are only evaluated for records that are written.
+"""
+import contextvars
+import functools
+import json
+import os
+import random
+import traceback
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+# Characters of user-written text kept in logs; 0 logs only the length
+LOG_TEXT_PREVIEW_CHARS = int(os.environ.get('LOG_TEXT_PREVIEW_CHARS', '0'))
+
+# (request id, threshold) of the invocation being handled
+_REQUEST = contextvars.ContextVar('log_request', default=(None, LOG_LEVEL))
+
+
+def redact(text, preview=None):
+    """Describes user-written text without logging it: its length and at most a short prefix."""
+    if text is None:
+        return None
+    preview = LOG_TEXT_PREVIEW_CHARS if preview is None else preview
+    described = {'length': len(text)}
+    if preview > 0:
+        described['preview'] = text[:preview] + ('…' if len(text) > preview else '')
+    return described
+
+
+class Logger:
+    """Writes JSON log lines for one handler."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def is_enabled_for(self, level):
+        return LEVELS[level] >= _REQUEST.get()[1]
+
+    def _log(self, level, message, args, fields):
+        request_id, threshold = _REQUEST.get()
+        if LEVELS[level] < threshold:
+            return
+        record = {'level': level, 'logger': self.name, 'message': message % args if args else message}
+        if request_id:
+            record['requestId'] = request_id
+        for name, value in fields.items():
+            record[name] = value() if callable(value) else value
+        print(json.dumps(record, default=str))
+
+    def debug(self, message, *args, **fields):
+        self._log('DEBUG', message, args, fields)
+
+    def info(self, message, *args, **fields):
+        self._log('INFO', message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        self._log('WARNING', message, args, fields)
+
+    def error(self, message, *args, **fields):
+        self._log('ERROR', message, args, fields)
+
+    def exception(self, message, *args, **fields):
+        """Logs at ERROR with the traceback of the exception being handled."""
+        self._log('ERROR', message, args, dict(fields, traceback=traceback.format_exc))
+
+    def request_scope(self, handler):
+        """Decorates a handler so its records carry the request id and share one sampling decision."""
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            threshold = LOG_LEVEL
+            if LOG_SAMPLE_RATE and random.random() < LOG_SAMPLE_RATE:
+                threshold = min(threshold, LEVELS['DEBUG'])
+            token = _REQUEST.set((getattr(context, 'aws_request_id', None), threshold))
+            try:
+                return handler(event, context)
+            finally:
+                _REQUEST.reset(token)
+        return wrapper
@@ -0,0 +1,66 @@
+"""
+Windowed reads of a chatroom's messages from MessagesTable.
+
+Messages are keyed by (chatroomId, id) with ULID ids, so key order is send
+order: "messages after X" is a key condition and a page of N messages reads
+exactly N items, however long the room has existed.
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_token(chatroom_id, last_id):
+    """Builds an opaque nextToken that resumes after `last_id`."""
+    raw = json.dumps({'c': chatroom_id, 'a': last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token, chatroom_id):
+    """Returns the message id a nextToken resumes after; raises ValueError for a foreign or malformed token."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        last_id = data['a']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid nextToken")
+    if data.get('c') != chatroom_id:
+        raise ValueError("nextToken belongs to another chatroom")
+    return last_id
+
+
+def clamp_limit(limit):
+    """Bounds a client-supplied page size."""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def messages_after(table, chatroom_id, after_id=None, limit=DEFAULT_PAGE_SIZE):
+    """Returns (up to `limit` messages with id > after_id in send order, id to resume after or None)."""
+    request = {
+        'KeyConditionExpression': 'chatroomId = :cid',
+        'ExpressionAttributeValues': {':cid': chatroom_id},
+        'Limit': limit,
+    }
+    if after_id:
+        request['KeyConditionExpression'] += ' AND #id > :after'
+        request['ExpressionAttributeNames'] = {'#id': 'id'}
+        request['ExpressionAttributeValues'][':after'] = after_id
+    response = table.query(**request)
+    items = response.get('Items', [])
+    # LastEvaluatedKey can be set on an exactly-full final page; the next call then returns nothing
+    last_key = response.get('LastEvaluatedKey')
+    return items, last_key['id'] if last_key else None
+
+
+def latest_messages(table, chatroom_id, limit=DEFAULT_PAGE_SIZE):
+    """Returns the newest `limit` messages of a room in send order."""
+    response = table.query(
+        KeyConditionExpression='chatroomId = :cid',
+        ExpressionAttributeValues={':cid': chatroom_id},
+        Limit=limit,
+        ScanIndexForward=False,
+    )
+    return response.get('Items', [])[::-1]
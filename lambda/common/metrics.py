@@ -0,0 +1,111 @@
+"""
+Per-invocation phase timing, published as CloudWatch Embedded Metric Format
+(EMF) log lines.
+
+    @instrumented('ai_response')
+    def handler(event, context):
+        with span('openai_call'):
+            ...
+
+With METRICS_ENABLED unset or false, `instrumented` returns the handler
+unchanged and `span` returns a shared no-op context manager, so disabled
+instrumentation costs one function call per phase.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import time
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TuringGame')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+_CURRENT = contextvars.ContextVar('metrics_invocation', default=None)
+_NOOP = contextlib.nullcontext()
+_warm_handlers = set()
+
+
+class Invocation:
+    """Phase durations and properties collected during one handler call."""
+
+    def __init__(self, handler_name):
+        self.handler_name = handler_name
+        self.durations = {}
+        self.counts = {}
+        self.properties = {}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def to_emf(self):
+        """Builds the EMF document for this invocation."""
+        metrics = [{'Name': name, 'Unit': 'Milliseconds'} for name in self.durations]
+        metrics += [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['FunctionName', 'Handler']],
+                    'Metrics': metrics,
+                }],
+            },
+            'FunctionName': FUNCTION_NAME,
+            'Handler': self.handler_name,
+        }
+        document.update(self.properties)
+        document.update({name: round(value, 3) for name, value in self.durations.items()})
+        document.update(self.counts)
+        return document
+
+
+def span(name):
+    """Times a phase of the current invocation; a no-op when metrics are disabled."""
+    invocation = _CURRENT.get()
+    return invocation.span(name) if invocation is not None else _NOOP
+
+
+def count(name, value=1):
+    """Adds to a count metric of the current invocation."""
+    invocation = _CURRENT.get()
+    if invocation is not None:
+        invocation.counts[name] = invocation.counts.get(name, 0) + value
+
+
+def annotate(**properties):
+    """Attaches searchable, non-metric properties to the current invocation's log line."""
+    invocation = _CURRENT.get()
+    if invocation is not None:
+        invocation.properties.update(properties)
+
+
+def instrumented(handler_name):
+    """Decorates a Lambda handler so each call emits one EMF line with its phase timings."""
+    def decorate(handler):
+        if not METRICS_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            invocation = Invocation(handler_name)
+            invocation.counts['ColdStart'] = 0 if handler_name in _warm_handlers else 1
+            _warm_handlers.add(handler_name)
+            token = _CURRENT.set(invocation)
+            try:
+                with invocation.span('total'):
+                    return handler(event, context)
+            except Exception:
+                invocation.counts['Error'] = 1
+                raise
+            finally:
+                _CURRENT.reset(token)
+                print(json.dumps(invocation.to_emf(), default=str))
+        return wrapper
+    return decorate
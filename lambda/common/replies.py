@@ -0,0 +1,306 @@
+"""
+How the AI player decides to reply and what it sends, shared by the
+per-message ai_response Lambda and the long-running ai_worker.
+
+    run_turn(reply_turn(chatroom_id, deadline), room)                # ai_response: blocking calls
+    await run_turn_async(reply_turn(chatroom_id, deadline), worker)  # ai_worker: on its event loop
+
+reply_turn is a whole turn in one room: the history check, the reply claim,
+generation, regeneration when newer messages make the reply stale, and the
+typing delay. It does no I/O itself; it yields each step it needs as a tuple
+of a method name and arguments, and the runner object's method of that name
+performs it and returns the result:
+
+    read(chatroom_id)                  -> (chatroom item or None, latest HISTORY_SIZE messages)
+    prepare()                          -> None, once the OpenAI key and prompt are at hand
+    claim(chatroom_id, message_id)     -> claim_reply's result
+    history(chatroom_id)               -> the latest HISTORY_SIZE messages
+    generate(chatroom_id, all_messages, deadline)   -> the reply text, or None if there is nothing to send
+    newer(chatroom_id, answered_id)    -> newer_message's result
+    deliver(chatroom_id, ai_id, ai_text, delay, answered_id, deadline)
+                                       -> posts the reply after `delay` seconds, if still_current
+
+Only the I/O differs between the two runners: both read and claim through
+the DynamoDB tables passed in, and post the same OpenAI and AppSync payloads.
+"""
+import json
+import random
+import time
+
+from common.messages import latest_messages
+from common.metrics import count, span
+from common.ulid import ulid_timestamp_ms
+
+OPENAI_URL = "https://api.openai.com/v1/responses"
+OPENAI_MODEL = "gpt-5.2"
+# Reply the prompt tells the model to give when the AI player should stay quiet
+SILENCE_TOKEN = "Silence1"
+
+SEND_MESSAGE_MUTATION = """
+mutation SendMessage($chatroomId: ID!, $text: String!, $senderId: String!) {
+    sendMessage(chatroomId: $chatroomId, text: $text, senderId: $senderId) {
+        id, chatroomId, text, senderId, createdAt
+    }
+}
+"""
+
+# --- CONFIGURATION FOR TYPING SIMULATION ---
+TYPING_SPEED_CPS = 7
+MIN_THINKING_SECONDS = 1.0
+MAX_RANDOM_THINKING_SECONDS = 2.5
+MAX_DELAY_SECONDS = 15
+
+# --- CONFIGURATION FOR A TURN'S TIME BUDGET ---
+# Time kept back from generation for delivering the reply, or handing it off to be delivered
+DELIVERY_RESERVE_SECONDS = 3
+# Time kept back from the AppSync post for the direct DynamoDB write fallback
+FALLBACK_RESERVE_SECONDS = 1
+APPSYNC_TIMEOUT_SECONDS = 10
+# A generation given less time than this is not started
+MIN_GENERATION_SECONDS = 2
+# Generations per turn, counting those redone because newer messages arrived
+MAX_GENERATIONS = 2
+
+# Messages of history sent to OpenAI
+HISTORY_SIZE = 30
+
+# Each unanswered human message ranks a room as if it had waited this much longer
+ACTIVITY_RANK_SECONDS = 2
+
+
+def get_openai_api_key(secrets_manager, secret_name):
+    """Fetches the OpenAI API key from AWS Secrets Manager."""
+    response = secrets_manager.get_secret_value(SecretId=secret_name)
+    secret = json.loads(response['SecretString'])
+    return secret['openai_api_key']
+
+
+def get_ai_prompt(ssm, parameter_name):
+    """Fetches the AI prompt from SSM Parameter Store."""
+    response = ssm.get_parameter(Name=parameter_name, WithDecryption=True)
+    return response['Parameter']['Value']
+
+
+def ai_participant(chatroom_item):
+    """Returns the room's AI participant id, or None."""
+    return next((p for p in chatroom_item.get('participants', []) if p.startswith('ai-')), None)
+
+
+def skip_reason(all_messages):
+    """Why the AI should not reply to this history yet, or None if it should."""
+    # Check if AI was the last to speak
+    if not all_messages or all_messages[-1]['senderId'].startswith('ai-'):
+        return "No human messages to respond to or AI was the last to speak."
+
+    # Get messages since last AI response
+    last_ai_index = -1
+    for i in range(len(all_messages) - 1, -1, -1):
+        if all_messages[i]['senderId'].startswith('ai-'):
+            last_ai_index = i
+            break
+    messages_since_ai = all_messages[last_ai_index + 1:]
+
+    # Only respond if there's been enough human activity (at least 1 message from each human, or 2+ messages total)
+    unique_human_senders = set(msg['senderId'] for msg in messages_since_ai if not msg['senderId'].startswith('ai-'))
+    if len(messages_since_ai) < 2 and len(unique_human_senders) < 2:
+        return (f"Waiting for more conversation activity. Only {len(messages_since_ai)} message(s) "
+                f"from {len(unique_human_senders)} human(s).")
+    return None
+
+
+def reply_rank(all_messages):
+    """Scheduling rank of the room's pending reply: lower goes first.
+
+    The send time (ms) of the oldest human message since the AI last spoke,
+    brought forward ACTIVITY_RANK_SECONDS per message since then, so rooms
+    that have waited longest or are busiest are answered first. Ranks stay
+    comparable as time passes because every waiter ages at the same rate.
+    """
+    unanswered = []
+    for msg in reversed(all_messages):
+        if msg['senderId'].startswith('ai-'):
+            break
+        unanswered.append(msg)
+    if not unanswered:
+        return float('inf')
+    return ulid_timestamp_ms(unanswered[-1]['id']) - ACTIVITY_RANK_SECONDS * 1000 * len(unanswered)
+
+
+def build_input_items(all_messages):
+    """Turns a room's history into Responses API input, naming humans Player_1, Player_2, ..."""
+    input_items = []
+    human_participant_names = {}
+    player_counter = 1
+
+    for msg in all_messages:
+        sender_id = msg['senderId']
+        if not sender_id.startswith('ai-') and sender_id not in human_participant_names:
+            human_participant_names[sender_id] = f"Player_{player_counter}"
+            player_counter += 1
+
+    for msg in all_messages:
+        sender_id = msg['senderId']
+        role = "assistant" if sender_id.startswith('ai-') else "user"
+        name = "AI_Player" if role == "assistant" else human_participant_names.get(sender_id, "Unknown_Player")
+        input_items.append({"role": role, "name": name, "content": msg['text']})
+    return input_items
+
+
+def openai_request_body(input_items, instructions):
+    """The Responses API request for the AI's next message."""
+    return {
+        "model": OPENAI_MODEL,
+        "input": input_items,
+        "instructions": instructions,
+        "temperature": 1.0,
+    }
+
+
+def extract_output_text(resp_json: dict) -> str:
+    """Extract text from the new Responses API output format."""
+    parts = []
+    for item in resp_json.get("output", []):
+        if item.get("type") == "message":
+            for c in item.get("content", []):
+                if c.get("type") == "output_text":
+                    parts.append(c.get("text", ""))
+    return "".join(parts)
+
+
+def human_delay(ai_text):
+    """Returns (thinking, typing) seconds a human would take to send `ai_text`."""
+    typing_delay = len(ai_text) / TYPING_SPEED_CPS
+    thinking_delay = MIN_THINKING_SECONDS + random.uniform(0, MAX_RANDOM_THINKING_SECONDS)
+    return thinking_delay, typing_delay
+
+
+def claim_reply(chatrooms_table, chatroom_id, message_id):
+    """Records in the room that the caller answers `message_id`.
+
+    Returns False if another worker already answers that message or a newer one.
+    """
+    try:
+        with span('reply_claim'):
+            chatrooms_table.update_item(
+                Key={'id': chatroom_id},
+                UpdateExpression='SET aiGeneration = :mid',
+                ConditionExpression='attribute_exists(id) AND (attribute_not_exists(aiGeneration) OR aiGeneration < :mid)',
+                ExpressionAttributeValues={':mid': message_id},
+            )
+        return True
+    except chatrooms_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def newer_message(messages_table, chatroom_id, answered_id):
+    """Returns the room's latest message if it arrived after `answered_id`, else None."""
+    with span('staleness_check'):
+        latest = latest_messages(messages_table, chatroom_id, 1)
+    return latest[-1] if latest and latest[-1]['id'] > answered_id else None
+
+
+def still_current(messages_table, chatroom_id, answered_id):
+    """Whether a reply to `answered_id` may be posted after its typing delay, i.e. no newer message arrived.
+
+    A newer human message gets a turn of its own; a newer AI message is this reply, posted already.
+    """
+    if newer_message(messages_table, chatroom_id, answered_id) is None:
+        return True
+    count('StaleReplies')
+    print("A newer message arrived during the typing delay. Dropping the stale reply.")
+    return False
+
+
+def may_regenerate(newer, deadline, generation):
+    """Decides whether a reply made stale by `newer` should be regenerated rather than dropped."""
+    count('StaleReplies')
+    if newer['senderId'].startswith('ai-'):
+        print("Another AI reply was posted while this one was pending. Dropping it.")
+        return False
+    if generation + 1 >= MAX_GENERATIONS or not deadline.allows(MIN_GENERATION_SECONDS,
+                                                                 reserve=DELIVERY_RESERVE_SECONDS):
+        print("A newer message arrived and there is no time to answer it. Dropping the stale reply.")
+        return False
+    print("A newer message arrived. Regenerating the reply.")
+    return True
+
+
+def reply_turn(chatroom_id, deadline):
+    """The AI player's turn in one room, as a generator of the steps its runner performs (see the module docstring)."""
+    chatroom_item, all_messages = yield ('read', chatroom_id)
+    if chatroom_item is None:
+        print("Chatroom not found.")
+        return
+    ai_id = ai_participant(chatroom_item)
+    if not ai_id:
+        print("AI participant not found in chatroom.")
+        return
+
+    reason = skip_reason(all_messages)
+    if reason:
+        print(reason)
+        return
+
+    # Before the claim, so a runner that fails to get ready fails the room while a retry can still answer it
+    yield ('prepare',)
+
+    # Answer the latest message unless a worker triggered by a newer one already is
+    answered_id = all_messages[-1]['id']
+    if not (yield ('claim', chatroom_id, answered_id)):
+        print("A newer message is already being answered. Skipping this reply.")
+        return
+
+    # A reply made stale by newer messages before it is delivered is regenerated from the new history, time permitting
+    turn_started = time.monotonic()
+    for generation in range(MAX_GENERATIONS):
+        if generation:
+            all_messages = yield ('history', chatroom_id)
+            # The last message of this history may be newer still than the one that made the reply stale
+            if all_messages[-1]['senderId'].startswith('ai-'):
+                print("Another AI reply was posted while this one was pending. Dropping it.")
+                return
+            answered_id = all_messages[-1]['id']
+            if not (yield ('claim', chatroom_id, answered_id)):
+                print("A newer message arrived and another worker is answering it. Dropping the stale reply.")
+                return
+
+        ai_text = yield ('generate', chatroom_id, all_messages, deadline)
+        if ai_text is None:
+            return
+
+        newer = yield ('newer', chatroom_id, answered_id)
+        if newer:
+            if may_regenerate(newer, deadline, generation):
+                continue
+            return
+
+        # The time this turn already took counts as the player's thinking
+        thinking_delay, typing_delay = human_delay(ai_text)
+        generation_seconds = time.monotonic() - turn_started
+        total_delay = max(0, min(MAX_DELAY_SECONDS, thinking_delay + typing_delay) - generation_seconds)
+        print(f"Simulating human response. Thinking: {thinking_delay:.2f}s, Typing: {typing_delay:.2f}s, "
+              f"Generation: {generation_seconds:.2f}s. Total Wait: {total_delay:.2f}s.")
+        yield ('deliver', chatroom_id, ai_id, ai_text, total_delay, answered_id, deadline)
+        return
+
+
+def run_turn(turn, runner):
+    """Performs a reply_turn's steps with the blocking methods of `runner`."""
+    result = None
+    while True:
+        try:
+            step = turn.send(result)
+        except StopIteration:
+            return
+        result = getattr(runner, step[0])(*step[1:])
+
+
+async def run_turn_async(turn, runner):
+    """Performs a reply_turn's steps with the coroutine methods of `runner`."""
+    result = None
+    while True:
+        try:
+            step = turn.send(result)
+        except StopIteration:
+            return
+        result = await getattr(runner, step[0])(*step[1:])
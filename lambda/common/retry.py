@@ -0,0 +1,312 @@
+"""
+Retries with full-jitter backoff, bounded by a deadline, and optional hedged
+requests for an HTTP call made through `requests`.
+
+    response = call_with_retries(
+        lambda timeout, session=requests: session.post(url, json=body, timeout=timeout),
+        deadline=Deadline.from_context(context),
+        timeout=10,
+        reserve=DELIVERY_SECONDS,  # kept for the caller's work after the call
+        latencies=LATENCIES,  # enables hedging once the window has enough samples
+        admit_hedge=admit_hedge,  # charges each hedge to the caller's concurrency limit
+    )
+
+429, 5xx, timeouts and connection errors are retried; other statuses are
+returned as they are. A Retry-After header sets the minimum wait. Attempts
+stop when the next one could not finish before the deadline with `reserve`
+seconds to spare, so the caller keeps time for its own work. With a LatencyWindow, an attempt still running
+at the window's p95 is hedged with a second identical request and the first
+usable response wins. admit_hedge() is asked first and returns a release(ok)
+callback for the hedge, or None to go without one; the circuit breaker
+admits hedges this way, so they count against its limit like any call.
+Hedged requests run on a CancellableSession each, and the loser is
+cancelled as soon as there is a winner, which frees its thread.
+
+RetryPolicy makes the same decisions without doing any I/O, for callers that
+send and sleep their own way, such as ai_worker on its event loop:
+
+    policy = RetryPolicy(deadline, timeout=10, errors=(asyncio.TimeoutError, ConnectionError))
+    while (attempt_timeout := policy.next_timeout()) is not None:
+        try:
+            response, error = await http.post(url, body, headers, attempt_timeout), None
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            response, error = None, e
+        delay = policy.backoff(response, error)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+    response = policy.result()
+"""
+import collections
+import concurrent.futures
+import email.utils
+import os
+import random
+import socket
+import threading
+import time
+
+import requests
+
+from common.metrics import count
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_ATTEMPTS = 4
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+# An attempt given less time than this is not worth starting
+MIN_ATTEMPT_SECONDS = 2.0
+
+HEDGE_PERCENTILE = 95
+MIN_HEDGE_SAMPLES = 20
+
+# Hedged calls a container makes at once: ai_response answers a stream batch of up to 10 rooms side by side
+MAX_CONCURRENT_CALLS = int(os.environ.get('RETRY_MAX_CONCURRENT_CALLS', '10'))
+# Each hedged call holds at most two threads, so no request waits for one; threads start only when needed
+_HEDGE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2 * MAX_CONCURRENT_CALLS,
+                                                    thread_name_prefix='hedge')
+
+
+class CancellableSession(requests.Session):
+    """A Session whose in-flight requests cancel() aborts from another thread, by shutting down their sockets."""
+
+    def __init__(self):
+        super().__init__()
+        self.connections = []
+        self.cancelled = False
+        self.lock = threading.Lock()
+        for prefix in ('https://', 'http://'):
+            self.mount(prefix, _RecordingAdapter(self))
+
+    def track(self, connection):
+        with self.lock:
+            self.connections.append(connection)
+            cancelled = self.cancelled
+        if cancelled:
+            raise requests.exceptions.ConnectionError("Request cancelled")
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            connections = list(self.connections)
+        for connection in connections:
+            sock = getattr(connection, 'sock', None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # Already closed
+        self.close()
+
+
+class _RecordingAdapter(requests.adapters.HTTPAdapter):
+    """Hands every connection its pools check out to the session, so it can be shut down mid-request."""
+
+    def __init__(self, session):
+        self.session = session
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        session = self.session
+
+        def recording(pool_class):
+            class RecordingPool(pool_class):
+                def _get_conn(self, timeout=None):
+                    connection = super()._get_conn(timeout)
+                    session.track(connection)
+                    return connection
+            return RecordingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: recording(pool_class) for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class LatencyWindow:
+    """Recent successful call latencies, for choosing when to hedge."""
+
+    def __init__(self, size=200):
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        """The nearest-rank percentile, or None until MIN_HEDGE_SAMPLES calls have been seen."""
+        with self.lock:
+            if len(self.samples) < MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))]
+
+
+# Retryable exceptions of a `requests` call; the first is raised when no attempt could be made
+REQUESTS_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+
+def is_retryable(response=None, error=None, errors=REQUESTS_ERRORS):
+    """Whether an attempt's outcome is worth retrying."""
+    if error is not None:
+        return isinstance(error, errors)
+    return response.status_code in RETRYABLE_STATUSES
+
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header given in seconds or as an HTTP date."""
+    value = (getattr(response, 'headers', None) or {}).get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def backoff_seconds(attempt, response=None):
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)], but never less than Retry-After."""
+    delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+    retry_after = retry_after_seconds(response) if response is not None else None
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+def _hedge(send, timeout, session, release):
+    """Sends the hedge and reports its outcome to release(ok); a hedge cancelled because it lost is no failure."""
+    ok = False
+    try:
+        response = send(timeout, session)
+        ok = response.status_code < 500 and response.status_code != 429
+        return response
+    except requests.exceptions.RequestException:
+        ok = session.cancelled
+        raise
+    finally:
+        release(ok)
+
+
+def _attempt(send, timeout, latencies, admit_hedge=None):
+    """One attempt, hedged once it outlives the observed p95. Returns (response, error)."""
+    hedge_after = latencies.percentile(HEDGE_PERCENTILE) if latencies is not None else None
+    started = time.monotonic()
+    if hedge_after is None or hedge_after >= timeout:
+        try:
+            response = send(timeout)
+        except requests.exceptions.RequestException as e:
+            return None, e
+        if latencies is not None and not is_retryable(response):
+            latencies.add(time.monotonic() - started)
+        return response, None
+
+    sent = threading.Event()
+    sessions = [CancellableSession()]
+
+    def send_first():
+        sent.set()
+        return send(timeout, sessions[0])
+
+    first = _HEDGE_POOL.submit(send_first)
+    # The hedge delay counts from when the request goes out, not from when it was queued
+    sent.wait()
+    started = time.monotonic()
+    done, pending = concurrent.futures.wait({first}, timeout=hedge_after)
+    if not done:
+        release = admit_hedge() if admit_hedge is not None else (lambda ok: None)
+        if release is None:
+            count('HedgesShed')
+        else:
+            count('HedgedRequests')
+            sessions.append(CancellableSession())
+            pending.add(_HEDGE_POOL.submit(_hedge, send, timeout - hedge_after, sessions[1], release))
+    outcome = (None, None)
+    try:
+        while done or pending:
+            for future in done:
+                try:
+                    response, error = future.result(), None
+                except requests.exceptions.RequestException as e:
+                    response, error = None, e
+                outcome = (response, error)
+                if error is None and not is_retryable(response):
+                    latencies.add(time.monotonic() - started)
+                    return outcome
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        return outcome
+    finally:
+        # The winner's body is read already; the loser is aborted so its thread is free again
+        for session in sessions:
+            session.cancel()
+
+
+class RetryPolicy:
+    """The attempt, backoff and deadline decisions for one call, with the sending and sleeping left to the caller.
+
+    `errors` are the exception types worth retrying; the first is raised by
+    result() when no attempt could be made at all.
+    """
+
+    def __init__(self, deadline, timeout, max_attempts=MAX_ATTEMPTS, reserve=0.0, errors=REQUESTS_ERRORS):
+        self.deadline = deadline
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.reserve = reserve
+        self.errors = errors
+        self.attempts = 0
+        self.finished = False
+        self.response = self.error = None
+
+    def next_timeout(self):
+        """The timeout for the next attempt, or None if no attempt should be made."""
+        if self.finished or self.attempts >= self.max_attempts:
+            return None
+        remaining = self.deadline.remaining(self.reserve)
+        if remaining < MIN_ATTEMPT_SECONDS:
+            return None
+        if self.attempts:
+            count('RetryAttempts')
+        return min(self.timeout, remaining)
+
+    def backoff(self, response=None, error=None):
+        """Records an attempt's outcome. Returns the seconds to wait before retrying, or None to stop."""
+        self.attempts += 1
+        self.response, self.error = response, error
+        if not is_retryable(response, error, self.errors):
+            self.finished = True
+            return None
+        if self.attempts == self.max_attempts:
+            return None
+        delay = backoff_seconds(self.attempts - 1, response)
+        if not self.deadline.allows(delay + MIN_ATTEMPT_SECONDS, self.reserve):
+            return None
+        outcome = repr(error) if error is not None else response.status_code
+        print(f"Attempt {self.attempts} failed ({outcome}); retrying in {delay:.2f}s")
+        return delay
+
+    def result(self):
+        """The last response; raises the last exception if no attempt got a response."""
+        if self.response is None:
+            raise self.error or self.errors[0]("No time left for an attempt")
+        return self.response
+
+
+def call_with_retries(send, deadline, timeout, latencies=None, max_attempts=MAX_ATTEMPTS, reserve=0.0,
+                      admit_hedge=None):
+    """Calls send(timeout) until it succeeds, fails for good, or the Deadline leaves no room.
+
+    Hedged attempts call send(timeout, session) with a CancellableSession.
+    Returns the last response; raises the last exception if no attempt got a response.
+    """
+    policy = RetryPolicy(deadline, timeout, max_attempts, reserve)
+    while True:
+        attempt_timeout = policy.next_timeout()
+        if attempt_timeout is None:
+            break
+        delay = policy.backoff(*_attempt(send, attempt_timeout, latencies, admit_hedge))
+        if delay is None:
+            break
+        time.sleep(delay)
+    return policy.result()
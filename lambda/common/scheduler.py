@@ -0,0 +1,160 @@
+"""
+Priority admission for work that competes for a few concurrent slots, such
+as OpenAI generations: Scheduler for tasks on one asyncio event loop
+(ai_worker), ThreadScheduler for threads (the rooms of an ai_response batch).
+
+    async with SCHEDULER.slot(chatroom_id, rank, timeout=seconds_left):
+        ...  # at most `capacity` of these run at once, and `per_key` per chatroom
+
+A lower rank is admitted first; ties go in arrival order. When a slot frees
+up, the lowest-ranked waiter whose key is below its per-key cap gets it. A
+waiter not admitted within `timeout` raises asyncio.TimeoutError and leaves
+the queue. snapshot() reports queue depth, running work and recent waits.
+
+ThreadScheduler admits the same way, blocking the calling thread instead:
+
+    waited = GENERATIONS.acquire(chatroom_id, rank, timeout=seconds_left)
+    try:
+        ...
+    finally:
+        GENERATIONS.release(chatroom_id)
+
+Its timeout raises concurrent.futures.TimeoutError.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+WAIT_SAMPLES = 1000
+
+
+class Scheduler:
+    """Admits work to `capacity` concurrent slots, lowest rank first, at most `per_key` per key."""
+
+    def __init__(self, capacity, per_key=1):
+        self.capacity = capacity
+        self.per_key = per_key
+        self.running = 0
+        self.running_by_key = collections.Counter()
+        # (rank, arrival, key, future) of each waiter
+        self.waiting = []
+        self.arrivals = itertools.count()
+        self.waits = collections.deque(maxlen=WAIT_SAMPLES)
+
+    def _admissible(self, key):
+        return self.running < self.capacity and self.running_by_key[key] < self.per_key
+
+    def _start(self, key):
+        self.running += 1
+        self.running_by_key[key] += 1
+
+    def _dispatch(self):
+        skipped = []
+        while self.waiting and self.running < self.capacity:
+            entry = heapq.heappop(self.waiting)
+            future = entry[3]
+            if future.done():
+                continue  # Timed out or cancelled while waiting
+            if self.running_by_key[entry[2]] >= self.per_key:
+                skipped.append(entry)
+                continue
+            self._start(entry[2])
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self.waiting, entry)
+
+    def _finish(self, key):
+        self.running -= 1
+        self.running_by_key[key] -= 1
+        if not self.running_by_key[key]:
+            del self.running_by_key[key]
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key, rank, timeout=None):
+        """Holds one slot for `key` for the duration of the block, waiting by `rank` if none is free."""
+        enqueued = time.monotonic()
+        if self._admissible(key) and not self.waiting:
+            self._start(key)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiting, (rank, next(self.arrivals), key, future))
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                if future.done() and not future.cancelled():
+                    self._finish(key)  # Admitted just as the wait ended: hand the slot on
+                else:
+                    future.cancel()
+                raise
+        self.waits.append(time.monotonic() - enqueued)
+        try:
+            yield
+        finally:
+            self._finish(key)
+
+    def depth(self):
+        """Waiters not yet admitted."""
+        return sum(1 for entry in self.waiting if not entry[3].done())
+
+    def snapshot(self):
+        """Queue depth, running work and the p50/p95/max of recent waits in seconds."""
+        waits = sorted(self.waits)
+
+        def pick(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+        return {
+            'queueDepth': self.depth(),
+            'running': self.running,
+            'waitP50': pick(0.50),
+            'waitP95': pick(0.95),
+            'waitMax': waits[-1] if waits else 0.0,
+        }
+
+
+class ThreadScheduler(Scheduler):
+    """Scheduler whose waiters are threads: acquire() blocks until the key is admitted."""
+
+    def __init__(self, capacity, per_key=1):
+        super().__init__(capacity, per_key)
+        self.lock = threading.Lock()
+
+    def _finish(self, key):
+        with self.lock:
+            super()._finish(key)
+
+    def acquire(self, key, rank, timeout=None):
+        """Takes a slot for `key`, waiting by `rank` if none is free. Returns the seconds spent waiting."""
+        enqueued = time.monotonic()
+        with self.lock:
+            if self._admissible(key) and not self.waiting:
+                self._start(key)
+                future = None
+            else:
+                future = concurrent.futures.Future()
+                heapq.heappush(self.waiting, (rank, next(self.arrivals), key, future))
+        if future is not None:
+            try:
+                future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                with self.lock:
+                    admitted = not future.cancel()
+                if admitted:
+                    self._finish(key)  # Admitted just as the wait ended: hand the slot on
+                raise
+        waited = time.monotonic() - enqueued
+        self.waits.append(waited)
+        return waited
+
+    def release(self, key):
+        """Frees the slot taken by acquire(key, ...)."""
+        self._finish(key)
+
+    def snapshot(self):
+        with self.lock:
+            return super().snapshot()
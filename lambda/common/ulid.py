@@ -0,0 +1,70 @@
+"""
+ULIDs: 26-character identifiers whose string order is creation order.
+
+A ULID is a 48-bit millisecond timestamp followed by 80 random bits, both in
+Crockford base32, so ids sort by time to the millisecond and work as DynamoDB
+sort keys. Ids made in the same millisecond by one container increment the
+random part instead of redrawing it, so they stay strictly increasing; ids
+from different containers need no coordination, as 80 random bits do not
+collide in practice.
+
+    message_id = new_ulid()
+    KeyConditionExpression='chatroomId = :cid AND id >= :since'  # ':since': ulid_floor(ms)
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+TIMESTAMP_CHARS = 10
+RANDOM_CHARS = 16
+RANDOM_BITS = 80
+
+_lock = threading.Lock()
+# (timestamp ms, random part) of the last id this container generated
+_last = (0, 0)
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ENCODING[index])
+    return ''.join(reversed(chars))
+
+
+def new_ulid():
+    """Returns a new ULID, greater than every ULID this container returned before."""
+    global _last
+    with _lock:
+        now = int(time.time() * 1000)
+        last_ms, last_random = _last
+        if now <= last_ms:
+            # Same millisecond, or the clock stepped back: keep the last timestamp and count up
+            now, randomness = last_ms, last_random + 1
+            if randomness >> RANDOM_BITS:
+                now, randomness = last_ms + 1, 0
+        else:
+            randomness = int.from_bytes(os.urandom(RANDOM_BITS // 8), 'big')
+        _last = (now, randomness)
+    return _encode(now, TIMESTAMP_CHARS) + _encode(randomness, RANDOM_CHARS)
+
+
+def ulid_timestamp_ms(ulid):
+    """Returns the millisecond timestamp encoded in a ULID."""
+    value = 0
+    for char in ulid[:TIMESTAMP_CHARS].upper():
+        value = value * 32 + ENCODING.index(char)
+    return value
+
+
+def ulid_isoformat(ulid):
+    """Renders a ULID's timestamp the way createdAt is stored (ISO 8601, UTC, 'Z')."""
+    moment = datetime.fromtimestamp(ulid_timestamp_ms(ulid) / 1000, timezone.utc)
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def ulid_floor(timestamp_ms):
+    """The smallest ULID of a millisecond: `id >= ulid_floor(t)` selects ids created at or after t."""
+    return _encode(timestamp_ms, TIMESTAMP_CHARS) + ENCODING[0] * RANDOM_CHARS
@@ -0,0 +1,34 @@
+import json
+
+from common import clients
+from common.metrics import instrumented
+
+dynamodb = clients.resource('dynamodb')
+
+@instrumented('create_match')
+def handler(event, context):
+    print("createMatch event:", event)
+    
+    try:
+        args = event['arguments']
+        user_id_to_notify = args['userId']
+        the_other_player_id = args['matchedUserId'] # <-- Get the new argument
+        chatroom_id = args['chatroomId']
+        
+        print(f"Processing match for user {user_id_to_notify} with {the_other_player_id}")
+        
+        response_payload = {
+            'userId': user_id_to_notify,
+            'matchedUserId': the_other_player_id, # <-- Use the correct value
+            'chatroomId': chatroom_id,
+            # The other participants in the order this player sees them as Player 1, Player 2, ...
+            'players': args.get('players')
+        }
+
+        print(f"Returning payload to AppSync: {json.dumps(response_payload)}")
+        
+        return response_payload
+        
+    except Exception as e:
+        print(f"Error in createMatch: {e}")
+        raise e
\ No newline at end of file
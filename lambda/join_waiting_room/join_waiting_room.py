@@ -2,12 +2,16 @@ import json
 import os
 import uuid
 from datetime import datetime
-import boto3
 
-dynamodb = boto3.resource('dynamodb')
+from common import clients
+from common.items import WAITING_ROOM_ENTRY, ItemTable
+from common.metrics import instrumented, span
+
+dynamodb = clients.client('dynamodb')
 TABLE_NAME = os.environ.get('WAITING_ROOM_TABLE')
-table = dynamodb.Table(TABLE_NAME)
+table = ItemTable(dynamodb, TABLE_NAME, WAITING_ROOM_ENTRY)
 
+@instrumented('join_waiting_room')
 def handler(event, context):
     # Generate a unique ID for the new participant
     user_id = str(uuid.uuid4())
@@ -20,7 +24,8 @@ def handler(event, context):
         }
         
         # Put the item into the waiting room table
-        table.put_item(Item=item)
+        with span('put_item'):
+            table.put_item(Item=item)
         
         # Return in GraphQL format
         return {
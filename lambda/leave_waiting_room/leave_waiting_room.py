@@ -1,17 +1,21 @@
 import json
 import os
-import boto3
 
-dynamodb = boto3.resource('dynamodb')
+from common import clients
+from common.metrics import instrumented, span
+
+dynamodb = clients.resource('dynamodb')
 TABLE_NAME = os.environ.get('WAITING_ROOM_TABLE')
 table = dynamodb.Table(TABLE_NAME)
 
+@instrumented('leave_waiting_room')
 def handler(event, context):
     user_id = event['arguments']['userId']
     
     try:
         # Remove user from waiting room
-        table.delete_item(Key={'id': user_id})
+        with span('delete_item'):
+            table.delete_item(Key={'id': user_id})
         
         return True
     except Exception as e:
@@ -1,10 +1,13 @@
 import os
+import random
 import uuid
 from datetime import datetime
 import boto3
 import json
 import requests
 
+from common.metrics import instrumented, span
+
 # Initialize clients and variables in global scope
 DYNAMODB = boto3.resource('dynamodb')
 
@@ -14,6 +17,7 @@ CHATROOMS_TABLE_NAME = os.environ.get('CHATROOMS_TABLE')
 APPSYNC_URL = os.environ.get('APPSYNC_URL')
 APPSYNC_API_KEY = os.environ.get('APPSYNC_API_KEY')
 
+@instrumented('matchmaking')
 def handler(event, context):
     """
     Triggered by DynamoDB Stream when players join waiting room.
@@ -24,13 +28,15 @@ def handler(event, context):
         waiting_room_table = DYNAMODB.Table(WAITING_ROOM_TABLE_NAME)
         chatrooms_table = DYNAMODB.Table(CHATROOMS_TABLE_NAME)
         
-        response = waiting_room_table.scan(Select='COUNT')
+        with span('count_scan'):
+            response = waiting_room_table.scan(Select='COUNT')
         player_count = response['Count']
         
         print(f"Current players in waiting room: {player_count}")
         
         if player_count >= 2:
-            players_response = waiting_room_table.scan(Limit=2)
+            with span('player_scan'):
+                players_response = waiting_room_table.scan(Limit=2)
             players = players_response.get('Items', [])
             
             if len(players) >= 2:
@@ -38,25 +44,30 @@ def handler(event, context):
                 player2 = players[1]
                 ai_participant_id = f"ai-{str(uuid.uuid4())}"
                 chatroom_id = str(uuid.uuid4())
+                participants = [player1['id'], player2['id'], ai_participant_id]
+                player_labels = labels_for(participants)
 
                 print(f"Matching players {player1['id']} and {player2['id']}")
 
-                chatrooms_table.put_item(
-                    Item={
-                        'id': chatroom_id,
-                        'participants': [player1['id'], player2['id'], ai_participant_id],
-                        'createdAt': datetime.utcnow().isoformat() + "Z"
-                    }
-                )
+                with span('chatroom_put'):
+                    chatrooms_table.put_item(
+                        Item={
+                            'id': chatroom_id,
+                            'participants': participants,
+                            'playerLabels': player_labels,
+                            'createdAt': datetime.utcnow().isoformat() + "Z"
+                        }
+                    )
 
-                with waiting_room_table.batch_writer() as batch:
+                with span('waiting_room_delete'), waiting_room_table.batch_writer() as batch:
                     batch.delete_item(Key={'id': player1['id']})
                     batch.delete_item(Key={'id': player2['id']})
                 
                 # --- THIS IS THE FIX ---
                 # Notify both players, passing the other player's ID to the function.
-                notify_player_match(player1['id'], player2['id'], chatroom_id)
-                notify_player_match(player2['id'], player1['id'], chatroom_id)
+                with span('notify'):
+                    notify_player_match(player1['id'], player2['id'], chatroom_id, player_labels[player1['id']])
+                    notify_player_match(player2['id'], player1['id'], chatroom_id, player_labels[player2['id']])
                 # --- END OF FIX ---
                 
                 print(f"Chatroom {chatroom_id} created and notifications sent.")
@@ -68,18 +79,34 @@ def handler(event, context):
         print(f"Error during matchmaking: {e}")
         raise e
     
-def notify_player_match(user_id_to_notify, other_player_id, chatroom_id):
+def labels_for(participants):
+    """Each human's view of the room: the other participants in the order shown as Player 1, Player 2, ...
+
+    Shuffled per player, so the AI's label says nothing about who it is.
+    """
+    labels = {}
+    for participant in participants:
+        if participant.startswith('ai-'):
+            continue
+        others = [p for p in participants if p != participant]
+        random.shuffle(others)
+        labels[participant] = others
+    return labels
+
+def notify_player_match(user_id_to_notify, other_player_id, chatroom_id, players):
     """
     Calls the createMatch GraphQL mutation, providing both the recipient's ID
-    and the ID of the player they were matched with.
+    and the ID of the player they were matched with, and the order in which
+    the recipient sees the other participants.
     """
     try:
         mutation = """
-          mutation CreateMatch($userId: ID!, $matchedUserId: ID!, $chatroomId: ID!) {
-            createMatch(userId: $userId, matchedUserId: $matchedUserId, chatroomId: $chatroomId) {
+          mutation CreateMatch($userId: ID!, $matchedUserId: ID!, $chatroomId: ID!, $players: [ID!]) {
+            createMatch(userId: $userId, matchedUserId: $matchedUserId, chatroomId: $chatroomId, players: $players) {
               userId
               chatroomId
               matchedUserId
+              players
             }
           }
         """
@@ -88,7 +115,8 @@ def notify_player_match(user_id_to_notify, other_player_id, chatroom_id):
             "variables": {
                 "userId": user_id_to_notify,
                 "matchedUserId": other_player_id,
-                "chatroomId": chatroom_id
+                "chatroomId": chatroom_id,
+                "players": players
             }
         }
         
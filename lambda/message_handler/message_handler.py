@@ -1,33 +1,37 @@
-import json
 import os
-import uuid
-from datetime import datetime
 import boto3
 
+from common.items import MESSAGE, ItemTable
+from common.log import Logger, redact
+from common.metrics import instrumented, span
+from common.ulid import new_ulid, ulid_isoformat
+
 # Initialize Boto3 clients in the global scope
-DYNAMODB_RESOURCE = boto3.resource('dynamodb')
-LAMBDA_CLIENT = boto3.client('lambda')
+DYNAMODB_CLIENT = boto3.client('dynamodb')
+LOGGER = Logger('message_handler')
 
 try:
     MESSAGES_TABLE_NAME = os.environ['MESSAGES_TABLE']
-    # Get the AI Lambda function name directly from environment variable
-    AI_RESPONSE_LAMBDA_NAME = os.environ['AI_RESPONSE_LAMBDA_NAME']
-    print(f"Environment variables loaded: MESSAGES_TABLE={MESSAGES_TABLE_NAME}, AI_RESPONSE_LAMBDA_NAME={AI_RESPONSE_LAMBDA_NAME}")
 except KeyError as e:
-    print(f"FATAL: Missing required environment variable: {e}")
+    LOGGER.error("Missing required environment variable", variable=str(e))
     raise e
 
 # Get a reference to the DynamoDB table once
-MESSAGES_TABLE = DYNAMODB_RESOURCE.Table(MESSAGES_TABLE_NAME)
-print(f"DynamoDB table reference created: {MESSAGES_TABLE_NAME}")
+MESSAGES_TABLE = ItemTable(DYNAMODB_CLIENT, MESSAGES_TABLE_NAME, MESSAGE)
+
+def redact_arguments(args):
+    """A sendMessage call's arguments as they may be logged, with the text redacted."""
+    return dict(args, text=redact(args.get('text')))
 
+@instrumented('message_handler')
+@LOGGER.request_scope
 def handler(event, context):
     """
     Handles the 'sendMessage' GraphQL mutation.
     """
-    print(f"=== MESSAGE HANDLER STARTED ===")
-    print(f"Received event from AppSync: {json.dumps(event)}")
-    print(f"Context: {context}")
+    # Never the raw event: the text is user-written, and identity may carry caller details
+    LOGGER.debug("Received event", field=lambda: event.get('info', {}).get('fieldName'),
+                 arguments=lambda: redact_arguments(event.get('arguments', {})))
 
     try:
         # 1. PARSE ARGUMENTS
@@ -35,83 +39,29 @@ def handler(event, context):
         chatroom_id = args.get('chatroomId')
         text = args.get('text')
         sender_id = args.get('senderId')
-        
-        print(f"Parsed arguments - chatroom_id: {chatroom_id}, text: {text}, sender_id: {sender_id}")
 
         if not all([chatroom_id, text, sender_id]):
-            error_msg = "Missing required arguments: chatroomId, text, or senderId"
-            print(f"ERROR: {error_msg}")
-            raise ValueError(error_msg)
+            raise ValueError("Missing required arguments: chatroomId, text, or senderId")
 
+        # The ULID id is the sort key: unique per message and in creation order within the room
+        message_id = new_ulid()
         message = {
-            'id': str(uuid.uuid4()),
+            'id': message_id,
             'chatroomId': chatroom_id,
             'text': text,
             'senderId': sender_id,
-            'createdAt': datetime.utcnow().isoformat() + "Z",
+            'createdAt': ulid_isoformat(message_id),
         }
-        
-        print(f"Created message object: {json.dumps(message)}")
-    
-        # 2. SAVE AND TRIGGER AI
-        print(f"Attempting to save message to DynamoDB table: {MESSAGES_TABLE_NAME}")
-        MESSAGES_TABLE.put_item(Item=message)
-        print(f"Successfully saved message {message['id']} to chatroom {chatroom_id}")
-        
-        if not sender_id.startswith('ai-'):
-            print(f"Human message received. Preparing to trigger AI response lambda: {AI_RESPONSE_LAMBDA_NAME}")
-            
-            ai_payload = {
-                'chatroomId': chatroom_id,
-                'chatHistory': [message]
-            }
-            
-            print(f"AI payload: {json.dumps(ai_payload)}")
-            print(f"Attempting to invoke Lambda: {AI_RESPONSE_LAMBDA_NAME}")
-            print(f"Lambda client region: {LAMBDA_CLIENT.meta.region_name}")
-            
-            # Now attempt the invocation
-            try:
-                print("Attempting Lambda invoke...")
-                response = LAMBDA_CLIENT.invoke(
-                    FunctionName=AI_RESPONSE_LAMBDA_NAME,
-                    InvocationType='Event',  # Async invocation
-                    Payload=json.dumps(ai_payload)
-                )
-                
-                print(f"Lambda invoke response: {response}")
-                print(f"StatusCode: {response.get('StatusCode')}")
-                print(f"FunctionError: {response.get('FunctionError')}")
-                print(f"Payload: {response.get('Payload')}")
-                print(f"ExecutedVersion: {response.get('ExecutedVersion')}")
-                
-                if response.get('StatusCode') == 202:
-                    print("SUCCESS: Lambda invocation accepted (202 status)")
-                else:
-                    print(f"WARNING: Unexpected status code: {response.get('StatusCode')}")
-                    
-            except Exception as invoke_error:
-                print(f"ERROR: Lambda invoke failed: {invoke_error}")
-                print(f"Error type: {type(invoke_error)}")
-                # Check for specific error types
-                if hasattr(invoke_error, 'response'):
-                    print(f"Error response: {invoke_error.response}")
-                if hasattr(invoke_error, 'operation_name'):
-                    print(f"Operation: {invoke_error.operation_name}")
 
-        else:
-            print("AI message detected, skipping AI response trigger")
+        # 2. SAVE; ai_response picks the message up from the table's stream
+        with span('put_message'):
+            MESSAGES_TABLE.put_item(Item=message)
+        LOGGER.info("Message saved", messageId=message['id'], chatroomId=chatroom_id,
+                    senderId=sender_id, text=redact(text))
 
         # 3. RETURN RESPONSE TO APPSYNC
-        print(f"Returning message to AppSync: {json.dumps(message)}")
         return message
 
     except Exception as e:
-        print(f"ERROR: Exception in handler: {e}")
-        print(f"Exception type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        LOGGER.exception("Message handler failed", error=str(e))
         raise e
-
-    finally:
-        print("=== MESSAGE HANDLER COMPLETED ===")
\ No newline at end of file
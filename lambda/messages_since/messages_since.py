@@ -0,0 +1,49 @@
+import os
+import boto3
+
+from common.items import MESSAGE, ItemTable
+from common.messages import clamp_limit, decode_token, encode_token, latest_messages, messages_after
+from common.metrics import instrumented, span
+
+# Initialize DynamoDB client
+DYNAMODB_CLIENT = boto3.client('dynamodb')
+MESSAGES_TABLE_NAME = os.environ.get('MESSAGES_TABLE')
+
+if not MESSAGES_TABLE_NAME:
+    raise ValueError("MESSAGES_TABLE environment variable must be set")
+
+MESSAGES_TABLE = ItemTable(DYNAMODB_CLIENT, MESSAGES_TABLE_NAME, MESSAGE)
+
+@instrumented('messages_since')
+def handler(event, context):
+    """Returns one page of a chatroom's messages after a message id (messagesSince)."""
+    try:
+        # AppSync wraps arguments in 'arguments' field
+        args = event.get('arguments', event)
+        chatroom_id = args.get('chatroomId')
+        if not chatroom_id:
+            raise ValueError("chatroomId is required")
+        limit = clamp_limit(args.get('limit'))
+
+        after_id = decode_token(args['nextToken'], chatroom_id) if args.get('nextToken') else args.get('afterId')
+        if after_id:
+            with span('query'):
+                items, resume_after = messages_after(MESSAGES_TABLE, chatroom_id, after_id, limit)
+        else:
+            # First load: the newest window, so a long-lived room never returns its whole history
+            with span('query'):
+                items = latest_messages(MESSAGES_TABLE, chatroom_id, limit)
+            resume_after = None
+
+        print(f"messagesSince {chatroom_id}: {len(items)} messages after {after_id}")
+        return {
+            'items': [dict(item, __typename='Message') for item in items],
+            'nextToken': encode_token(chatroom_id, resume_after) if resume_after else None,
+            # Cursor for the next reconnect: the newest id the client now holds
+            'lastId': items[-1]['id'] if items else after_id,
+            '__typename': 'MessagePage'
+        }
+
+    except Exception as e:
+        print(f"Error querying messages: {e}")
+        raise Exception(f"Failed to query messages: {str(e)}")
@@ -1,10 +1,16 @@
-import boto3
+import hashlib
 import json
 import os
+import time
+from collections import OrderedDict
+from decimal import Decimal
 from boto3.dynamodb.conditions import Key, Attr
 
+from common import clients
+from common.metrics import annotate, instrumented, span
+
 # Initialize DynamoDB client
-DYNAMODB = boto3.resource('dynamodb')
+DYNAMODB = clients.resource('dynamodb')
 SURVEY_RESPONSES_TABLE_NAME = os.environ.get('SURVEY_RESPONSES_TABLE')
 
 if not SURVEY_RESPONSES_TABLE_NAME:
@@ -12,59 +18,270 @@ if not SURVEY_RESPONSES_TABLE_NAME:
 
 SURVEY_RESPONSES_TABLE = DYNAMODB.Table(SURVEY_RESPONSES_TABLE_NAME)
 
+# Optional shared state table holding the survey version counter and shared cache tier
+APP_STATE_TABLE_NAME = os.environ.get('APP_STATE_TABLE')
+APP_STATE_TABLE = DYNAMODB.Table(APP_STATE_TABLE_NAME) if APP_STATE_TABLE_NAME else None
+
+# --- QUERY PLANNER CONFIGURATION ---
+# GSIs on the survey table, keyed by the attribute they are partitioned on
+INDEXES = {
+    'education': 'education-index',
+    'llmKnowledge': 'llmKnowledge-index',
+}
+
+# Partition sizes are counted with Select='COUNT' queries and reused until the survey
+# version moves on and they are older than this
+STATS_MAX_AGE_SECONDS = float(os.environ.get('SURVEY_STATS_MAX_AGE_SECONDS', '300'))
+
+# Upper bound on pages read when residual filters discard most of a partition
+MAX_PAGES = int(os.environ.get('SURVEY_QUERY_MAX_PAGES', '10'))
+
+# --- RESULT CACHE CONFIGURATION ---
+SURVEY_VERSION_KEY = 'survey-responses-version'
+CACHE_TTL_SECONDS = float(os.environ.get('SURVEY_CACHE_TTL_SECONDS', '30'))
+CACHE_MAX_ENTRIES = int(os.environ.get('SURVEY_CACHE_MAX_ENTRIES', '256'))
+CACHE_SHARED = os.environ.get('SURVEY_CACHE_SHARED', 'false').lower() == 'true'
+
+# Maps (version, cache key) -> (expires_at, cached_at, result); most recently used last
+RESULT_CACHE = OrderedDict()
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# Maps (attribute, value) or the table name -> (version, counted_at, item count)
+TABLE_STATS = {}
+
+def _stat(key, version, count):
+    """A cached item count, counted again once the version changed and the entry has aged."""
+    entry = TABLE_STATS.get(key)
+    now = time.time()
+    if entry and (entry[0] == version or now - entry[1] < STATS_MAX_AGE_SECONDS):
+        return entry[2]
+    with span('table_stats'):
+        value = count()
+    TABLE_STATS[key] = (version, now, value)
+    return value
+
+def count_partition(attribute, value):
+    """Counts the responses in one GSI partition, paging through Select='COUNT' queries."""
+    request = {
+        'IndexName': INDEXES[attribute],
+        'KeyConditionExpression': Key(attribute).eq(value),
+        'Select': 'COUNT',
+    }
+    total = 0
+    while True:
+        response = SURVEY_RESPONSES_TABLE.query(**request)
+        total += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return total
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def count_responses():
+    """The table's item count as DynamoDB last published it (refreshed about every six hours)."""
+    response = DYNAMODB.meta.client.describe_table(TableName=SURVEY_RESPONSES_TABLE_NAME)
+    return response['Table']['ItemCount']
+
+def estimate_selectivity(attribute, value, version=None):
+    """Estimates the fraction of survey responses where attribute == value from stored responses."""
+    matching = _stat((attribute, value), version, lambda: count_partition(attribute, value))
+    total = _stat(SURVEY_RESPONSES_TABLE_NAME, version, count_responses)
+    # ItemCount lags behind recent writes; the partition count does not
+    return matching / max(total, matching) if matching else 0.0
+
+def plan_query(filters, version=None):
+    """Picks the cheapest access path and the residual filters for a set of filters."""
+    # A full scan reads everything; each usable GSI reads only its partition
+    access_path, index_attribute, selectivity = 'scan', None, 1.0
+    for attribute in INDEXES:
+        value = filters.get(attribute)
+        if not value:
+            continue
+        estimate = estimate_selectivity(attribute, value, version)
+        # A partition is never larger than the table, so any usable index beats the scan
+        if access_path == 'scan' or estimate < selectivity:
+            access_path, index_attribute, selectivity = 'query', attribute, estimate
+
+    # Everything the access path does not cover becomes a DynamoDB filter expression
+    conditions = []
+    descriptions = []
+    for attribute in ('education', 'llmKnowledge', 'chatbotFrequency'):
+        value = filters.get(attribute)
+        if value and attribute != index_attribute:
+            conditions.append(Attr(attribute).eq(value))
+            descriptions.append(f"{attribute} = {value}")
+    if filters.get('minAge') is not None:
+        conditions.append(Attr('age').gte(filters['minAge']))
+        descriptions.append(f"age >= {filters['minAge']}")
+    if filters.get('maxAge') is not None:
+        conditions.append(Attr('age').lte(filters['maxAge']))
+        descriptions.append(f"age <= {filters['maxAge']}")
+
+    filter_expression = None
+    for condition in conditions:
+        filter_expression = condition if filter_expression is None else filter_expression & condition
+
+    return {
+        'accessPath': access_path,
+        'indexName': INDEXES.get(index_attribute),
+        'keyAttribute': index_attribute,
+        'keyValue': filters.get(index_attribute) if index_attribute else None,
+        'estimatedSelectivity': selectivity,
+        'filterExpression': filter_expression,
+        'residualFilters': descriptions,
+    }
+
+def execute_plan(plan, limit):
+    """Runs a query plan, paging until `limit` matching items are found or the path is exhausted."""
+    request = {}
+    if plan['accessPath'] == 'query':
+        request['IndexName'] = plan['indexName']
+        request['KeyConditionExpression'] = Key(plan['keyAttribute']).eq(plan['keyValue'])
+    if plan['filterExpression'] is not None:
+        request['FilterExpression'] = plan['filterExpression']
+    operation = SURVEY_RESPONSES_TABLE.query if plan['accessPath'] == 'query' else SURVEY_RESPONSES_TABLE.scan
+
+    items = []
+    items_read = 0
+    pages = 0
+    while len(items) < limit and pages < MAX_PAGES:
+        # DynamoDB applies Limit before the filter, so it bounds items read per page
+        response = operation(Limit=limit, **request)
+        pages += 1
+        items_read += response.get('ScannedCount', 0)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    items = items[:limit]
+    trace = {
+        'accessPath': plan['accessPath'],
+        'indexName': plan['indexName'],
+        'keyCondition': f"{plan['keyAttribute']} = {plan['keyValue']}" if plan['keyAttribute'] else None,
+        'residualFilters': plan['residualFilters'],
+        'estimatedSelectivity': plan['estimatedSelectivity'],
+        'itemsRead': items_read,
+        'itemsReturned': len(items),
+        'pages': pages,
+    }
+    return items, trace
+
+def cache_key(filters, limit):
+    """Normalizes the query arguments into a stable cache key."""
+    normalized = {k: v for k, v in filters.items() if v is not None and v != ''}
+    normalized['limit'] = limit
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+def get_survey_version():
+    """Reads the version counter that submit_survey bumps on every write."""
+    response = APP_STATE_TABLE.get_item(Key={'id': SURVEY_VERSION_KEY}, ConsistentRead=True)
+    return int(response.get('Item', {}).get('version', 0))
+
+def json_default(value):
+    """Serializes DynamoDB Decimals for the shared cache tier."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Unserializable value: {value!r}")
+
+def shared_cache_id(key, version):
+    """Builds the shared-tier item id for a cache key at a survey version."""
+    return f"survey-cache#{version}#{hashlib.sha256(key.encode()).hexdigest()}"
+
+def cache_get(key, version):
+    """Looks up a cached result in the local LRU, then the shared tier."""
+    now = time.time()
+    entry = RESULT_CACHE.get((version, key))
+    if entry and entry[0] > now:
+        RESULT_CACHE.move_to_end((version, key))
+        return entry[2], 'local', now - entry[1]
+    RESULT_CACHE.pop((version, key), None)
+
+    if CACHE_SHARED:
+        item = APP_STATE_TABLE.get_item(Key={'id': shared_cache_id(key, version)}).get('Item')
+        if item and item['expiresAt'] > now:
+            result = json.loads(item['result'])
+            cached_at = float(item['cachedAt'])
+            cache_put(key, version, result, cached_at=cached_at, shared=False)
+            return result, 'shared', now - cached_at
+    return None, None, 0
+
+def cache_put(key, version, result, cached_at=None, shared=CACHE_SHARED):
+    """Stores a result in the local LRU and, if enabled, the shared tier."""
+    cached_at = cached_at or time.time()
+    RESULT_CACHE[(version, key)] = (cached_at + CACHE_TTL_SECONDS, cached_at, result)
+    RESULT_CACHE.move_to_end((version, key))
+    while len(RESULT_CACHE) > CACHE_MAX_ENTRIES:
+        RESULT_CACHE.popitem(last=False)
+
+    if shared:
+        try:
+            APP_STATE_TABLE.put_item(Item={
+                'id': shared_cache_id(key, version),
+                'result': json.dumps(result, default=json_default),
+                'cachedAt': str(cached_at),
+                'expiresAt': int(cached_at + CACHE_TTL_SECONDS),
+            })
+        except Exception as e:
+            # An oversized or throttled entry only costs the shared tier
+            print(f"Could not write shared survey cache entry: {e}")
+
+@instrumented('query_survey_responses')
 def handler(event, context):
     """Query survey responses with optional filters."""
     try:
+        # AppSync wraps arguments in 'arguments' field
+        args = event.get('arguments', event)
+
         # Extract filter parameters
-        education_filter = event.get('education')
-        llm_knowledge_filter = event.get('llmKnowledge')
-        min_age = event.get('minAge')
-        max_age = event.get('maxAge')
-        chatbot_frequency_filter = event.get('chatbotFrequency')
-        limit = event.get('limit', 100)
-        
-        # Start with scan (or use GSI if filtering by indexed fields)
-        if education_filter:
-            # Use education GSI
-            response = SURVEY_RESPONSES_TABLE.query(
-                IndexName='education-index',
-                KeyConditionExpression=Key('education').eq(education_filter),
-                Limit=limit
-            )
-        elif llm_knowledge_filter:
-            # Use llmKnowledge GSI
-            response = SURVEY_RESPONSES_TABLE.query(
-                IndexName='llmKnowledge-index',
-                KeyConditionExpression=Key('llmKnowledge').eq(llm_knowledge_filter),
-                Limit=limit
-            )
-        else:
-            # Full table scan
-            response = SURVEY_RESPONSES_TABLE.scan(Limit=limit)
-        
-        items = response.get('Items', [])
-        
-        # Apply additional filters
-        if min_age is not None:
-            items = [item for item in items if item.get('age', 0) >= min_age]
-        if max_age is not None:
-            items = [item for item in items if item.get('age', 999) <= max_age]
-        if chatbot_frequency_filter:
-            items = [item for item in items if item.get('chatbotFrequency') == chatbot_frequency_filter]
-        
+        filters = {
+            'education': args.get('education'),
+            'llmKnowledge': args.get('llmKnowledge'),
+            'minAge': args.get('minAge'),
+            'maxAge': args.get('maxAge'),
+            'chatbotFrequency': args.get('chatbotFrequency'),
+        }
+        limit = args.get('limit') or 100
+
+        # Serve repeated filter combinations from cache until the next submission
+        caching = APP_STATE_TABLE is not None and CACHE_TTL_SECONDS > 0
+        if caching:
+            key = cache_key(filters, limit)
+            with span('version_read'):
+                version = get_survey_version()
+            with span('cache_lookup'):
+                cached, tier, age = cache_get(key, version)
+            if cached is not None:
+                CACHE_STATS['hits'] += 1
+                annotate(cacheHit=True, cacheTier=tier)
+                print(f"Survey cache hit ({tier}), stats: {CACHE_STATS}")
+                return dict(cached, cache={'hit': True, 'tier': tier, 'version': version, 'ageSeconds': age})
+            CACHE_STATS['misses'] += 1
+
+        plan = plan_query(filters, version if caching else None)
+        with span('query'):
+            items, trace = execute_plan(plan, limit)
+        annotate(cacheHit=False, itemsRead=trace['itemsRead'], itemsReturned=trace['itemsReturned'])
+        print(f"Survey query plan: {json.dumps(trace)}")
+
         # Calculate statistics
         total_responses = len(items)
         correct_guesses = sum(1 for item in items if item.get('wasCorrect', False))
-        
+
         # Return data directly for AppSync
-        return {
+        result = {
             'responses': items,
             'totalCount': total_responses,
             'correctGuesses': correct_guesses,
             'accuracy': (correct_guesses / total_responses * 100) if total_responses > 0 else 0,
+            'explain': trace,
             '__typename': 'SurveyQueryResult'
         }
-        
+        if not caching:
+            return result
+
+        cache_put(key, version, result)
+        print(f"Survey cache miss, stats: {CACHE_STATS}")
+        return dict(result, cache={'hit': False, 'tier': None, 'version': version, 'ageSeconds': 0})
+
     except Exception as e:
         print(f"Error querying survey responses: {e}")
         raise Exception(f"Failed to query survey responses: {str(e)}")
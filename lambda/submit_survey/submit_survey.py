@@ -1,68 +1,261 @@
-import boto3
 import json
 import os
+import random
+import time
 import uuid
 from datetime import datetime, timezone
 
+from common import clients
+from common.chatrooms import ChatroomCache
+from common.items import SURVEY_RESPONSE
+from common.metrics import instrumented, span
+
 # Initialize DynamoDB client
-DYNAMODB = boto3.resource('dynamodb')
+DYNAMODB = clients.resource('dynamodb')
+# Survey writes go through the low-level client with precompiled marshalling; see common/items.py
+DYNAMODB_CLIENT = clients.client('dynamodb')
 SURVEY_RESPONSES_TABLE_NAME = os.environ.get('SURVEY_RESPONSES_TABLE')
+CHATROOMS_TABLE_NAME = os.environ.get('CHATROOMS_TABLE')
+# Shared state table holding one-survey-per-user guards and the version counter
+# querySurveyResponses caches against
+APP_STATE_TABLE_NAME = os.environ.get('APP_STATE_TABLE')
 
-if not SURVEY_RESPONSES_TABLE_NAME:
-    raise ValueError("SURVEY_RESPONSES_TABLE environment variable is not set")
+if not all([SURVEY_RESPONSES_TABLE_NAME, CHATROOMS_TABLE_NAME, APP_STATE_TABLE_NAME]):
+    raise ValueError("SURVEY_RESPONSES_TABLE, CHATROOMS_TABLE and APP_STATE_TABLE environment variables must be set")
 
 SURVEY_RESPONSES_TABLE = DYNAMODB.Table(SURVEY_RESPONSES_TABLE_NAME)
+CHATROOMS = ChatroomCache(DYNAMODB_CLIENT, CHATROOMS_TABLE_NAME)
+APP_STATE_TABLE = DYNAMODB.Table(APP_STATE_TABLE_NAME)
+SURVEY_VERSION_KEY = 'survey-responses-version'
+MISSING_FIELDS = 'Missing required fields'
+
+# Survey ids are derived from (chatroomId, userId) so retries map to the same row
+SURVEY_ID_NAMESPACE = uuid.UUID('6f1c3f2e-3b7a-5d0e-9a51-2c4d8e7f9b10')
+
+# --- BATCH SUBMISSION CONFIGURATION ---
+BATCH_CHUNK_SIZE = 25  # Two transaction actions per survey, within the 100-action limit
+MAX_BATCH_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 1.0
+
+def bump_survey_version():
+    """Invalidates cached survey query results by incrementing the version counter."""
+    try:
+        APP_STATE_TABLE.update_item(
+            Key={'id': SURVEY_VERSION_KEY},
+            UpdateExpression='ADD version :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+    except Exception as e:
+        # Stale cache entries still expire after their TTL
+        print(f"Could not bump survey version: {e}")
+
+def survey_id_for(chatroom_id, user_id):
+    """Derives the stable survey id for a participant of a chatroom."""
+    return str(uuid.uuid5(SURVEY_ID_NAMESPACE, f"{chatroom_id}#{user_id}"))
+
+def get_chatrooms(chatroom_ids):
+    """Fetches the given chatrooms' records, keyed by chatroom id."""
+    return CHATROOMS.get_many(chatroom_ids)
+
+def was_guess_correct(bot_guess, user_id, chatroom):
+    """Resolves a guess, a participant id or the 'Player N' label the guesser was shown, to whether it names the AI.
+
+    Labels come from the room's `playerLabels`, written by matchmaking; rooms without them leave
+    'Player N' guesses unscored (None) rather than assuming an order.
+    """
+    participants = (chatroom or {}).get('participants', [])
+    if bot_guess in participants and bot_guess != user_id:
+        return bot_guess.startswith('ai-')
+    labels = (chatroom or {}).get('playerLabels', {}).get(user_id, [])
+    for position, participant in enumerate(labels, start=1):
+        if bot_guess.strip().lower() == f"player {position}":
+            return participant.startswith('ai-')
+    return None
+
+def build_survey_response(args, chatroom=None):
+    """Validates survey arguments and builds the item to store, or returns None if fields are missing."""
+    # Extract survey data from event
+    chatroom_id = args.get('chatroomId')
+    user_id = args.get('userId')
+    bot_guess = args.get('botGuess')  # Player 1 or Player 2
+    reasoning = args.get('reasoning', '')
+    llm_knowledge = args.get('llmKnowledge')  # None, Some, High, Expert
+    chatbot_frequency = args.get('chatbotFrequency')  # Never, Daily, Weekly, Monthly
+    age = args.get('age')
+    education = args.get('education')  # None, Highschool, Undergraduate, Postgraduate
+
+    # Validate required fields
+    if not all([chatroom_id, user_id, bot_guess, llm_knowledge, chatbot_frequency, age, education]):
+        return None
+
+    # Create survey response item
+    timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    survey_response = {
+        'id': survey_id_for(chatroom_id, user_id),
+        'timestamp': timestamp,
+        'chatroomId': chatroom_id,
+        'userId': user_id,
+        'botGuess': bot_guess,
+        'reasoning': reasoning,
+        'llmKnowledge': llm_knowledge,
+        'chatbotFrequency': chatbot_frequency,
+        'age': int(age),
+        'education': education,
+    }
+
+    # Score the guess now so queries never have to join against ChatroomsTable
+    was_correct = was_guess_correct(bot_guess, user_id, chatroom)
+    if was_correct is not None:
+        survey_response['wasCorrect'] = was_correct
+    return survey_response
+
+def survey_write_actions(survey_response):
+    """Builds the guard + survey puts that enforce one survey per (chatroomId, userId)."""
+    return [
+        {'Put': {
+            'TableName': APP_STATE_TABLE_NAME,
+            'Item': {'id': {'S': f"survey#{survey_response['id']}"}, 'timestamp': {'S': survey_response['timestamp']}},
+            'ConditionExpression': 'attribute_not_exists(id)',
+        }},
+        {'Put': {'TableName': SURVEY_RESPONSES_TABLE_NAME, 'Item': SURVEY_RESPONSE.marshal(survey_response)}},
+    ]
+
+def write_survey_chunk(items):
+    """Writes up to 25 surveys in one transaction, dropping duplicates and retrying conflicts.
+
+    Returns (duplicate ids, ids left unwritten after retries).
+    """
+    duplicates = set()
+    pending = list(items)
+    for attempt in range(MAX_BATCH_RETRIES + 1):
+        if not pending:
+            break
+        try:
+            DYNAMODB_CLIENT.transact_write_items(
+                TransactItems=[action for item in pending for action in survey_write_actions(item)]
+            )
+            pending = []
+            break
+        except DYNAMODB_CLIENT.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            # Guards sit at even positions; a failed guard means the survey already exists
+            rejected = {pending[i // 2]['id'] for i, reason in enumerate(reasons)
+                        if i % 2 == 0 and reason.get('Code') == 'ConditionalCheckFailed'}
+            duplicates |= rejected
+            pending = [item for item in pending if item['id'] not in rejected]
+            if rejected:
+                continue
+        # Full-jitter exponential backoff before resubmitting throttled or conflicting items
+        time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)))
+    return duplicates, {item['id'] for item in pending}
 
+def save_surveys(responses):
+    """Validates, scores and saves survey arguments in transaction-sized chunks.
+
+    Returns one result per input, in order: {'index', 'success', 'id', 'timestamp'}, with
+    'duplicate': True for a survey saved before (the timestamp is then this attempt's, not the
+    original) or 'error' on failure.
+    """
+    chatrooms = get_chatrooms([r['chatroomId'] for r in responses if r.get('chatroomId')])
+
+    results = []
+    valid = []
+    seen = set()
+    for index, survey_args in enumerate(responses):
+        try:
+            survey_response = build_survey_response(survey_args, chatrooms.get(survey_args.get('chatroomId')))
+        except (TypeError, ValueError) as e:
+            results.append({'index': index, 'success': False, 'error': f"Invalid survey: {e}"})
+            continue
+        if survey_response is None:
+            results.append({'index': index, 'success': False, 'error': MISSING_FIELDS})
+            continue
+        result = {'index': index, 'success': True, 'id': survey_response['id'], 'timestamp': survey_response['timestamp']}
+        # A transaction may not touch the same item twice, so repeats within the batch are resolved here
+        if survey_response['id'] in seen:
+            result['duplicate'] = True
+        else:
+            seen.add(survey_response['id'])
+            valid.append(survey_response)
+        results.append(result)
+
+    # Write in transaction-sized chunks; a failed chunk only fails its own items
+    duplicates = set()
+    failed = {}
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        try:
+            with span('write'):
+                chunk_duplicates, unwritten = write_survey_chunk(chunk)
+            duplicates |= chunk_duplicates
+            for survey_id in unwritten:
+                failed[survey_id] = 'Unprocessed after retries'
+        except Exception as e:
+            print(f"Error writing survey chunk: {e}")
+            for item in chunk:
+                failed[item['id']] = str(e)
+
+    saved = 0
+    for result in results:
+        if not result['success']:
+            continue
+        if result['id'] in failed:
+            result.update(success=False, error=failed[result['id']])
+        elif result['id'] in duplicates:
+            result['duplicate'] = True
+        elif not result.get('duplicate'):
+            saved += 1
+
+    if saved:
+        bump_survey_version()
+    print(f"Survey responses saved: {saved}/{len(responses)}")
+    return results
+
+@instrumented('submit_survey')
 def handler(event, context):
     """Saves survey response to DynamoDB."""
     try:
         # AppSync wraps arguments in 'arguments' field
         args = event.get('arguments', event)
-        
-        # Extract survey data from event
-        chatroom_id = args.get('chatroomId')
-        user_id = args.get('userId')
-        bot_guess = args.get('botGuess')  # Player 1 or Player 2
-        reasoning = args.get('reasoning', '')
-        llm_knowledge = args.get('llmKnowledge')  # None, Some, High, Expert
-        chatbot_frequency = args.get('chatbotFrequency')  # Never, Daily, Weekly, Monthly
-        age = args.get('age')
-        education = args.get('education')  # None, Highschool, Undergraduate, Postgraduate
-        
-        # Validate required fields
-        if not all([chatroom_id, user_id, bot_guess, llm_knowledge, chatbot_frequency, age, education]):
+
+        result, = save_surveys([args])
+        if result.get('error') == MISSING_FIELDS:
             return {
                 'statusCode': 400,
-                'body': json.dumps({'error': 'Missing required fields'})
+                'body': json.dumps({'error': MISSING_FIELDS})
             }
-        
-        # Create survey response item
-        timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-        survey_response = {
-            'id': str(uuid.uuid4()),
-            'timestamp': timestamp,
-            'chatroomId': chatroom_id,
-            'userId': user_id,
-            'botGuess': bot_guess,
-            'reasoning': reasoning,
-            'llmKnowledge': llm_knowledge,
-            'chatbotFrequency': chatbot_frequency,
-            'age': int(age),
-            'education': education,
-        }
-        
-        # Save to DynamoDB
-        SURVEY_RESPONSES_TABLE.put_item(Item=survey_response)
-        
-        print(f"Survey response saved: {survey_response['id']}")
-        
+        if not result['success']:
+            raise Exception(result['error'])
+
+        # A retry of an already-saved survey returns the original
+        timestamp = result['timestamp']
+        if result.get('duplicate'):
+            guard = APP_STATE_TABLE.get_item(Key={'id': f"survey#{result['id']}"}, ConsistentRead=True)
+            timestamp = guard.get('Item', {}).get('timestamp', timestamp)
+            print(f"Survey response already exists: {result['id']}")
+
         # Return the survey response object for AppSync
         return {
-            'id': survey_response['id'],
+            'id': result['id'],
             'timestamp': timestamp,
             '__typename': 'SurveyResponse'
         }
-        
+
     except Exception as e:
         print(f"Error saving survey response: {e}")
         raise Exception(f"Failed to submit survey: {str(e)}")
+
+@instrumented('submit_surveys')
+def batch_handler(event, context):
+    """Saves a list of survey responses (submitSurveys) and returns a result per input."""
+    try:
+        args = event.get('arguments', event)
+        results = save_surveys(args.get('responses') or [])
+        # Duplicates are reported without looking up their original timestamps
+        return [dict(result, timestamp=None, __typename='SurveySubmissionResult') if result.get('duplicate')
+                else dict(result, __typename='SurveySubmissionResult') for result in results]
+
+    except Exception as e:
+        print(f"Error saving survey batch: {e}")
+        raise Exception(f"Failed to submit surveys: {str(e)}")
@@ -10,18 +10,21 @@ import * as eventsources from "aws-cdk-lib/aws-lambda-event-sources";
 import * as appsync from "aws-cdk-lib/aws-appsync";
 import * as ssm from "aws-cdk-lib/aws-ssm";
 import * as iam from "aws-cdk-lib/aws-iam";
+import * as sqs from "aws-cdk-lib/aws-sqs";
 
 interface ApiLambdasStackProps extends cdk.StackProps {
   waitingRoomTable: dynamodb.Table;
   chatroomsTable: dynamodb.Table;
   messagesTable: dynamodb.Table;
   surveyResponsesTable: dynamodb.Table;
+  appStateTable: dynamodb.Table;
   openAiApiKeySecret: secretsmanager.ISecret;
 }
 
 export class ApiLambdasStack extends cdk.Stack {
   public readonly api: appsync.GraphqlApi;
   public readonly aiResponseLambda: lambda.Function;
+  public readonly aiDeliveryLambda: lambda.Function;
   public readonly messageHandlerLambda: lambda.Function;
   public readonly joinWaitingRoomLambda: lambda.Function;
   public readonly matchmakingLambda: lambda.Function;
@@ -29,7 +32,10 @@ export class ApiLambdasStack extends cdk.Stack {
   public readonly getWaitingStatusLambda: lambda.Function;
   public readonly leaveWaitingRoomLambda: lambda.Function;
   public readonly submitSurveyLambda: lambda.Function;
+  public readonly submitSurveysLambda: lambda.Function;
   public readonly querySurveyResponsesLambda: lambda.Function;
+  public readonly messagesSinceLambda: lambda.Function;
+  public readonly apiRouterLambda?: lambda.Function;
 
   constructor(scope: Construct, id: string, props: ApiLambdasStackProps) {
     super(scope, id, props);
@@ -61,27 +67,67 @@ export class ApiLambdasStack extends cdk.Stack {
       aiPromptParameterName
     );
 
+    // Phase timings are logged as CloudWatch Embedded Metric Format (lambda/common/metrics.py)
+    const metricsEnvironment = {
+      METRICS_ENABLED: "true",
+    };
+
+    // --- Queues ---
+    // AI replies wait out their simulated typing delay here rather than in the MessagesTable stream consumer
+    const aiReplyDeadLetterQueue = new sqs.Queue(this, "AiReplyDeadLetterQueue", {
+      queueName: `ai-replies-dlq-${envSuffix}`,
+      retentionPeriod: cdk.Duration.days(14),
+    });
+    const aiReplyQueue = new sqs.Queue(this, "AiReplyQueue", {
+      queueName: `ai-replies-${envSuffix}`,
+      // Six times the delivery function's timeout, as Lambda recommends for SQS event sources
+      visibilityTimeout: cdk.Duration.seconds(120),
+      deadLetterQueue: { queue: aiReplyDeadLetterQueue, maxReceiveCount: 3 },
+    });
+    // MessagesTable stream records ai_response still failed on after retries and bisection
+    const aiResponseFailureQueue = new sqs.Queue(this, "AiResponseFailureQueue", {
+      queueName: `airesponse-failures-${envSuffix}`,
+      retentionPeriod: cdk.Duration.days(14),
+    });
+
     // --- Lambda Functions ---
-    // AI Response Lambda
+    // AI Response Lambda; its module validates all of these at import, in either handler
+    const aiResponseEnvironment = {
+      ...metricsEnvironment,
+      MESSAGES_TABLE: props.messagesTable.tableName,
+      CHATROOMS_TABLE: props.chatroomsTable.tableName,
+      OPENAI_API_KEY_SECRET_NAME: props.openAiApiKeySecret.secretName,
+      APPSYNC_URL: this.api.graphqlUrl,
+      APPSYNC_API_KEY: this.api.apiKey || "no-key-generated",
+      AI_PROMPT_PARAMETER: aiPromptParameterName,
+      APP_STATE_TABLE: props.appStateTable.tableName,
+      AI_REPLY_QUEUE_URL: aiReplyQueue.queueUrl,
+    };
     this.aiResponseLambda = new lambda.Function(this, "AiResponseHandler", {
       runtime: lambda.Runtime.PYTHON_3_9,
       code: lambda.Code.fromAsset(
         path.join(__dirname, "../lambda/ai_response/package")
       ),
       handler: "ai_response.handler",
-      environment: {
-        MESSAGES_TABLE: props.messagesTable.tableName,
-        CHATROOMS_TABLE: props.chatroomsTable.tableName,
-        OPENAI_API_KEY_SECRET_NAME: props.openAiApiKeySecret.secretName,
-        APPSYNC_URL: this.api.graphqlUrl,
-        APPSYNC_API_KEY: this.api.apiKey || "no-key-generated",
-        AI_PROMPT_PARAMETER: aiPromptParameterName,
-      },
+      environment: aiResponseEnvironment,
       functionName: `airesponse-${envSuffix}`,
       logRetention: RetentionDays.ONE_MONTH,
       timeout: cdk.Duration.seconds(30),
     });
 
+    // AI Delivery Lambda: posts ai_response's replies from the reply queue once their delay has passed
+    this.aiDeliveryLambda = new lambda.Function(this, "AiDeliveryHandler", {
+      runtime: lambda.Runtime.PYTHON_3_9,
+      code: lambda.Code.fromAsset(
+        path.join(__dirname, "../lambda/ai_response/package")
+      ),
+      handler: "ai_response.delivery_handler",
+      environment: aiResponseEnvironment,
+      functionName: `aidelivery-${envSuffix}`,
+      logRetention: RetentionDays.ONE_MONTH,
+      timeout: cdk.Duration.seconds(20),
+    });
+
     // Message Handler Lambda
     this.messageHandlerLambda = new lambda.Function(this, "MessageHandler", {
       runtime: lambda.Runtime.PYTHON_3_9,
@@ -90,8 +136,8 @@ export class ApiLambdasStack extends cdk.Stack {
       ),
       handler: "message_handler.handler",
       environment: {
+        ...metricsEnvironment,
         MESSAGES_TABLE: props.messagesTable.tableName,
-        AI_RESPONSE_LAMBDA_NAME: this.aiResponseLambda.functionName,
       },
       functionName: `messagehandler-${envSuffix}`,
       logRetention: RetentionDays.ONE_MONTH,
@@ -108,6 +154,7 @@ export class ApiLambdasStack extends cdk.Stack {
         ),
         handler: "join_waiting_room.handler",
         environment: {
+          ...metricsEnvironment,
           WAITING_ROOM_TABLE: props.waitingRoomTable.tableName,
         },
         functionName: `joinwaitingroom-${envSuffix}`,
@@ -122,6 +169,9 @@ export class ApiLambdasStack extends cdk.Stack {
         path.join(__dirname, "../lambda/create_match/package")
       ),
       handler: "create_match.handler",
+      environment: {
+        ...metricsEnvironment,
+      },
       functionName: `creatematch-${envSuffix}`,
       logRetention: RetentionDays.ONE_MONTH,
     });
@@ -134,6 +184,7 @@ export class ApiLambdasStack extends cdk.Stack {
         path.join(__dirname, "../lambda/matchmaking/package")
       ),
       environment: {
+        ...metricsEnvironment,
         WAITING_ROOM_TABLE: props.waitingRoomTable.tableName,
         CHATROOMS_TABLE: props.chatroomsTable.tableName,
         APPSYNC_URL: this.api.graphqlUrl,
@@ -155,6 +206,7 @@ export class ApiLambdasStack extends cdk.Stack {
         ),
         handler: "get_waiting_status.handler",
         environment: {
+          ...metricsEnvironment,
           WAITING_ROOM_TABLE: props.waitingRoomTable.tableName,
           CHATROOMS_TABLE: props.chatroomsTable.tableName,
         },
@@ -174,6 +226,7 @@ export class ApiLambdasStack extends cdk.Stack {
         ),
         handler: "leave_waiting_room.handler",
         environment: {
+          ...metricsEnvironment,
           WAITING_ROOM_TABLE: props.waitingRoomTable.tableName,
         },
         functionName: `leavewaitingroom-${envSuffix}`,
@@ -188,17 +241,42 @@ export class ApiLambdasStack extends cdk.Stack {
       {
         runtime: lambda.Runtime.PYTHON_3_9,
         code: lambda.Code.fromAsset(
-          path.join(__dirname, "../lambda/submit_survey")
+          path.join(__dirname, "../lambda/submit_survey/package")
         ),
         handler: "submit_survey.handler",
         environment: {
+          ...metricsEnvironment,
           SURVEY_RESPONSES_TABLE: props.surveyResponsesTable.tableName,
+          CHATROOMS_TABLE: props.chatroomsTable.tableName,
+          APP_STATE_TABLE: props.appStateTable.tableName,
         },
         functionName: `submitsurvey-${envSuffix}`,
         logRetention: RetentionDays.ONE_MONTH,
       }
     );
 
+    // Submit Surveys (batch) Lambda
+    this.submitSurveysLambda = new lambda.Function(
+      this,
+      "SubmitSurveysHandler",
+      {
+        runtime: lambda.Runtime.PYTHON_3_9,
+        code: lambda.Code.fromAsset(
+          path.join(__dirname, "../lambda/submit_survey/package")
+        ),
+        handler: "submit_survey.batch_handler",
+        environment: {
+          ...metricsEnvironment,
+          SURVEY_RESPONSES_TABLE: props.surveyResponsesTable.tableName,
+          CHATROOMS_TABLE: props.chatroomsTable.tableName,
+          APP_STATE_TABLE: props.appStateTable.tableName,
+        },
+        functionName: `submitsurveys-${envSuffix}`,
+        logRetention: RetentionDays.ONE_MONTH,
+        timeout: cdk.Duration.seconds(30),
+      }
+    );
+
     // Query Survey Responses Lambda
     this.querySurveyResponsesLambda = new lambda.Function(
       this,
@@ -206,18 +284,75 @@ export class ApiLambdasStack extends cdk.Stack {
       {
         runtime: lambda.Runtime.PYTHON_3_9,
         code: lambda.Code.fromAsset(
-          path.join(__dirname, "../lambda/query_survey_responses")
+          path.join(__dirname, "../lambda/query_survey_responses/package")
         ),
         handler: "query_survey_responses.handler",
         environment: {
+          ...metricsEnvironment,
           SURVEY_RESPONSES_TABLE: props.surveyResponsesTable.tableName,
+          APP_STATE_TABLE: props.appStateTable.tableName,
+          SURVEY_CACHE_TTL_SECONDS: "30",
+          SURVEY_CACHE_SHARED: "true",
         },
         functionName: `querysurveyresponses-${envSuffix}`,
         logRetention: RetentionDays.ONE_MONTH,
       }
     );
 
+    // Messages Since Lambda
+    this.messagesSinceLambda = new lambda.Function(
+      this,
+      "MessagesSinceHandler",
+      {
+        runtime: lambda.Runtime.PYTHON_3_9,
+        code: lambda.Code.fromAsset(
+          path.join(__dirname, "../lambda/messages_since/package")
+        ),
+        handler: "messages_since.handler",
+        environment: {
+          ...metricsEnvironment,
+          MESSAGES_TABLE: props.messagesTable.tableName,
+        },
+        functionName: `messagessince-${envSuffix}`,
+        logRetention: RetentionDays.ONE_MONTH,
+      }
+    );
+
+    // API Router Lambda: serves the low-traffic resolvers from one function so
+    // they share warm containers (lambda/api_router). Opt in with -c apiRouter=true;
+    // the per-resolver functions stay deployed for switching back.
+    const apiRouterEnabled = String(this.node.tryGetContext("apiRouter")) === "true";
+    if (apiRouterEnabled) {
+      this.apiRouterLambda = new lambda.Function(this, "ApiRouterHandler", {
+        runtime: lambda.Runtime.PYTHON_3_9,
+        code: lambda.Code.fromAsset(
+          path.join(__dirname, "../lambda/api_router/package")
+        ),
+        handler: "api_router.handler",
+        environment: {
+          ...metricsEnvironment,
+          WAITING_ROOM_TABLE: props.waitingRoomTable.tableName,
+          CHATROOMS_TABLE: props.chatroomsTable.tableName,
+          SURVEY_RESPONSES_TABLE: props.surveyResponsesTable.tableName,
+          APP_STATE_TABLE: props.appStateTable.tableName,
+          SURVEY_CACHE_TTL_SECONDS: "30",
+          SURVEY_CACHE_SHARED: "true",
+        },
+        functionName: `apirouter-${envSuffix}`,
+        logRetention: RetentionDays.ONE_MONTH,
+        // submitSurveys batches are routed here too
+        timeout: cdk.Duration.seconds(30),
+      });
+    }
+
     // --- CREATE DATA SOURCES AND RESOLVERS ---
+    // With the router enabled, its routed fields all resolve through one data source
+    const apiRouterDataSource =
+      this.apiRouterLambda &&
+      this.api.addLambdaDataSource("ApiRouterDataSource", this.apiRouterLambda);
+    const routedDataSource = (id: string, handler: lambda.Function) =>
+      apiRouterDataSource ?? this.api.addLambdaDataSource(id, handler);
+
     const messageHandlerDataSource = this.api.addLambdaDataSource(
       "MessageHandlerDataSource",
       this.messageHandlerLambda
@@ -227,7 +362,7 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "sendMessage",
     });
 
-    const joinWaitingRoomDataSource = this.api.addLambdaDataSource(
+    const joinWaitingRoomDataSource = routedDataSource(
       "JoinWaitingRoomDataSource",
       this.joinWaitingRoomLambda
     );
@@ -236,7 +371,7 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "joinWaitingRoom",
     });
 
-    const leaveWaitingRoomDataSource = this.api.addLambdaDataSource(
+    const leaveWaitingRoomDataSource = routedDataSource(
       "LeaveWaitingRoomDataSource",
       this.leaveWaitingRoomLambda
     );
@@ -245,7 +380,7 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "leaveWaitingRoom",
     });
 
-    const createMatchDataSource = this.api.addLambdaDataSource(
+    const createMatchDataSource = routedDataSource(
       "CreateMatchDataSource",
       this.createMatchLambda
     );
@@ -254,7 +389,7 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "createMatch",
     });
 
-    const getWaitingStatusDataSource = this.api.addLambdaDataSource(
+    const getWaitingStatusDataSource = routedDataSource(
       "GetWaitingStatusDataSource",
       this.getWaitingStatusLambda
     );
@@ -267,16 +402,30 @@ export class ApiLambdasStack extends cdk.Stack {
       "MessagesTableDataSource",
       props.messagesTable
     );
+    // Message ids are ULIDs, so key order is send order and `after` is an exact key condition
     messagesTableDataSource.createResolver("QueryGetMessagesResolver", {
       typeName: "Query",
       fieldName: "getMessages",
-      requestMappingTemplate: appsync.MappingTemplate.dynamoDbQuery(
-        appsync.KeyCondition.eq("chatroomId", "chatroomId")
-      ),
+      requestMappingTemplate: appsync.MappingTemplate.fromString(`
+        #set($query = {
+          "expression": "chatroomId = :cid",
+          "expressionValues": { ":cid": $util.dynamodb.toDynamoDB($ctx.args.chatroomId) }
+        })
+        #if($ctx.args.after)
+          $util.qr($query.put("expression", "chatroomId = :cid AND #id > :after"))
+          $util.qr($query.put("expressionNames", { "#id": "id" }))
+          $util.qr($query.expressionValues.put(":after", $util.dynamodb.toDynamoDB($ctx.args.after)))
+        #end
+        {
+          "version": "2017-02-28",
+          "operation": "Query",
+          "query": $util.toJson($query)
+        }
+      `),
       responseMappingTemplate: appsync.MappingTemplate.dynamoDbResultList(),
     });
 
-    const submitSurveyDataSource = this.api.addLambdaDataSource(
+    const submitSurveyDataSource = routedDataSource(
       "SubmitSurveyDataSource",
       this.submitSurveyLambda
     );
@@ -285,7 +434,16 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "submitSurvey",
     });
 
-    const querySurveyResponsesDataSource = this.api.addLambdaDataSource(
+    const submitSurveysDataSource = routedDataSource(
+      "SubmitSurveysDataSource",
+      this.submitSurveysLambda
+    );
+    submitSurveysDataSource.createResolver("SubmitSurveysResolver", {
+      typeName: "Mutation",
+      fieldName: "submitSurveys",
+    });
+
+    const querySurveyResponsesDataSource = routedDataSource(
       "QuerySurveyResponsesDataSource",
       this.querySurveyResponsesLambda
     );
@@ -294,6 +452,15 @@ export class ApiLambdasStack extends cdk.Stack {
       fieldName: "querySurveyResponses",
     });
 
+    const messagesSinceDataSource = this.api.addLambdaDataSource(
+      "MessagesSinceDataSource",
+      this.messagesSinceLambda
+    );
+    messagesSinceDataSource.createResolver("MessagesSinceResolver", {
+      typeName: "Query",
+      fieldName: "messagesSince",
+    });
+
     // --- TRIGGERS ---
     props.waitingRoomTable.grantStreamRead(this.matchmakingLambda);
     this.matchmakingLambda.addEventSource(
@@ -304,14 +471,42 @@ export class ApiLambdasStack extends cdk.Stack {
       })
     );
 
+    // New messages reach ai_response in per-chatroom order, up to 10 rooms per batch
+    props.messagesTable.grantStreamRead(this.aiResponseLambda);
+    this.aiResponseLambda.addEventSource(
+      new eventsources.DynamoEventSource(props.messagesTable, {
+        startingPosition: lambda.StartingPosition.LATEST,
+        batchSize: 10,
+        parallelizationFactor: 10,
+        retryAttempts: 2,
+        bisectBatchOnError: true,
+        onFailure: new eventsources.SqsDlq(aiResponseFailureQueue),
+        filters: [
+          lambda.FilterCriteria.filter({
+            eventName: lambda.FilterRule.isEqual("INSERT"),
+            // The AI's own messages never need a reply
+            dynamodb: { NewImage: { senderId: { S: [{ "anything-but": { prefix: "ai-" } }] } } },
+          }),
+        ],
+      })
+    );
+
+    this.aiDeliveryLambda.addEventSource(
+      new eventsources.SqsEventSource(aiReplyQueue, {
+        batchSize: 10,
+        reportBatchItemFailures: true,
+      })
+    );
+
     // --- GRANT PERMISSIONS ---
     props.openAiApiKeySecret.grantRead(this.aiResponseLambda);
-    props.chatroomsTable.grantReadData(this.aiResponseLambda);
+    props.chatroomsTable.grantReadWriteData(this.aiResponseLambda);
     props.messagesTable.grantReadWriteData(this.aiResponseLambda);
+    props.appStateTable.grantReadWriteData(this.aiResponseLambda);
+    aiReplyQueue.grantSendMessages(this.aiResponseLambda);
+    props.messagesTable.grantReadWriteData(this.aiDeliveryLambda);
     props.messagesTable.grantReadWriteData(this.messageHandlerLambda);
 
-    // Grant invoke permission
-    this.aiResponseLambda.grantInvoke(this.messageHandlerLambda);
     aiPromptParameter.grantRead(this.aiResponseLambda);
 
     props.waitingRoomTable.grantReadWriteData(this.matchmakingLambda);
@@ -322,6 +517,19 @@ export class ApiLambdasStack extends cdk.Stack {
     props.waitingRoomTable.grantReadWriteData(this.leaveWaitingRoomLambda);
     props.surveyResponsesTable.grantWriteData(this.submitSurveyLambda);
     props.surveyResponsesTable.grantReadData(this.querySurveyResponsesLambda);
+    props.appStateTable.grantReadWriteData(this.submitSurveyLambda);
+    props.surveyResponsesTable.grantWriteData(this.submitSurveysLambda);
+    props.appStateTable.grantReadWriteData(this.submitSurveysLambda);
+    props.chatroomsTable.grantReadData(this.submitSurveyLambda);
+    props.chatroomsTable.grantReadData(this.submitSurveysLambda);
+    props.appStateTable.grantReadWriteData(this.querySurveyResponsesLambda);
+    props.messagesTable.grantReadData(this.messagesSinceLambda);
+    if (this.apiRouterLambda) {
+      props.waitingRoomTable.grantReadWriteData(this.apiRouterLambda);
+      props.chatroomsTable.grantReadData(this.apiRouterLambda);
+      props.surveyResponsesTable.grantReadWriteData(this.apiRouterLambda);
+      props.appStateTable.grantReadWriteData(this.apiRouterLambda);
+    }
 
     // Grant AppSync mutation permissions
     this.matchmakingLambda.addToRolePolicy(
@@ -8,6 +8,7 @@ export class DatabaseStack extends cdk.Stack {
   public readonly chatroomsTable: dynamodb.Table;
   public readonly messagesTable: dynamodb.Table;
   public readonly surveyResponsesTable: dynamodb.Table;
+  public readonly appStateTable: dynamodb.Table;
 
   constructor(scope: Construct, id: string, props?: cdk.StackProps) {
     super(scope, id, props);
@@ -25,11 +26,14 @@ export class DatabaseStack extends cdk.Stack {
       removalPolicy: cdk.RemovalPolicy.DESTROY,
     });
 
+    // Message ids are ULIDs (lambda/common/ulid.py): unique and time-ordered within a room
     this.messagesTable = new dynamodb.Table(this, "MessagesTable", {
       partitionKey: { name: "chatroomId", type: dynamodb.AttributeType.STRING },
-      sortKey: { name: "createdAt", type: dynamodb.AttributeType.STRING },
+      sortKey: { name: "id", type: dynamodb.AttributeType.STRING },
       billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
       removalPolicy: cdk.RemovalPolicy.DESTROY,
+      // Triggers ai_response for new messages (lib/api-lambdas-stack.ts)
+      stream: dynamodb.StreamViewType.NEW_IMAGE,
     });
 
     this.surveyResponsesTable = new dynamodb.Table(this, "SurveyResponsesTable", {
@@ -51,5 +55,13 @@ export class DatabaseStack extends cdk.Stack {
       partitionKey: { name: "llmKnowledge", type: dynamodb.AttributeType.STRING },
       sortKey: { name: "timestamp", type: dynamodb.AttributeType.STRING },
     });
+
+    // Small shared state for the Lambdas: version counters and cache entries
+    this.appStateTable = new dynamodb.Table(this, "AppStateTable", {
+      partitionKey: { name: "id", type: dynamodb.AttributeType.STRING },
+      timeToLiveAttribute: "expiresAt",
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
   }
 }
@@ -21,6 +21,7 @@ export class MainStack extends cdk.Stack {
       chatroomsTable: databaseStack.chatroomsTable,
       messagesTable: databaseStack.messagesTable,
       surveyResponsesTable: databaseStack.surveyResponsesTable,
+      appStateTable: databaseStack.appStateTable,
       openAiApiKeySecret: secretsStack.openAiApiKeySecret,
     });
 
@@ -0,0 +1,182 @@
+"""
+Compares the two ways of running the AI player on the same local workload:
+`invoke`, ai_response Lambda invocations fed by the MessagesTable stream, and
+`worker`, the asyncio ai_worker fed with the same stream records. ROOMS
+chatrooms start evenly over RAMP seconds; in each, two humans send one
+message and the AI replies. Everything runs on the real clock against the
+harness fakes, with a fixed OpenAI latency.
+
+Per mode it reports AI replies, reply latency (last human message to AI
+reply), peak and mean rooms in flight, process CPU (harness included), and
+rooms per vCPU: mean rooms in flight over mean vCPUs held. An ai_response
+or ai_delivery invocation holds an execution environment of LAMBDA_MEMORY_MB, which Lambda
+sizes at LAMBDA_MEMORY_MB / MB_PER_VCPU of a vCPU however idle it is; the
+worker holds the CPU it actually uses. For the worker it also reports its
+generation scheduler's waits; --generations below the rooms in flight shows
+the queue at work.
+
+Usage:
+    python scripts/bench_ai_worker.py [--rooms 200] [--ramp 10] [--openai-latency 1.0] [--mode invoke|worker]
+                                      [--generations 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import Emulator, RealClock  # noqa: E402
+from harness.emulator import DEFAULT_PROMPT, STREAMS, percentile  # noqa: E402
+
+# ai_response's memory size (the stack leaves the 128 MB default) and Lambda's MB per vCPU
+LAMBDA_MEMORY_MB = 128
+MB_PER_VCPU = 1769
+SAMPLE_SECONDS = 0.05
+
+
+class Gauge:
+    """A thread-safe in-flight count, sampled over time by the benchmark."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def wrap(self, function):
+        def counted(*args, **kwargs):
+            with self.lock:
+                self.value += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.value -= 1
+        return counted
+
+
+async def start_rooms(emulator, rooms, ramp):
+    """Creates the rooms and sends both human messages in each, spread over `ramp` seconds."""
+    chatrooms = emulator.dynamodb.table(emulator.env['CHATROOMS_TABLE'])
+
+    async def play(index):
+        await asyncio.sleep(ramp * index / rooms)
+        chatroom_id = f"bench-{index}"
+        chatrooms.put_item(Item={'id': chatroom_id, 'participants': ['human-1', 'human-2', 'ai-bench']})
+        for sender, text in (('human-1', 'hi all'), ('human-2', 'hey there')):
+            await asyncio.to_thread(emulator.appsync.execute, 'sendMessage',
+                                    {'chatroomId': chatroom_id, 'senderId': sender, 'text': text})
+
+    await asyncio.gather(*(play(index) for index in range(rooms)))
+
+
+async def sample(samples, *gauges):
+    while True:
+        samples.append(tuple(gauge() for gauge in gauges))
+        await asyncio.sleep(SAMPLE_SECONDS)
+
+
+async def run_invoke(emulator, rooms, ramp):
+    """Returns [(rooms in flight, vCPUs held)] samples while ai_response answers every room."""
+    module = emulator.modules[('ai_response', 'ai_response')]
+    in_rooms, in_invocations = Gauge(), Gauge()
+    module.respond = in_rooms.wrap(module.respond)
+    # Replies wait out their typing delay on the reply queue; their delivery invocations hold environments too
+    for name in ('ai_response', 'ai_delivery'):
+        emulator.handlers[name] = in_invocations.wrap(emulator.handlers[name])
+
+    samples = []
+    sampler = asyncio.create_task(sample(
+        samples, lambda: in_rooms.value, lambda: in_invocations.value * LAMBDA_MEMORY_MB / MB_PER_VCPU))
+    await start_rooms(emulator, rooms, ramp)
+    await asyncio.to_thread(emulator.run_until_idle)
+    sampler.cancel()
+    return samples
+
+
+async def run_worker(emulator, rooms, ramp, generations):
+    """Returns [(rooms in flight, None)] samples while one AIWorker answers every room."""
+    module = emulator.load_module('ai_worker', 'ai_worker')
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=module.DB_THREADS))
+    worker = module.AIWorker(emulator.async_http, 'sk-local', DEFAULT_PROMPT, generations=generations)
+
+    def on_record(record):
+        image = record['dynamodb'].get('NewImage', {})
+        if record['eventName'] == 'INSERT' and not image['senderId']['S'].startswith('ai-'):
+            loop.call_soon_threadsafe(worker.submit, image['chatroomId']['S'])
+    emulator.dynamodb.on_stream(emulator.env['MESSAGES_TABLE'], on_record)
+
+    samples = []
+    sampler = asyncio.create_task(sample(samples, lambda: len(worker.active), lambda: None))
+    runner = asyncio.create_task(worker.run())
+    await start_rooms(emulator, rooms, ramp)
+    # The AI's own reply comes back through the stream too; wait until that has settled
+    while not (worker.idle() and await asyncio.to_thread(emulator.run_until_idle, 0.5) and worker.idle()):
+        await asyncio.sleep(0.1)
+    runner.cancel()
+    sampler.cancel()
+    snapshot = worker.scheduler.snapshot()
+    print(f"worker  generation slots {generations}  wait p50 {snapshot['waitP50']:5.2f}s "
+          f"p95 {snapshot['waitP95']:5.2f}s  max {snapshot['waitMax']:5.2f}s  expired {worker.expired}")
+    return samples
+
+
+def reply_latencies(emulator):
+    """Seconds from each room's last human message to the AI reply, from the messages' ULID timestamps."""
+    from common.ulid import ulid_timestamp_ms
+    by_room = {}
+    for item in emulator.dynamodb.table(emulator.env['MESSAGES_TABLE']).items.values():
+        by_room.setdefault(item['chatroomId'], []).append(item)
+    latencies = []
+    for messages in by_room.values():
+        messages.sort(key=lambda m: m['id'])
+        for previous, message in zip(messages, messages[1:]):
+            if message['senderId'].startswith('ai-') and not previous['senderId'].startswith('ai-'):
+                latencies.append((ulid_timestamp_ms(message['id']) - ulid_timestamp_ms(previous['id'])) / 1000)
+    return sorted(latencies)
+
+
+def bench(mode, rooms, ramp, openai_latency, generations):
+    os.environ['CIRCUIT_INITIAL_LIMIT'] = os.environ['CIRCUIT_MAX_LIMIT'] = str(rooms)
+    if mode == 'invoke':
+        emulator = Emulator(clock=RealClock(), workers=rooms + 32, openai_latency=openai_latency)
+    else:
+        streams = [stream for stream in STREAMS if stream[1] != 'ai_response']
+        emulator = Emulator(clock=RealClock(), workers=8, openai_latency=openai_latency, streams=streams)
+    with emulator:
+        cpu, wall = time.process_time(), time.monotonic()
+        if mode == 'invoke':
+            samples = asyncio.run(run_invoke(emulator, rooms, ramp))
+        else:
+            samples = asyncio.run(run_worker(emulator, rooms, ramp, generations))
+        cpu, wall = time.process_time() - cpu, time.monotonic() - wall
+        latencies = reply_latencies(emulator)
+
+    mean_rooms = sum(s[0] for s in samples) / len(samples)
+    if mode == 'invoke':
+        mean_vcpus = sum(s[1] for s in samples) / len(samples)
+    else:
+        mean_vcpus = cpu / wall
+    print(f"{mode:7} replies {len(latencies):4}/{rooms}  reply p50 {percentile(latencies, 50):5.2f}s "
+          f"p95 {percentile(latencies, 95):5.2f}s  rooms in flight peak {max(s[0] for s in samples):4} "
+          f"mean {mean_rooms:6.1f}  cpu {cpu:6.2f}s over {wall:5.1f}s  vCPUs held {mean_vcpus:5.2f}  "
+          f"rooms/vCPU {mean_rooms / mean_vcpus if mean_vcpus else float('inf'):7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=200, help='chatrooms, each needing one AI reply')
+    parser.add_argument('--ramp', type=float, default=10.0, help='seconds over which the rooms start')
+    parser.add_argument('--openai-latency', type=float, default=1.0, help='fake OpenAI response time in seconds')
+    parser.add_argument('--generations', type=int, default=50, help="worker's OpenAI generations in flight")
+    parser.add_argument('--mode', choices=['invoke', 'worker'], action='append', help='mode to run (default: both)')
+    args = parser.parse_args()
+
+    for mode in args.mode or ['invoke', 'worker']:
+        bench(mode, args.rooms, args.ramp, args.openai_latency, args.generations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark for the Lambda handlers.
+
+Each sample runs in a fresh interpreter, the way a new Lambda container does,
+and measures:
+  * init   - wall time to import the handler module (module-level clients,
+             env validation and all dependency imports)
+  * imports - the slowest direct imports of the handler, from `python -X importtime`
+plus the size of the directory the handler is loaded from.
+
+Compare a deployed bundle against a freshly built one with --root, e.g.:
+    python scripts/bench_cold_start.py ai_response \\
+        --root ai_response=lambda-downloads/airesponse-dev
+    python scripts/build_lambdas.py ai_response
+    python scripts/bench_cold_start.py ai_response
+
+boto3 must be importable from the current interpreter; it stands in for the
+copy the Lambda runtime provides.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT_DIR, 'lambda')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from build_lambdas import directory_size, handler_dirs  # noqa: E402
+
+# Placeholder configuration so module-level validation passes without AWS
+BENCH_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'MESSAGES_TABLE': 'bench-messages',
+    'CHATROOMS_TABLE': 'bench-chatrooms',
+    'WAITING_ROOM_TABLE': 'bench-waiting-room',
+    'SURVEY_RESPONSES_TABLE': 'bench-survey-responses',
+    'APP_STATE_TABLE': 'bench-app-state',
+    'OPENAI_API_KEY_SECRET_NAME': 'bench-secret',
+    'AI_PROMPT_PARAMETER': '/bench/prompt',
+    'AI_PROMPT': '/bench/prompt',
+    'APPSYNC_URL': 'https://bench.invalid/graphql',
+    'APPSYNC_API_KEY': 'bench',
+}
+
+SAMPLE_SCRIPT = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "print('INIT', time.perf_counter() - t)\n"
+)
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|\s(\s*)(\S+)')
+
+
+def handler_module(name, root):
+    """Finds the handler module name inside a code root."""
+    if os.path.exists(os.path.join(root, f"{name}.py")):
+        return name
+    modules = [f[:-3] for f in os.listdir(root) if f.endswith('.py') and f[:-3] not in ('six', 'typing_extensions')]
+    return modules[0]
+
+
+def sample(root, module):
+    """Imports a handler in a fresh interpreter. Returns (init seconds, {direct import: seconds})."""
+    env = dict(os.environ, **BENCH_ENV)
+    # Unbuilt handler directories resolve lambda/common from the source tree
+    env['PYTHONPATH'] = os.pathsep.join([root, LAMBDA_DIR, env.get('PYTHONPATH', '')])
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SAMPLE_SCRIPT.format(module=module)],
+        capture_output=True, text=True, env=env, cwd=root,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    init = float(result.stdout.split('INIT')[-1])
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Attribute time to the handler's direct imports (one nesting level down)
+        if match and len(match.group(2)) == 2:
+            imports[match.group(3)] = int(match.group(1)) / 1e6
+    return init, imports
+
+
+def bench(name, root, runs):
+    """Runs the benchmark for one handler and prints a summary."""
+    module = handler_module(name, root)
+    inits = []
+    imports = {}
+    for _ in range(runs):
+        init, sample_imports = sample(root, module)
+        inits.append(init)
+        for key, value in sample_imports.items():
+            imports.setdefault(key, []).append(value)
+
+    size, count = directory_size(root)
+    slowest = sorted(((statistics.median(v), k) for k, v in imports.items()), reverse=True)[:5]
+    print(f"{name} ({os.path.relpath(root, ROOT_DIR)})")
+    print(f"  package: {size / 1024 / 1024:.2f} MB, {count} files")
+    print(f"  init:    median {statistics.median(inits) * 1000:.1f} ms, "
+          f"min {min(inits) * 1000:.1f} ms, max {max(inits) * 1000:.1f} ms over {runs} runs")
+    print("  slowest imports: " + ", ".join(f"{k} {v * 1000:.1f} ms" for v, k in slowest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('handlers', nargs='*', help='handler directory names (default: all)')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per handler')
+    parser.add_argument('--root', action='append', default=[], metavar='NAME=PATH',
+                        help='load a handler from PATH instead of lambda/<name>/package')
+    args = parser.parse_args()
+
+    roots = dict(item.split('=', 1) for item in args.root)
+    for name in handler_dirs(args.handlers):
+        root = roots.get(name) or os.path.join(LAMBDA_DIR, name, 'package')
+        if not os.path.isdir(root):
+            root = os.path.join(LAMBDA_DIR, name)
+        bench(name, os.path.abspath(root), args.runs)
+
+
+if __name__ == '__main__':
+    main()
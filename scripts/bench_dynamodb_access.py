@@ -0,0 +1,150 @@
+"""
+Micro-benchmark of the two ways the handlers reach DynamoDB: the boto3
+resource (`boto3.resource('dynamodb').Table(...)`) and the low-level client
+with the precompiled item shapes of lambda/common/items.py.
+
+  * per-call CPU - process time per call for our item shapes (Message put and
+                   30-message query, Chatroom get, WaitingRoom put,
+                   SurveyResponse transaction). Calls run through botocore's
+                   Stubber, so parameter validation, request serialization
+                   and response parsing are included and the network is not.
+  * init         - wall time in a fresh interpreter, as in a new Lambda
+                   container, to create the resource and a Table, or the
+                   client, after `import boto3`.
+
+Usage:
+    python scripts/bench_dynamodb_access.py [--calls 2000] [--samples 5]
+"""
+import argparse
+import copy
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+import boto3  # noqa: E402
+from botocore.stub import Stubber  # noqa: E402
+
+from common.items import (CHATROOM, MESSAGE, SURVEY_RESPONSE, WAITING_ROOM_ENTRY, ItemTable,  # noqa: E402
+                          to_attribute)
+
+HISTORY_SIZE = 30
+
+INIT_SCRIPTS = {
+    'resource': "import boto3, time\nt = time.perf_counter()\n"
+                "boto3.resource('dynamodb').Table('bench')\nprint(time.perf_counter() - t)\n",
+    'client': "import boto3, time\nt = time.perf_counter()\n"
+              "boto3.client('dynamodb')\nprint(time.perf_counter() - t)\n",
+}
+
+MESSAGE_ITEM = {'id': '01HF0000000000000000000000', 'chatroomId': 'c0ffee00-0000-4000-8000-000000000000',
+                'text': 'hi all, where are you from?', 'senderId': '9bff198a-8470-4d5b-9d3e-4f1c2b3a4d5e',
+                'createdAt': '2023-11-14T22:13:20.000Z'}
+CHATROOM_ITEM = {'id': MESSAGE_ITEM['chatroomId'], 'participants': ['9bff198a', '34b0926a', 'ai-46d51c6a'],
+                 'createdAt': '2023-11-14T22:13:00.000Z', 'aiGeneration': MESSAGE_ITEM['id']}
+WAITING_ITEM = {'id': '9bff198a-8470-4d5b-9d3e-4f1c2b3a4d5e', 'createdAt': '2023-11-14T22:12:00.000Z'}
+SURVEY_ITEM = {'id': '5d1c0e9a-0000-5000-8000-000000000000', 'timestamp': '2023-11-14T22:20:00.000Z',
+               'chatroomId': MESSAGE_ITEM['chatroomId'], 'userId': WAITING_ITEM['id'], 'botGuess': 'Player 2',
+               'reasoning': 'too quick to reply', 'llmKnowledge': 'Some', 'chatbotFrequency': 'Weekly',
+               'age': 34, 'education': 'Undergraduate', 'wasCorrect': True}
+
+
+def guard_item(survey):
+    return {'id': f"survey#{survey['id']}", 'timestamp': survey['timestamp']}
+
+
+def operations(resource, client):
+    """(name, stubbed operation, low-level response, call through the resource, call through the client)."""
+    messages = ItemTable(client, 'messages', MESSAGE)
+    chatrooms = ItemTable(client, 'chatrooms', CHATROOM)
+    waiting = ItemTable(client, 'waiting', WAITING_ROOM_ENTRY)
+    resource_messages = resource.Table('messages')
+    resource_chatrooms = resource.Table('chatrooms')
+    resource_waiting = resource.Table('waiting')
+    history = [dict(MESSAGE_ITEM, id=f"01HF{index:022d}") for index in range(HISTORY_SIZE)]
+    query = {'KeyConditionExpression': 'chatroomId = :cid',
+             'ExpressionAttributeValues': {':cid': MESSAGE_ITEM['chatroomId']},
+             'Limit': HISTORY_SIZE, 'ScanIndexForward': False}
+
+    def survey_actions(marshal, marshal_guard):
+        return [
+            {'Put': {'TableName': 'app-state', 'Item': marshal_guard(guard_item(SURVEY_ITEM)),
+                     'ConditionExpression': 'attribute_not_exists(id)'}},
+            {'Put': {'TableName': 'surveys', 'Item': marshal(SURVEY_ITEM)}},
+        ]
+
+    def low_level_guard(item):
+        return {name: to_attribute(value) for name, value in item.items()}
+
+    return [
+        ('Message put_item', 'put_item', {},
+         lambda: resource_messages.put_item(Item=MESSAGE_ITEM),
+         lambda: messages.put_item(Item=MESSAGE_ITEM)),
+        (f'Message query ({HISTORY_SIZE})', 'query',
+         {'Items': [MESSAGE.marshal(item) for item in history], 'Count': HISTORY_SIZE},
+         lambda: resource_messages.query(**query),
+         lambda: messages.query(**query)),
+        ('Chatroom get_item', 'get_item', {'Item': CHATROOM.marshal(CHATROOM_ITEM)},
+         lambda: resource_chatrooms.get_item(Key={'id': CHATROOM_ITEM['id']}),
+         lambda: chatrooms.get_item(Key={'id': CHATROOM_ITEM['id']})),
+        ('WaitingRoom put_item', 'put_item', {},
+         lambda: resource_waiting.put_item(Item=WAITING_ITEM),
+         lambda: waiting.put_item(Item=WAITING_ITEM)),
+        ('SurveyResponse transact', 'transact_write_items', {},
+         lambda: resource.meta.client.transact_write_items(TransactItems=survey_actions(dict, dict)),
+         lambda: client.transact_write_items(TransactItems=survey_actions(SURVEY_RESPONSE.marshal,
+                                                                          low_level_guard))),
+    ]
+
+
+def cpu_per_call(stubbed_client, operation, response, call, calls):
+    """Mean process time per call in microseconds, with `calls` stubbed responses queued."""
+    with Stubber(stubbed_client) as stubber:
+        for _ in range(calls + 1):
+            # The resource's transformation unmarshals responses in place
+            stubber.add_response(operation, copy.deepcopy(response))
+        call()  # warm botocore's per-operation caches
+        start = time.process_time()
+        for _ in range(calls):
+            call()
+        return (time.process_time() - start) / calls * 1e6
+
+
+def init_seconds(kind, samples):
+    times = []
+    for _ in range(samples):
+        output = subprocess.run([sys.executable, '-c', INIT_SCRIPTS[kind]], capture_output=True, text=True,
+                                check=True, env=dict(os.environ))
+        times.append(float(output.stdout.strip()))
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000, help='calls per operation and access path')
+    parser.add_argument('--samples', type=int, default=5, help='fresh interpreters per init measurement')
+    args = parser.parse_args()
+
+    resource = boto3.resource('dynamodb')
+    client = boto3.client('dynamodb')
+    print(f"{'operation':28} {'resource':>12} {'client':>12} {'saved':>7}")
+    for name, operation, response, via_resource, via_client in operations(resource, client):
+        resource_us = cpu_per_call(resource.meta.client, operation, response, via_resource, args.calls)
+        client_us = cpu_per_call(client, operation, response, via_client, args.calls)
+        print(f"{name:28} {resource_us:10.1f}us {client_us:10.1f}us {1 - client_us / resource_us:6.0%}")
+
+    resource_init = init_seconds('resource', args.samples)
+    client_init = init_seconds('client', args.samples)
+    print(f"{'init (median)':28} {resource_init * 1000:10.1f}ms {client_init * 1000:10.1f}ms "
+          f"{1 - client_init / resource_init:6.0%}")
+
+
+if __name__ == '__main__':
+    main()
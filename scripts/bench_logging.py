@@ -0,0 +1,157 @@
+"""
+Micro-benchmark of the logging work message_handler does per sendMessage.
+
+Compares, in CPU time per invocation with output sent to /dev/null:
+  * legacy  - the print calls message_handler made before common/log.py
+              (full event, context, message twice, the whole invoke response)
+  * info    - the structured logger at its defaults (INFO, 1% of requests
+              sampled at DEBUG)
+  * sampled - the structured logger with every request sampled at DEBUG,
+              the worst case
+
+Only logging is measured; the DynamoDB put and Lambda invoke are not part of
+either side.
+
+Usage:
+    python scripts/bench_logging.py [--iterations 20000]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda'))
+from common import log  # noqa: E402
+
+TEXT = "honestly i think player 2 is the bot, nobody types that fast and uses perfect punctuation"
+
+
+class Context:
+    """A stand-in for the Lambda context, as str() renders it in the legacy log line."""
+
+    function_name = 'messagehandler-dev'
+    memory_limit_in_mb = 128
+    log_group_name = '/aws/lambda/messagehandler-dev'
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+
+def appsync_event():
+    """An AppSync Lambda resolver event for sendMessage, at its usual size."""
+    return {
+        'arguments': {'chatroomId': str(uuid.uuid4()), 'text': TEXT, 'senderId': str(uuid.uuid4())},
+        'identity': None,
+        'source': None,
+        'request': {
+            'headers': {
+                'accept': '*/*', 'accept-encoding': 'gzip, deflate, br', 'accept-language': 'en-US,en;q=0.9',
+                'content-length': '412', 'content-type': 'application/json', 'host': 'example.appsync-api.aws',
+                'origin': 'https://turing.example.com', 'referer': 'https://turing.example.com/',
+                'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+                              '(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
+                'x-amz-user-agent': 'aws-amplify/6.0.0 api/1 framework/1', 'x-api-key': 'da2-redacted',
+                'x-amzn-trace-id': 'Root=1-66a0c0de-0123456789abcdef01234567',
+                'x-forwarded-for': '203.0.113.10, 198.51.100.7', 'x-forwarded-port': '443',
+                'x-forwarded-proto': 'https',
+            },
+            'domainName': None,
+        },
+        'prev': None,
+        'info': {
+            'selectionSetList': ['id', 'chatroomId', 'text', 'senderId', 'createdAt'],
+            'selectionSetGraphQL': '{\n  id\n  chatroomId\n  text\n  senderId\n  createdAt\n}',
+            'parentTypeName': 'Mutation', 'fieldName': 'sendMessage', 'variables': {},
+        },
+        'stash': {},
+    }
+
+
+def invoke_response():
+    """What boto3 returns for an 'Event' invoke."""
+    return {
+        'ResponseMetadata': {
+            'RequestId': str(uuid.uuid4()), 'HTTPStatusCode': 202,
+            'HTTPHeaders': {'date': 'Mon, 19 Oct 2026 12:00:00 GMT', 'content-length': '0',
+                            'connection': 'keep-alive', 'x-amzn-requestid': str(uuid.uuid4())},
+            'RetryAttempts': 0,
+        },
+        'StatusCode': 202,
+        'Payload': '<botocore.response.StreamingBody object at 0x7f3a2c1d9e80>',
+    }
+
+
+def legacy(event, context):
+    """The print calls of the pre-structured-logging message_handler."""
+    response = INVOKE_RESPONSE
+    args = event['arguments']
+    print("=== MESSAGE HANDLER STARTED ===")
+    print(f"Received event from AppSync: {json.dumps(event)}")
+    print(f"Context: {context}")
+    print(f"Parsed arguments - chatroom_id: {args['chatroomId']}, text: {args['text']}, sender_id: {args['senderId']}")
+    message = dict(args, id=str(uuid.uuid4()), createdAt=datetime.utcnow().isoformat() + "Z")
+    print(f"Created message object: {json.dumps(message)}")
+    print("Attempting to save message to DynamoDB table: bench-messages")
+    print(f"Successfully saved message {message['id']} to chatroom {args['chatroomId']}")
+    print("Human message received. Preparing to trigger AI response lambda: bench-ai-response")
+    print(f"AI payload: {json.dumps({'chatroomId': args['chatroomId'], 'chatHistory': [message]})}")
+    print("Attempting to invoke Lambda: bench-ai-response")
+    print("Lambda client region: us-east-1")
+    print("Attempting Lambda invoke...")
+    print(f"Lambda invoke response: {response}")
+    print(f"StatusCode: {response.get('StatusCode')}")
+    print(f"FunctionError: {response.get('FunctionError')}")
+    print(f"Payload: {response.get('Payload')}")
+    print(f"ExecutedVersion: {response.get('ExecutedVersion')}")
+    print("SUCCESS: Lambda invocation accepted (202 status)")
+    print(f"Returning message to AppSync: {json.dumps(message)}")
+    print("=== MESSAGE HANDLER COMPLETED ===")
+
+
+INVOKE_RESPONSE = invoke_response()
+LOGGER = log.Logger('message_handler')
+
+
+@LOGGER.request_scope
+def structured(event, context):
+    """The logging calls of the current message_handler."""
+    args = event['arguments']
+    LOGGER.debug("Received event", field=lambda: event['info']['fieldName'],
+                 arguments=lambda: dict(args, text=log.redact(args['text'])))
+    message = dict(args, id=str(uuid.uuid4()), createdAt=datetime.utcnow().isoformat() + "Z")
+    LOGGER.info("Message saved", messageId=message['id'], chatroomId=args['chatroomId'],
+                senderId=args['senderId'], text=log.redact(args['text']))
+    LOGGER.debug("AI response invoked", function='bench-ai-response')
+
+
+def measure(function, iterations):
+    """Returns CPU microseconds per call."""
+    event, context = appsync_event(), Context()
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        start = time.process_time()
+        for _ in range(iterations):
+            function(event, context)
+        elapsed = time.process_time() - start
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000, help='invocations per variant')
+    args = parser.parse_args()
+
+    baseline = measure(legacy, args.iterations)
+    print(f"legacy   {baseline:7.1f} us/invocation")
+    for name, sample_rate in (('info', log.LOG_SAMPLE_RATE), ('sampled', 1.0)):
+        log.LOG_SAMPLE_RATE = sample_rate
+        cost = measure(structured, args.iterations)
+        print(f"{name:8} {cost:7.1f} us/invocation ({baseline - cost:+.1f} us saved, {cost / baseline:.0%} of legacy)")
+
+
+if __name__ == '__main__':
+    main()
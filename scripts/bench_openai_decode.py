@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of decoding OpenAI Responses API bodies the way ai_response
+does: requests' `Response.json()` as before, `json.loads` on the raw bytes,
+and jiter (`decode_openai_response` when the bundle ships it), each followed
+by extract_output_text.
+
+Bodies hold one assistant message after N reasoning items carrying encrypted
+content and summaries, as reasoning models return them. For each size it
+reports process time per decode and the peak memory traced while decoding.
+jiter is only measured when importable (`pip install jiter`).
+
+Usage:
+    python scripts/bench_openai_decode.py [--reasoning-items 0 4 16] [--calls 500]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda'))
+from common.replies import extract_output_text  # noqa: E402
+
+try:
+    import jiter
+except ImportError:
+    jiter = None
+
+ENCRYPTED_CONTENT_BYTES = 4000
+SUMMARY_PARTS = 3
+
+
+def response_body(reasoning_items):
+    """A Responses API body with `reasoning_items` reasoning items before the reply."""
+    output = [{
+        'id': f"rs_{index}", 'type': 'reasoning',
+        'encrypted_content': base64.b64encode(os.urandom(ENCRYPTED_CONTENT_BYTES)).decode(),
+        'summary': [{'type': 'summary_text', 'text': 'Weighing how a casual player would answer. ' * 12}
+                    for _ in range(SUMMARY_PARTS)],
+    } for index in range(reasoning_items)]
+    output.append({'id': 'msg_0', 'type': 'message', 'status': 'completed', 'role': 'assistant',
+                   'content': [{'type': 'output_text', 'text': 'haha yeah, berlin here', 'annotations': [],
+                                'logprobs': []}]})
+    return json.dumps({
+        'id': 'resp_0', 'object': 'response', 'created_at': 1700000000, 'status': 'completed', 'model': 'gpt-5.2',
+        'output': output, 'parallel_tool_calls': True, 'tools': [], 'metadata': {}, 'temperature': 1.0,
+        'reasoning': {'effort': 'medium', 'summary': 'auto'}, 'text': {'format': {'type': 'text'}},
+        'usage': {'input_tokens': 912, 'output_tokens': 388, 'total_tokens': 1300,
+                  'output_tokens_details': {'reasoning_tokens': 360}},
+    }).encode()
+
+
+def decoders(body):
+    """(name, decode) pairs, decode() returning the reply text."""
+    response = requests.Response()
+    response._content = body
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    pairs = [
+        ('requests .json()', lambda: extract_output_text(response.json())),
+        ('json.loads(bytes)', lambda: extract_output_text(json.loads(body))),
+    ]
+    if jiter is not None:
+        pairs.append(('jiter.from_json', lambda: extract_output_text(jiter.from_json(body))))
+    return pairs
+
+
+def cpu_per_call(decode, calls):
+    decode()
+    start = time.process_time()
+    for _ in range(calls):
+        decode()
+    return (time.process_time() - start) / calls * 1e6
+
+
+def peak_memory(decode):
+    tracemalloc.start()
+    try:
+        decode()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reasoning-items', type=int, nargs='+', default=[0, 4, 16])
+    parser.add_argument('--calls', type=int, default=500, help='decodes per measurement')
+    args = parser.parse_args()
+
+    if jiter is None:
+        print("jiter is not installed; measuring the json paths only")
+    print(f"{'body':>18} {'decoder':20} {'CPU/call':>10} {'peak memory':>12}")
+    for reasoning_items in args.reasoning_items:
+        body = response_body(reasoning_items)
+        label = f"{reasoning_items} items {len(body) / 1024:.1f}KB"
+        for name, decode in decoders(body):
+            print(f"{label:>18} {name:20} {cpu_per_call(decode, args.calls):8.1f}us "
+                  f"{peak_memory(decode) / 1024:9.1f}KB")
+
+
+if __name__ == '__main__':
+    main()
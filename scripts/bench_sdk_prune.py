@@ -0,0 +1,98 @@
+"""
+Startup benchmark for SDK pruning: compares a code directory that vendors
+botocore (by default the downloaded matchmaking deployment) with a copy
+trimmed by build_lambdas.prune_sdk_data.
+
+Both copies get the boto3 release matching the vendored botocore when the
+directory does not carry one (the runtime's boto3 would not match it), so
+they differ only in the pruned service data. For each it reports the package
+size and the handler's init time in fresh interpreters (as bench_cold_start
+measures it), then checks that the trimmed copy still creates a client for
+every service in SDK_SERVICES and a DynamoDB resource. Needs pip access to
+PyPI for that boto3.
+
+Usage:
+    python scripts/bench_sdk_prune.py [--root lambda-downloads/matchmaking-dev] [--name matchmaking] [--runs 10]
+"""
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_cold_start import BENCH_ENV, ROOT_DIR, handler_module, sample  # noqa: E402
+from build_lambdas import SDK_SERVICES, directory_size, prune_sdk_data  # noqa: E402
+
+CLIENTS_SCRIPT = (
+    "import boto3, botocore\n"
+    "for service in {services!r}:\n"
+    "    boto3.client(service)\n"
+    "boto3.resource('dynamodb').Table('bench')\n"
+    "print(botocore.__file__)\n"
+)
+
+
+def add_matching_boto3(root):
+    """Installs the boto3 release that goes with the botocore vendored in `root`, unless boto3 is there."""
+    if os.path.isdir(os.path.join(root, 'boto3')):
+        return
+    dist_info, = glob.glob(os.path.join(root, 'botocore-*.dist-info'))
+    version = os.path.basename(dist_info)[len('botocore-'):-len('.dist-info')]
+    subprocess.run([sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile', '--no-deps',
+                    '--target', root, f"boto3=={version}"], check=True)
+    shutil.rmtree(os.path.join(root, 'bin'), ignore_errors=True)
+
+
+def measure(name, roots, runs):
+    """Init seconds per root, sampling the roots in turn so drift on the machine affects each alike."""
+    modules = [handler_module(name, root) for root in roots]
+    inits = [[] for _ in roots]
+    for _ in range(runs):
+        for root, module, samples in zip(roots, modules, inits):
+            samples.append(sample(root, module)[0])
+    return inits
+
+
+def check_clients(root):
+    """Creates every kept service's client with `root` first on the path. Returns the botocore it loaded."""
+    env = dict(os.environ, **BENCH_ENV, PYTHONPATH=root, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-c', CLIENTS_SCRIPT.format(services=SDK_SERVICES)],
+                            capture_output=True, text=True, env=env, cwd=root)
+    if result.returncode != 0:
+        raise RuntimeError(f"client creation failed in the pruned copy:\n{result.stderr[-2000:]}")
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default=os.path.join(ROOT_DIR, 'lambda-downloads', 'matchmaking-dev'),
+                        help='code directory with a vendored botocore')
+    parser.add_argument('--name', default='matchmaking', help='handler module name inside the directory')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per variant')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        full_root = os.path.join(scratch, 'full')
+        pruned_root = os.path.join(scratch, 'pruned')
+        shutil.copytree(args.root, full_root, ignore=shutil.ignore_patterns('__pycache__'))
+        add_matching_boto3(full_root)
+        shutil.copytree(full_root, pruned_root)
+        prune_sdk_data(pruned_root)
+
+        variants = (('full', full_root), ('pruned', pruned_root))
+        for (label, root), inits in zip(variants, measure(args.name, [root for _, root in variants], args.runs)):
+            size, count = directory_size(root)
+            print(f"{label:7} package {size / 1024 / 1024:6.2f} MB, {count:5} files  "
+                  f"init median {statistics.median(inits) * 1000:6.1f} ms, "
+                  f"min {min(inits) * 1000:6.1f} ms over {args.runs} runs")
+        loaded = check_clients(pruned_root)
+        print(f"pruned copy creates clients for {', '.join(SDK_SERVICES)} "
+              f"(botocore from {os.path.relpath(loaded, scratch)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Builds the per-handler deployment directories (lambda/<name>/package) that the
+CDK stack points at.
+
+Each handler's third-party imports are read from its source and checked
+against its requirements.txt, so a bundle only carries the dependency closure
+of what the handler actually imports. Modules the Lambda Python runtime
+already provides (boto3, botocore and their dependencies) are never bundled.
+Shared code under lambda/common is copied into every bundle. A handler that
+imports other handlers' modules (lambda/api_router) gets their sources and
+requirements bundled alongside its own.
+
+With --bundle-sdk, boto3 and botocore are bundled at the versions installed
+locally instead, so a handler runs on a pinned SDK. A vendored SDK keeps the
+service models of SDK_SERVICES only, at their newest API version: botocore's
+data directory is most of its size, and a bundle's size adds to cold start.
+--prune applies the same trimming to an existing code directory, such as a
+downloaded deployment under lambda-downloads/.
+
+Usage:
+    python scripts/build_lambdas.py                 # build every handler
+    python scripts/build_lambdas.py ai_response     # build selected handlers
+    python scripts/build_lambdas.py --check         # only verify requirements
+    python scripts/build_lambdas.py --bundle-sdk    # bundle a trimmed boto3/botocore too
+    python scripts/build_lambdas.py --prune DIR     # trim the SDK vendored in DIR in place
+"""
+import argparse
+import ast
+import importlib.metadata
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda')
+
+# Provided by the Lambda Python runtime, never bundled
+RUNTIME_PROVIDED = {'boto3', 'botocore', 's3transfer', 'jmespath', 'dateutil', 'six', 'awslambdaric'}
+
+# Import names whose distribution name differs
+DISTRIBUTION_NAMES = {'dateutil': 'python-dateutil', 'yaml': 'pyyaml'}
+
+# Code shared by the handlers, copied into every bundle rather than deployed itself
+SHARED_PACKAGES = ('common',)
+
+# Installed alongside dependencies but never needed at runtime
+STRIP_TOP_LEVEL = ('bin',)
+
+# Services the handlers create clients or resources for; a vendored SDK keeps only their models
+SDK_SERVICES = ('dynamodb', 'dynamodbstreams', 'lambda', 'secretsmanager', 'ssm', 'sqs')
+SDK_PACKAGES = ('boto3', 'botocore')
+SDK_DATA_DIRS = (os.path.join('botocore', 'data'), os.path.join('boto3', 'data'))
+
+
+def normalize(name):
+    """Normalizes a distribution name for comparison."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def handler_dirs(selected=None):
+    """Lists the handler directories under lambda/, optionally filtered by name."""
+    names = sorted(
+        name for name in os.listdir(LAMBDA_DIR)
+        if os.path.isdir(os.path.join(LAMBDA_DIR, name)) and not name.startswith(('_', '.'))
+        and name not in SHARED_PACKAGES
+        and any(f.endswith('.py') for f in os.listdir(os.path.join(LAMBDA_DIR, name)))
+    )
+    return [name for name in names if not selected or name in selected]
+
+
+def handler_sources(name):
+    """Returns the top-level .py files of a handler directory."""
+    directory = os.path.join(LAMBDA_DIR, name)
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.py'))
+
+
+def module_names(sources):
+    return {os.path.splitext(os.path.basename(path))[0] for path in sources}
+
+
+def imported_modules(sources):
+    """Collects the top-level modules imported by the given files."""
+    modules = set()
+    for path in sources:
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules.add(node.module.split('.')[0])
+    return modules
+
+
+def bundled_handlers(name):
+    """Lists the other handlers whose modules `name` imports, in handler order."""
+    imported = imported_modules(handler_sources(name)) - module_names(handler_sources(name))
+    return [other for other in handler_dirs()
+            if other != name and imported & module_names(handler_sources(other))]
+
+
+def third_party_imports(sources):
+    """Collects the top-level third-party modules imported by the given files."""
+    handler_modules = set().union(*(module_names(handler_sources(name)) for name in handler_dirs()))
+    local = module_names(sources) | handler_modules | set(SHARED_PACKAGES)
+    return {
+        module for module in imported_modules(sources)
+        if module not in sys.stdlib_module_names and module not in local and module not in RUNTIME_PROVIDED
+    }
+
+
+def read_requirements(name):
+    """Reads the distribution names listed in a handler's requirements.txt."""
+    path = os.path.join(LAMBDA_DIR, name, 'requirements.txt')
+    if not os.path.exists(path):
+        return []
+    requirements = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                requirements.append(re.split(r'[<>=!~\[; ]', line)[0])
+    return requirements
+
+
+def check_requirements(name):
+    """Compares a handler's imports with its requirements. Returns (missing, unused)."""
+    imported = {normalize(DISTRIBUTION_NAMES.get(m, m)) for m in third_party_imports(handler_sources(name))}
+    declared = {normalize(r) for r in read_requirements(name)}
+    runtime = {normalize(DISTRIBUTION_NAMES.get(m, m)) for m in RUNTIME_PROVIDED}
+    return sorted(imported - declared), sorted(declared - imported - runtime)
+
+
+def directory_size(path):
+    """Returns (bytes, file count) for a directory tree."""
+    total = count = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+            count += 1
+    return total, count
+
+
+def prune_sdk_data(root, services=SDK_SERVICES):
+    """Removes the service models a boto3/botocore vendored under `root` will never load. Returns bytes freed.
+
+    Listed services keep their newest API version, the one botocore loads when
+    none is pinned; files shared by every service (endpoints, partitions,
+    retry and default configuration) are kept.
+    """
+    before, _ = directory_size(root)
+    for data_dir in SDK_DATA_DIRS:
+        data = os.path.join(root, data_dir)
+        if not os.path.isdir(data):
+            continue
+        for service in os.listdir(data):
+            path = os.path.join(data, service)
+            if not os.path.isdir(path):
+                continue
+            if service not in services:
+                shutil.rmtree(path)
+                continue
+            versions = sorted(v for v in os.listdir(path) if os.path.isdir(os.path.join(path, v)))
+            for version in versions[:-1]:
+                shutil.rmtree(os.path.join(path, version))
+    after, _ = directory_size(root)
+    return before - after
+
+
+def build(name, unused=(), bundle_sdk=False):
+    """Rebuilds lambda/<name>/package from the handler sources and the requirements they import."""
+    directory = os.path.join(LAMBDA_DIR, name)
+    package = os.path.join(directory, 'package')
+    shutil.rmtree(package, ignore_errors=True)
+    os.makedirs(package)
+
+    skipped = {normalize(m) for m in RUNTIME_PROVIDED} | set(unused)
+    requirements = [r for r in read_requirements(name) if normalize(r) not in skipped]
+    bundled = bundled_handlers(name)
+    for other in bundled:
+        other_skipped = skipped | set(check_requirements(other)[1])
+        requirements += [r for r in read_requirements(other)
+                         if normalize(r) not in other_skipped and r not in requirements]
+    if bundle_sdk:
+        # Their own dependencies (s3transfer, jmespath, dateutil) come along
+        requirements += [f"{sdk}=={importlib.metadata.version(sdk)}" for sdk in SDK_PACKAGES]
+    if requirements:
+        subprocess.run(
+            [sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile', '--target', package, *requirements],
+            check=True,
+        )
+    for d in STRIP_TOP_LEVEL:
+        shutil.rmtree(os.path.join(package, d), ignore_errors=True)
+    pruned = prune_sdk_data(package)
+    for root, dirs, _ in os.walk(package, topdown=True):
+        if '__pycache__' in dirs:
+            shutil.rmtree(os.path.join(root, '__pycache__'))
+            dirs.remove('__pycache__')
+    for handler in [*bundled, name]:
+        for source in handler_sources(handler):
+            shutil.copy2(source, package)
+    for shared in SHARED_PACKAGES:
+        shutil.copytree(os.path.join(LAMBDA_DIR, shared), os.path.join(package, shared),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+
+    size, count = directory_size(package)
+    print(f"{name}: {size / 1024 / 1024:.2f} MB, {count} files ({', '.join(requirements) or 'no dependencies'})"
+          + (f", bundling {', '.join(bundled)}" if bundled else '')
+          + (f", {pruned / 1024 / 1024:.2f} MB of SDK service data pruned" if pruned else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('handlers', nargs='*', help='handler directory names (default: all)')
+    parser.add_argument('--check', action='store_true', help='only verify requirements against imports')
+    parser.add_argument('--bundle-sdk', action='store_true', help='bundle boto3/botocore instead of using the runtime\'s')
+    parser.add_argument('--prune', action='append', default=[], metavar='DIR',
+                        help='trim the SDK vendored in an existing code directory, then exit')
+    args = parser.parse_args()
+
+    if args.prune:
+        for root in args.prune:
+            before, _ = directory_size(root)
+            pruned = prune_sdk_data(root)
+            print(f"{root}: {before / 1024 / 1024:.2f} MB -> {(before - pruned) / 1024 / 1024:.2f} MB")
+        return
+
+    failed = False
+    for name in handler_dirs(args.handlers):
+        missing, unused = check_requirements(name)
+        if missing:
+            print(f"{name}: imports not declared in requirements.txt: {', '.join(missing)}")
+            failed = True
+        if unused:
+            print(f"{name}: requirements never imported, not bundled: {', '.join(unused)}")
+            failed = failed or args.check
+        if not args.check and not missing:
+            build(name, unused, args.bundle_sdk)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
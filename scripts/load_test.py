@@ -0,0 +1,68 @@
+"""
+Simulates many concurrent players against the local harness or a deployed
+API and reports time-to-match, message round-trip and AI reply latency
+percentiles, plus per-handler invocation counts (local runs only).
+
+Usage:
+    python scripts/load_test.py --players 1000 --arrival-rate 50 --time-scale 0.05
+    python scripts/load_test.py --players 50 --url https://.../graphql --api-key da2-...
+
+With --time-scale below 1 the local run compresses all waits (typing,
+thinking, the AI's simulated delay, OpenAI latency); reported latencies are
+in scenario seconds.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import Emulator, RealClock, ScaledClock  # noqa: E402
+from harness.loadgen import LoadGenerator, LocalTransport, RemoteTransport  # noqa: E402
+
+
+async def run(generator, threads):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+    return await generator.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--arrival-rate', type=float, default=0.0, help='players per second (0: all at once)')
+    parser.add_argument('--messages', type=int, default=3, help='messages per player')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='getWaitingStatus poll interval (s)')
+    parser.add_argument('--match-timeout', type=float, default=120.0)
+    parser.add_argument('--linger', type=float, default=20.0, help='wait for the AI after the last message (s)')
+    parser.add_argument('--time-scale', type=float, default=0.05, help='local runs: real seconds per scenario second')
+    parser.add_argument('--workers', type=int, default=256, help='local runs: concurrent Lambda executions')
+    parser.add_argument('--openai-latency', type=float, default=1.5, help='local runs: fake OpenAI latency (s)')
+    parser.add_argument('--api-router', action='store_true', help='local runs: resolve the routed fields through api_router')
+    parser.add_argument('--url', help='AppSync GraphQL URL; runs against the deployed API')
+    parser.add_argument('--api-key', help='AppSync API key for --url')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    settings = dict(players=args.players, arrival_rate=args.arrival_rate, messages_per_player=args.messages,
+                    poll_interval=args.poll_interval, match_timeout=args.match_timeout,
+                    linger_seconds=args.linger, seed=args.seed)
+    if args.url:
+        transport = RemoteTransport(args.url, args.api_key, RealClock())
+        stats = asyncio.run(run(LoadGenerator(transport, **settings), threads=args.workers))
+    else:
+        clock = ScaledClock(args.time_scale)
+        with Emulator(clock=clock, workers=args.workers, openai_latency=args.openai_latency,
+                      api_router=args.api_router) as emulator:
+            generator = LoadGenerator(LocalTransport(emulator), time_scale=args.time_scale, **settings)
+            stats = asyncio.run(run(generator, threads=args.workers))
+            emulator.run_until_idle(timeout=60)
+            print("Handler invocations (scenario seconds):")
+            for name, summary in emulator.metrics.summary().items():
+                print(f"  {name:24} {summary['invocations']:6d} calls  p50 {summary['p50']:.3f}s  "
+                      f"p95 {summary['p95']:.3f}s  errors {summary['errors']}  timeouts {summary['timeouts']}")
+    print(stats.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Drives AI turns through the local harness while the fake OpenAI injects
+faults, and reports how many turns still got a reply, what OpenAI saw, how
+long each turn took from the second human message to the reply, and whether
+ai_response ever ran past its 30 s timeout.
+
+Scenarios:
+  clean        no faults
+  rate-limit   30% of requests get 429, some with Retry-After
+  server-error 30% of requests get 500/503
+  timeouts     20% of requests hang past any timeout
+  slow-tail    10% of requests take 1.5 s instead of 0.05 s (real clock, no
+               typing delay), run with and without hedging
+  state-outage every AppStateTable request is throttled, so the circuit
+               breaker cannot read or write its state and must fail open
+
+Usage:
+    python scripts/openai_fault_drill.py [--turns 40] [--scenario NAME]
+"""
+import argparse
+import os
+import random
+import sys
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import Emulator, RealClock, random_faults  # noqa: E402
+from harness.emulator import percentile  # noqa: E402
+
+SCENARIOS = {
+    'clean': {},
+    'rate-limit': {'openai_faults': random_faults(0.3, seed=1, statuses=(429,), timeout_share=0)},
+    'server-error': {'openai_faults': random_faults(0.3, seed=2, statuses=(500, 503), timeout_share=0)},
+    'timeouts': {'openai_faults': random_faults(0.2, seed=3, timeout_share=1.0)},
+    'state-outage': {'state_outage': True},
+}
+
+
+def slow_tail(seed):
+    generator = random.Random(seed)
+    return lambda body: 1.5 if generator.random() < 0.1 else 0.05
+
+
+def throttle_table(table):
+    """Makes every request against an emulated table fail as throttled."""
+    def throttled(*args, **kwargs):
+        raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                     'Message': 'Rate of requests exceeds the allowed throughput'}}, 'UpdateItem')
+    for name in ('get_item', 'put_item', 'update_item', 'delete_item', 'query'):
+        setattr(table, name, throttled)
+
+
+def play_turns(emulator, turns):
+    """Plays `turns` rooms where two humans speak once each. Returns (AI replies, sorted turn durations)."""
+    chatrooms = emulator.dynamodb.table(emulator.env['CHATROOMS_TABLE'])
+    durations = []
+    for turn in range(turns):
+        chatroom_id = f"drill-{turn}"
+        chatrooms.put_item(Item={'id': chatroom_id, 'participants': ['human-1', 'human-2', 'ai-drill']})
+        emulator.appsync.execute('sendMessage', {'chatroomId': chatroom_id, 'senderId': 'human-1', 'text': 'hi'})
+        emulator.run_until_idle()
+        started = emulator.clock.monotonic()
+        emulator.appsync.execute('sendMessage', {'chatroomId': chatroom_id, 'senderId': 'human-2', 'text': 'hey'})
+        emulator.run_until_idle()
+        durations.append(emulator.clock.monotonic() - started)
+    messages = emulator.dynamodb.table(emulator.env['MESSAGES_TABLE'])
+    replies = sum(1 for item in messages.items.values() if item['senderId'].startswith('ai-'))
+    return replies, sorted(durations)
+
+
+def run(name, turns, hedge=False, typing_delay=True, state_outage=False, **options):
+    os.environ['OPENAI_HEDGE_ENABLED'] = 'true' if hedge else 'false'
+    with Emulator(**options) as emulator:
+        if state_outage:
+            throttle_table(emulator.dynamodb.table(emulator.env['APP_STATE_TABLE']))
+        if not typing_delay:
+            # On a real clock the simulated typing would dominate the run time
+            sys.modules['common.replies'].MAX_DELAY_SECONDS = 0
+        replies, durations = play_turns(emulator, turns)
+        timeouts = emulator.metrics.summary().get('ai_response', {}).get('timeouts', 0)
+        outcomes = ', '.join(f"{k}={v}" for k, v in sorted(emulator.openai.outcomes.items(), key=str))
+        shed = sum(1 for _, _, line in emulator.logs if 'Skipping this reply' in line)
+        print(f"{name:22} replies {replies:3}/{turns}  shed {shed:2}  turn p50 {percentile(durations, 50):5.2f}s "
+              f"p95 {percentile(durations, 95):5.2f}s max {durations[-1]:5.2f}s  timeouts {timeouts}  "
+              f"openai[{outcomes}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=40, help='AI turns per scenario')
+    parser.add_argument('--scenario', choices=[*SCENARIOS, 'slow-tail'], action='append',
+                        help='scenario to run (default: all)')
+    args = parser.parse_args()
+
+    for name in args.scenario or [*SCENARIOS, 'slow-tail']:
+        if name == 'slow-tail':
+            for hedge in (False, True):
+                run(f"slow-tail ({'hedged' if hedge else 'unhedged'})", args.turns, hedge=hedge, typing_delay=False,
+                    clock=RealClock(), openai_latency=slow_tail(4))
+        else:
+            run(name, args.turns, **SCENARIOS[name])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Plays one game through the local harness: two players join, get matched,
+chat, the AI player answers, and both submit a survey. Prints the
+conversation and per-handler invocation metrics.
+
+Usage:
+    python scripts/run_local_pipeline.py [--echo-logs] [--api-router]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harness import Emulator  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--echo-logs', action='store_true', help='print handler output as it happens')
+    parser.add_argument('--api-router', action='store_true', help='resolve the routed fields through api_router')
+    args = parser.parse_args()
+
+    with Emulator(echo_logs=args.echo_logs, api_router=args.api_router) as emulator:
+        appsync = emulator.appsync
+        matches = {}
+        received = []
+
+        players = [appsync.execute('joinWaitingRoom')['userId'] for _ in range(2)]
+        for player in players:
+            appsync.subscribe('onMatchFound', {'userId': player}, lambda match: matches.update({match['userId']: match}))
+        # Subscriptions are registered after the joins, so let matchmaking run now
+        emulator.run_until_idle()
+        if len(matches) != 2:
+            print(f"Players were not matched: {matches}")
+            return 1
+
+        chatroom_id = matches[players[0]]['chatroomId']
+        appsync.subscribe('onNewMessage', {'chatroomId': chatroom_id}, received.append)
+        appsync.execute('sendMessage', {'chatroomId': chatroom_id, 'senderId': players[0], 'text': 'hi all, where are you from?'})
+        appsync.execute('sendMessage', {'chatroomId': chatroom_id, 'senderId': players[1], 'text': 'Hello! Berlin here'})
+        emulator.run_until_idle()
+
+        # Both players spot the AI, under whichever label each of them was shown
+        for player in players:
+            shown = matches[player]['players']
+            bot_guess = f"Player {next(i for i, p in enumerate(shown, start=1) if p.startswith('ai-'))}"
+            appsync.execute('submitSurvey', {
+                'chatroomId': chatroom_id, 'userId': player, 'botGuess': bot_guess, 'reasoning': 'too quick',
+                'llmKnowledge': 'Some', 'chatbotFrequency': 'Weekly', 'age': 30, 'education': 'Undergraduate',
+            })
+        stats = appsync.execute('querySurveyResponses', {'education': 'Undergraduate'})
+
+        print(f"Chatroom {chatroom_id}")
+        for message in appsync.execute('getMessages', {'chatroomId': chatroom_id}):
+            print(f"  {message['createdAt']} {message['senderId'][:12]:>12}: {message['text']}")
+        print(f"Subscription deliveries: {len(received)}")
+        print(f"Survey accuracy: {stats['accuracy']:.0f}% over {stats['totalCount']} responses")
+        print("Invocations:")
+        for name, summary in emulator.metrics.summary().items():
+            print(f"  {name:24} {summary['invocations']:3d} calls, p50 {summary['p50']:.2f}s, "
+                  f"max {summary['max']:.2f}s, errors {summary['errors']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())